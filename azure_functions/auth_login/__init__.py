@@ -1,16 +1,19 @@
 import json
 import logging
-from datetime import datetime
-import bcrypt
 
 import azure.functions as func
 
-from shared_code.data import get_connection, return_connection
+from shared_code import metrics
+from shared_code.async_data import get_login_user
+from shared_code.http import bad_request, json_response, server_error, service_unavailable, unauthorized
+from shared_code.last_login import record_login
+from shared_code.session import PasswordCheckBusy, check_password, issue_token
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+@metrics.instrument("auth_login")
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     """
-    Authenticate user and return user data
+    Authenticate user and return user data with a session token
     POST /api/auth_login
     Body: { "username": "...", "password": "..." }
     """
@@ -18,92 +21,53 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
     try:
         body = json.loads(req.get_body())
     except ValueError:
-        return func.HttpResponse(
-            body=json.dumps({"error": "Invalid JSON"}),
-            status_code=400,
-            mimetype="application/json"
-        )
+        return bad_request("Invalid JSON")
 
     username = body.get("username", "").strip()
     password = body.get("password", "")
 
     if not username or not password:
-        return func.HttpResponse(
-            body=json.dumps({"error": "Username and password required"}),
-            status_code=400,
-            mimetype="application/json"
-        )
+        return bad_request("Username and password required")
 
-    conn = None
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
-        # Get user from database
-        cursor.execute("""
-            SELECT id, username, password_hash, shop_id, role, active
-            FROM spar.users
-            WHERE username = %s
-        """, (username,))
-
-        row = cursor.fetchone()
+        # The pooled connection is released before the password check waits for bcrypt
+        row = await get_login_user(username)
 
         if not row:
             logging.warning(f"Login attempt for non-existent user: {username}")
-            return func.HttpResponse(
-                body=json.dumps({"error": "Invalid credentials"}),
-                status_code=401,
-                mimetype="application/json"
-            )
+            return unauthorized("Invalid credentials")
 
         user_id, db_username, password_hash, shop_id, role, active = row
 
         if not active:
             logging.warning(f"Login attempt for inactive user: {username}")
-            return func.HttpResponse(
-                body=json.dumps({"error": "Account disabled"}),
-                status_code=401,
-                mimetype="application/json"
-            )
-
-        # Verify password
-        if not bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8')):
+            return unauthorized("Account disabled")
+
+        # Verify password (on the bounded bcrypt pool, awaited without blocking the worker)
+        try:
+            valid = await check_password(password, password_hash)
+        except PasswordCheckBusy:
+            logging.warning(f"Password check pool full, rejecting login for: {username}")
+            return service_unavailable("Too many login attempts, try again")
+        if not valid:
             logging.warning(f"Failed login attempt for user: {username}")
-            return func.HttpResponse(
-                body=json.dumps({"error": "Invalid credentials"}),
-                status_code=401,
-                mimetype="application/json"
-            )
-
-        # Update last login
-        cursor.execute("""
-            UPDATE spar.users
-            SET last_login = NOW()
-            WHERE id = %s
-        """, (user_id,))
-        conn.commit()
+            return unauthorized("Invalid credentials")
+
+        # Update last login (buffered, written in batches)
+        record_login(user_id)
 
         logging.info(f"Successful login: {username} ({shop_id})")
 
-        # Return user data (no password)
-        return func.HttpResponse(
-            body=json.dumps({
-                "id": user_id,
-                "username": db_username,
-                "shopId": shop_id,
-                "role": role
-            }),
-            status_code=200,
-            mimetype="application/json"
-        )
+        # Return user data (no password) and a token other functions can verify
+        user = {
+            "id": user_id,
+            "username": db_username,
+            "shopId": shop_id,
+            "role": role
+        }
+        user.update(issue_token(user))
+        return json_response(user)
 
     except Exception as e:
         logging.exception("Error during login")
-        return func.HttpResponse(
-            body=json.dumps({"error": "Server error"}),
-            status_code=500,
-            mimetype="application/json"
-        )
-    finally:
-        if conn:
-            return_connection(conn)
+        return server_error("Server error")
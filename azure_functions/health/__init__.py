@@ -0,0 +1,22 @@
+import azure.functions as func
+
+from shared_code import health, metrics
+from shared_code.http import dumps, json_response, not_found, raw_json_response
+
+_LIVE = dumps(health.LIVE)
+_NO_STORE = {"Cache-Control": "no-store"}
+
+
+@metrics.instrument("health")
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    GET /api/health (or /api/health/live): liveness, answered without any I/O
+    GET /api/health/ready: readiness; 503 while the database is unreachable
+    """
+    check = req.route_params.get("check") or "live"
+    if check == "live":
+        return raw_json_response(_LIVE, headers=_NO_STORE)
+    if check == "ready":
+        ready, report = await health.readiness()
+        return json_response(report, status_code=200 if ready else 503, headers=_NO_STORE)
+    return not_found()
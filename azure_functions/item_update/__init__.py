@@ -4,8 +4,9 @@ from typing import Any, Dict, Optional
 
 import azure.functions as func
 
-from shared_code.data import update_item
-from shared_code.servicebus import publish_event
+from shared_code import metrics, session
+from shared_code.async_data import VersionConflict, update_item
+from shared_code.http import bad_request, format_etag, json_response, not_found, server_error
 
 
 def _parse_payload(body: bytes) -> Dict[str, Any]:
@@ -30,82 +31,72 @@ def _normalize_qty(value: Any) -> Optional[int]:
     raise ValueError("qtyCollected must be a number")
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+def _parse_version(value: Any) -> Optional[int]:
+    """Expected item version from the body or an If-Match header ("3", W/"3" or 3)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("W/"):
+            value = value[2:]
+        value = value.strip('"')
+    if isinstance(value, bool):
+        raise ValueError("version must be an integer")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("version must be an integer")
+
+
+@metrics.instrument("item_update")
+@session.require_session
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     list_id = req.route_params.get("list_id")
     item_id = req.route_params.get("item_id")
 
     if not list_id or not item_id:
-        return func.HttpResponse(
-            body=json.dumps({"error": "list_id and item_id are required"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("list_id and item_id are required")
 
-    logging.info("Updating item %s in list %s", item_id, list_id)
+    shop_id = req.params.get("shopId")
+    logging.info("Updating item %s in list %s (shop %s)", item_id, list_id, shop_id)
 
     try:
         payload = _parse_payload(req.get_body())
     except ValueError as exc:
-        return func.HttpResponse(
-            body=json.dumps({"error": str(exc)}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request(str(exc))
 
     status = payload.get("status")
     if not status:
-        return func.HttpResponse(
-            body=json.dumps({"error": "status is required"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("status is required")
 
     qty_collected: Optional[int] = None
     if "qtyCollected" in payload:
         try:
             qty_collected = _normalize_qty(payload.get("qtyCollected"))
         except ValueError as exc:
-            return func.HttpResponse(
-                body=json.dumps({"error": str(exc)}, ensure_ascii=False),
-                status_code=400,
-                mimetype="application/json",
-            )
+            return bad_request(str(exc))
 
+    # Optional optimistic concurrency: only apply if the item is still at this version
     try:
-        updated_item = update_item(list_id, item_id, str(status), qty_collected)
+        expected_version = _parse_version(payload.get("version"))
+        header_version = _parse_version(req.headers.get("If-Match"))
+    except ValueError as exc:
+        return bad_request(str(exc))
+    if header_version is not None:
+        if expected_version is not None and expected_version != header_version:
+            return bad_request("version and If-Match disagree")
+        expected_version = header_version
+
+    try:
+        updated_item = await update_item(list_id, item_id, str(status), qty_collected, expected_version, shop_id)
+    except VersionConflict as conflict:
+        return json_response({"error": "version conflict", "item": conflict.current}, 409,
+                             {"ETag": format_etag(conflict.current["version"])})
     except Exception:
         logging.exception("Database error while updating item %s in list %s", item_id, list_id)
-        return func.HttpResponse(
-            body=json.dumps({"error": "database error"}, ensure_ascii=False),
-            status_code=500,
-            mimetype="application/json",
-        )
+        return server_error()
 
     if updated_item is None:
-        return func.HttpResponse(
-            body=json.dumps({"error": "not found"}, ensure_ascii=False),
-            status_code=404,
-            mimetype="application/json",
-        )
-
-    changes = {"status": status}
-    if qty_collected is not None:
-        changes["qtyCollected"] = qty_collected
-
-    try:
-        publish_event(
-            {
-                "type": "item-updated",
-                "listId": list_id,
-                "itemId": item_id,
-                "changes": changes,
-                "version": updated_item.get("version"),
-            }
-        )
-    except Exception:
-        logging.warning("Failed to publish item-updated event for %s/%s", list_id, item_id)
+        return not_found()
 
-    return func.HttpResponse(
-        body=json.dumps(updated_item, ensure_ascii=False),
-        mimetype="application/json",
-    )
+    return json_response(updated_item, headers={"ETag": format_etag(updated_item["version"])})
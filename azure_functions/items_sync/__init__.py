@@ -0,0 +1,95 @@
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+import azure.functions as func
+
+from shared_code import metrics, session
+from shared_code.async_data import sync_items
+from shared_code.http import bad_request, json_response, server_error
+
+MAX_CHANGES = 500
+ALLOWED_STATUS = {"pending", "collected", "unavailable"}
+
+
+def _parse_payload(body: bytes) -> Dict[str, Any]:
+    if not body:
+        return {}
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        raise ValueError("Body must be valid JSON")
+    if not isinstance(payload, dict):
+        raise ValueError("Body must be a JSON object")
+    return payload
+
+
+def _optional_int(value: Any, field: str) -> Optional[int]:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"{field} must be a number")
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value.strip():
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    raise ValueError(f"{field} must be a number")
+
+
+def _validate_changes(changes: Any) -> List[Dict[str, Any]]:
+    if not isinstance(changes, list):
+        raise ValueError("changes must be a list")
+    if len(changes) > MAX_CHANGES:
+        raise ValueError(f"changes cannot exceed {MAX_CHANGES} entries")
+
+    validated: List[Dict[str, Any]] = []
+    for index, change in enumerate(changes):
+        if not isinstance(change, dict):
+            raise ValueError(f"changes[{index}] must be an object")
+        list_id = change.get("listId")
+        item_id = change.get("itemId")
+        if not isinstance(list_id, str) or not list_id or not isinstance(item_id, str) or not item_id:
+            raise ValueError(f"changes[{index}] requires listId and itemId")
+        status = change.get("status")
+        if status not in ALLOWED_STATUS:
+            raise ValueError(f"changes[{index}].status must be one of pending, collected, unavailable")
+        try:
+            qty_collected = _optional_int(change.get("qtyCollected"), "qtyCollected")
+            version = _optional_int(change.get("version"), "version")
+        except ValueError as exc:
+            raise ValueError(f"changes[{index}].{exc}")
+        validated.append(
+            {
+                "listId": list_id,
+                "itemId": item_id,
+                "status": status,
+                "qtyCollected": qty_collected,
+                "version": version,
+            }
+        )
+    return validated
+
+
+@metrics.instrument("items_sync")
+@session.require_session
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Apply a batch of item changes (e.g. replayed offline updates) in one transaction"""
+    try:
+        payload = _parse_payload(req.get_body())
+        changes = _validate_changes(payload.get("changes"))
+    except ValueError as exc:
+        return bad_request(str(exc))
+
+    shop_id = req.params.get("shopId")
+    logging.info("Syncing %d item change(s) (shop %s)", len(changes), shop_id)
+
+    try:
+        results = await sync_items(changes, shop_id)
+    except Exception:
+        logging.exception("Database error while syncing %d item change(s)", len(changes))
+        return server_error()
+
+    return json_response({"results": results})
@@ -4,8 +4,9 @@ from typing import Any, Dict, List
 
 import azure.functions as func
 
-from shared_code.data import create_list
-from shared_code.servicebus import publish_event
+from shared_code import metrics, session
+from shared_code.async_data import create_list
+from shared_code.http import bad_request, json_response, server_error
 
 
 def _parse_payload(body: bytes) -> Dict[str, Any]:
@@ -84,75 +85,37 @@ def _validate_items(items: Any) -> List[Dict[str, Any]]:
     return validated
 
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+@metrics.instrument("list_create")
+@session.require_session
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     shop_id = req.params.get("shopId")
     if not shop_id:
-        return func.HttpResponse(
-            body=json.dumps({"error": "shopId is required"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("shopId is required")
     if not isinstance(shop_id, str) or not shop_id.strip():
-        return func.HttpResponse(
-            body=json.dumps({"error": "shopId must be a non-empty string"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("shopId must be a non-empty string")
     shop_id = shop_id.strip()
     if len(shop_id) > 120:
-        return func.HttpResponse(
-            body=json.dumps({"error": "shopId must be 120 characters or fewer"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("shopId must be 120 characters or fewer")
 
     logging.info("Creating new list for shop %s", shop_id)
 
     try:
         payload = _parse_payload(req.get_body())
     except ValueError as exc:
-        return func.HttpResponse(
-            body=json.dumps({"error": str(exc)}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request(str(exc))
 
     try:
         title = _validate_title(payload.get("title"))
         items = _validate_items(payload.get("items", []))
     except ValueError as exc:
-        return func.HttpResponse(
-            body=json.dumps({"error": str(exc)}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request(str(exc))
 
     logging.info("Creating new list for shop %s with %d items", shop_id, len(items))
 
     try:
-        new_list = create_list(title, shop_id, items)
+        new_list = await create_list(title, shop_id, items)
     except Exception:
         logging.exception("Database error while creating list for shop %s", shop_id)
-        return func.HttpResponse(
-            body=json.dumps({"error": "database error"}, ensure_ascii=False),
-            status_code=500,
-            mimetype="application/json",
-        )
-
-    try:
-        publish_event(
-            {
-                "type": "list-created",
-                "listId": new_list["id"],
-                "title": new_list["title"],
-                "shopId": shop_id,
-                "itemCount": len(new_list["items"]),
-            }
-        )
-    except Exception:
-        logging.warning("Failed to publish list-created event for %s", new_list["id"])
+        return server_error()
 
-    return func.HttpResponse(
-        body=json.dumps(new_list, ensure_ascii=False),
-        mimetype="application/json",
-    )
+    return json_response(new_list)
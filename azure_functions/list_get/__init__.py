@@ -1,41 +1,52 @@
-import json
 import logging
 
 import azure.functions as func
 
-from shared_code.data import get_list
-
-
-def main(req: func.HttpRequest) -> func.HttpResponse:
+from shared_code import metrics, session
+from shared_code.async_data import get_list, get_list_json, get_list_revision
+from shared_code.http import (
+    NO_CACHE,
+    bad_request,
+    etag_matches,
+    format_etag,
+    json_response,
+    not_found,
+    not_modified,
+    raw_json_response,
+    server_error,
+)
+from shared_code.settings import sql_json_enabled
+
+
+@metrics.instrument("list_get")
+@session.require_session
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     list_id = req.params.get("listId")
     if not list_id:
-        return func.HttpResponse(
-            body=json.dumps({"error": "listId is required"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("listId is required")
 
     shop_id = req.params.get("shopId")
     logging.info("Fetching list %s (shop %s)", list_id, shop_id)
 
     try:
-        data = get_list(list_id, shop_id)
+        # Read the validator before the data: a change in between only makes the ETag older
+        revision = await get_list_revision(list_id, shop_id)
+        etag = format_etag(revision) if revision is not None else None
+        if etag and etag_matches(req.headers.get("If-None-Match"), etag):
+            return not_modified(etag)
+        if revision is None:
+            data = None
+        elif sql_json_enabled("list_get"):
+            data = await get_list_json(list_id, shop_id, revision)
+        else:
+            data = await get_list(list_id, shop_id, revision)
     except Exception:
         logging.exception("Database error while fetching list %s", list_id)
-        return func.HttpResponse(
-            body=json.dumps({"error": "database error"}, ensure_ascii=False),
-            status_code=500,
-            mimetype="application/json",
-        )
+        return server_error()
 
     if data is None:
-        return func.HttpResponse(
-            body=json.dumps({"error": "List not found"}, ensure_ascii=False),
-            status_code=404,
-            mimetype="application/json",
-        )
-
-    return func.HttpResponse(
-        body=json.dumps(data, ensure_ascii=False),
-        mimetype="application/json",
-    )
+        return not_found("List not found")
+
+    if isinstance(data, bytes):
+        return raw_json_response(data, headers={"ETag": etag, **NO_CACHE})
+    return json_response(data, headers={"ETag": etag, **NO_CACHE})
@@ -0,0 +1,33 @@
+import logging
+
+import azure.functions as func
+
+from shared_code import metrics, session
+from shared_code.async_data import get_changes
+from shared_code.http import bad_request, json_response, server_error
+
+
+@metrics.instrument("lists_changes")
+@session.require_session
+async def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Lists and items of a shop changed since ``cursor``, plus deletions
+
+    Without a cursor every list and item of the shop is returned. Each
+    response carries the cursor for the next poll.
+    """
+    shop_id = req.params.get("shopId")
+    if not shop_id:
+        return bad_request("shopId is required")
+
+    cursor = req.params.get("cursor") or None
+    logging.info("Fetching changes for shop %s (cursor %s)", shop_id, cursor)
+
+    try:
+        changes = await get_changes(shop_id, cursor)
+    except ValueError as exc:
+        return bad_request(str(exc))
+    except Exception:
+        logging.exception("Database error while fetching changes for shop %s", shop_id)
+        return server_error()
+
+    return json_response(changes)
@@ -1,33 +1,96 @@
-import json
+import io
 import logging
+from typing import AsyncIterable, Optional
 
 import azure.functions as func
 
-from shared_code.data import get_lists
+from shared_code import metrics, session
+from shared_code.async_data import AsyncListStream, get_lists_json, get_shop_revision
+from shared_code.http import (
+    NO_CACHE,
+    bad_request,
+    dumps,
+    etag_matches,
+    format_etag,
+    not_modified,
+    raw_json_response,
+    server_error,
+)
+from shared_code.settings import sql_json_enabled
 
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
 
-def main(req: func.HttpRequest) -> func.HttpResponse:
+
+def _parse_limit(value: Optional[str]) -> int:
+    if value is None or not value.strip():
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return limit
+
+
+async def _write_lists(out: io.BytesIO, lists: AsyncIterable) -> None:
+    """Encode lists into ``out`` one at a time instead of building the whole array first"""
+    out.write(b"[")
+    index = 0
+    async for list_data in lists:
+        if index:
+            out.write(b",")
+        index += 1
+        out.write(dumps(list_data))
+    out.write(b"]")
+
+
+@metrics.instrument("lists_get")
+@session.require_session
+async def main(req: func.HttpRequest) -> func.HttpResponse:
     shop_id = req.params.get("shopId")
     if not shop_id:
-        return func.HttpResponse(
-            body=json.dumps({"error": "shopId is required"}, ensure_ascii=False),
-            status_code=400,
-            mimetype="application/json",
-        )
+        return bad_request("shopId is required")
 
-    logging.info("Fetching lists for shop %s", shop_id)
+    # Without limit/cursor the response stays a bare array of every list, as before
+    paginated = "limit" in req.params or "cursor" in req.params
 
     try:
-        lists = get_lists(shop_id)
+        limit = _parse_limit(req.params.get("limit")) if paginated else None
+        stream = AsyncListStream(shop_id, limit, req.params.get("cursor") or None)
+    except ValueError as exc:
+        return bad_request(str(exc))
+
+    logging.info("Fetching lists for shop %s (limit %s)", shop_id, limit)
+
+    out = io.BytesIO()
+    try:
+        # Read the validator before the data: a change in between only makes the ETag older
+        revision = await get_shop_revision(shop_id)
+        etag = format_etag(revision)
+        if etag_matches(req.headers.get("If-None-Match"), etag):
+            return not_modified(etag)
+
+        if sql_json_enabled("lists_get"):
+            # Postgres assembles the documents; only the envelope is added here
+            body, next_cursor = await get_lists_json(shop_id, limit, stream.cursor, revision)
+            if paginated:
+                body = b'{"lists":' + body + b',"nextCursor":' + dumps(next_cursor) + b"}"
+            return raw_json_response(body, headers={"ETag": etag, **NO_CACHE})
+
+        # Cached pages are only served if they were loaded at this revision
+        stream.revision = revision
+        if paginated:
+            out.write(b'{"lists":')
+            await _write_lists(out, stream)
+            out.write(b',"nextCursor":')
+            out.write(dumps(stream.next_cursor))
+            out.write(b"}")
+        else:
+            await _write_lists(out, stream)
     except Exception:
         logging.exception("Database error while fetching lists for shop %s", shop_id)
-        return func.HttpResponse(
-            body=json.dumps({"error": "database error"}, ensure_ascii=False),
-            status_code=500,
-            mimetype="application/json",
-        )
-
-    return func.HttpResponse(
-        body=json.dumps(lists, ensure_ascii=False),
-        mimetype="application/json",
-    )
+        return server_error()
+
+    return raw_json_response(out.getvalue(), headers={"ETag": etag, **NO_CACHE})
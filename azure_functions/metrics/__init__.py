@@ -0,0 +1,17 @@
+import azure.functions as func
+
+# Imported for the pool and publisher collectors they register
+from shared_code import async_data, data, metrics, servicebus  # noqa: F401
+from shared_code.http import not_found
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """
+    Metrics of this worker process in the Prometheus text format
+    GET /api/metrics (404 unless METRICS_ENABLED=true)
+    """
+    if not metrics.enabled:
+        return not_found()
+    return func.HttpResponse(metrics.render(), status_code=200, headers={"Content-Type": CONTENT_TYPE})
@@ -0,0 +1,23 @@
+import logging
+
+import azure.functions as func
+
+from shared_code import metrics
+from shared_code.outbox import relay
+
+
+@metrics.instrument("outbox_relay")
+def main(timer: func.TimerRequest) -> None:
+    """Forward committed domain events from the outbox table to Service Bus"""
+    if timer.past_due:
+        logging.info("Outbox relay timer is past due")
+
+    try:
+        relayed = relay()
+    except Exception as e:
+        # Events stay in the outbox and are retried on the next tick
+        logging.exception("Outbox relay failed: %s", e)
+        return
+
+    if relayed:
+        logging.info("Outbox relay forwarded %d event(s)", relayed)
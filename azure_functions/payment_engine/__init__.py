@@ -1,136 +1,169 @@
 import json
 import logging
 from datetime import datetime
-from typing import Any, Dict
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
 
 import azure.functions as func
 
+from shared_code import metrics
 
-def main(msg: func.ServiceBusMessage) -> None:
-    """Process completed shopping lists for payment"""
-    
-    try:
-        # Parse the message
-        message_body = msg.get_body().decode('utf-8')
-        payment_data = json.loads(message_body)
-        
-        logging.info("Processing payment for list: %s", payment_data.get("listId"))
-        
-        # Simulate payment processing
-        result = process_payment(payment_data)
-        
-        if result["success"]:
-            logging.info("Payment processed successfully for list %s: %s", 
-                       payment_data.get("listId"), result["transactionId"])
+
+@metrics.instrument("payment_engine")
+def main(msgs: List[func.ServiceBusMessage]) -> None:
+    """Process a batch of completed shopping lists for payment"""
+
+    batch: List[Dict[str, Any]] = []
+    for msg in msgs:
+        try:
+            batch.append(json.loads(msg.get_body().decode('utf-8')))
+        except Exception as e:
+            # A malformed message must not hold back the rest of the batch
+            logging.exception("Error parsing payment message %s: %s", msg.message_id, e)
+
+    logging.info("Processing payment batch of %d message(s)", len(batch))
+
+    # Errors from pricing or persistence propagate so the runtime redelivers the
+    # batch; recording is idempotent, so already-processed lists are no-ops
+    for payment_data, result in zip(batch, process_payments(batch)):
+        if result.get("listDeleted"):
+            logging.warning("Payment not recorded for list %s: %s", payment_data.get("listId"), result["error"])
+        elif result["success"]:
+            logging.info("Payment processed successfully for list %s: %s%s",
+                         payment_data.get("listId"), result["transactionId"],
+                         " (already recorded)" if result.get("duplicate") else "")
         else:
-            logging.error("Payment failed for list %s: %s", 
-                         payment_data.get("listId"), result["error"])
-            
-    except Exception as e:
-        logging.exception("Error processing payment message: %s", e)
+            logging.error("Payment failed for list %s: %s",
+                          payment_data.get("listId"), result["error"])
 
 
 def process_payment(payment_data: Dict[str, Any]) -> Dict[str, Any]:
     """Process payment for a completed shopping list"""
+    return process_payments([payment_data])[0]
 
-    list_id = payment_data.get("listId")
-    shop_id = payment_data.get("shopId")
-    completed_by = payment_data.get("completedBy")
-    completed_at = payment_data.get("completedAt")
-    items = payment_data.get("items", [])
-    title = payment_data.get("title", "Unknown List")
-
-    # Validate required payment data
-    if not all([list_id, shop_id, completed_by]):
-        missing = []
-        if not list_id: missing.append("listId")
-        if not shop_id: missing.append("shopId")
-        if not completed_by: missing.append("completedBy")
-
-        return {
-            "success": False,
-            "error": f"Missing required payment data: {', '.join(missing)}",
-            "transactionId": None
-        }
 
-    # Calculate total amount from database pricing
-    total_amount = calculate_total_amount(items)
+def process_payments(batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Price and record a batch of completed lists; one result per entry, in order
 
-    try:
-        # Generate transaction ID
-        transaction_id = f"TXN-{list_id}-{int(datetime.now().timestamp())}"
+    Prices for every SKU in the batch are resolved in one lookup and all
+    transactions are written with one insert.
+    """
+    _ensure_site_packages()
+    from shared_code.data import insert_payment_transactions
+    from shared_code.prices import get_prices
+
+    results: List[Optional[Dict[str, Any]]] = [None] * len(batch)
+    valid: List[int] = []
+    for index, payment_data in enumerate(batch):
+        error = _validate(payment_data)
+        if error:
+            results[index] = {"success": False, "error": error, "transactionId": None}
+        else:
+            valid.append(index)
+
+    prices = get_prices(
+        item.get("sku")
+        for index in valid
+        for item in batch[index].get("items", [])
+    )
+
+    transactions: Dict[str, Dict[str, Any]] = {}
+    for index in valid:
+        payment_data = batch[index]
+        list_id = payment_data["listId"]
+        items = payment_data.get("items", [])
+        total_amount = calculate_total_amount(items, prices)
+        transaction_id = _transaction_id(list_id, payment_data.get("completedAt"))
 
-        # Log payment details
         logging.info("Payment processed: List=%s (%s), Shop=%s, Items=%d, Amount=%.2f, Transaction=%s",
-                   list_id, title, shop_id, len(items), total_amount, transaction_id)
+                     list_id, payment_data.get("title", "Unknown List"), payment_data["shopId"],
+                     len(items), total_amount, transaction_id)
 
-        return {
+        results[index] = {
             "success": True,
             "transactionId": transaction_id,
             "amount": total_amount,
             "processedAt": datetime.utcnow().isoformat() + "Z",
             "listId": list_id,
-            "shopId": shop_id,
-            "completedBy": completed_by
-        }
-    except Exception as e:
-        logging.error("Payment processing failed for list %s: %s", list_id, e)
-        return {
-            "success": False,
-            "error": f"Payment processing error: {str(e)}",
-            "transactionId": None
+            "shopId": payment_data["shopId"],
+            "completedBy": payment_data["completedBy"]
         }
+        transactions.setdefault(transaction_id, results[index])
+
+    inserted, list_deleted = insert_payment_transactions(list(transactions.values()))
+    for index in valid:
+        result = results[index]
+        if result["transactionId"] in list_deleted:
+            # Deleted before its payment was recorded: nothing to charge it against
+            results[index] = {"success": False, "listDeleted": True, "error": "List no longer exists",
+                              "transactionId": result["transactionId"]}
+        elif result["transactionId"] not in inserted:
+            result["duplicate"] = True
+        else:
+            # Duplicates within one batch only count once
+            inserted.discard(result["transactionId"])
+
+    return results
 
 
-def calculate_total_amount(items: list) -> float:
-    """Calculate total amount for the shopping list based on actual item prices from database"""
+def _validate(payment_data: Dict[str, Any]) -> Optional[str]:
+    """Error message when required payment data is missing"""
+    missing = [key for key in ("listId", "shopId", "completedBy") if not payment_data.get(key)]
+    if missing:
+        return f"Missing required payment data: {', '.join(missing)}"
+    return None
+
+
+def _transaction_id(list_id: str, completed_at: Optional[str]) -> str:
+    """Deterministic per completion, so a redelivered message maps to the same transaction"""
+    try:
+        timestamp = int(datetime.fromisoformat(completed_at.rstrip("Z")).timestamp())
+    except (AttributeError, TypeError, ValueError):
+        return f"TXN-{list_id}"
+    return f"TXN-{list_id}-{timestamp}"
+
+
+def _ensure_site_packages() -> None:
+    import sys
+    import os
+    site_packages_path = os.path.join(os.getcwd(), ".python_packages", "site-packages")
+    if site_packages_path not in sys.path:
+        sys.path.insert(0, site_packages_path)
+
+
+def calculate_total_amount(items: list, prices: Optional[Dict[str, Any]] = None) -> float:
+    """Calculate total amount for the shopping list based on actual item prices from database
+
+    ``prices`` may carry SKU prices already resolved for a whole batch.
+    """
 
     if not items:
         return 0.0
 
     try:
-        # Import database functions
-        import sys
-        import os
-        site_packages_path = os.path.join(os.getcwd(), ".python_packages", "site-packages")
-        if site_packages_path not in sys.path:
-            sys.path.insert(0, site_packages_path)
+        if prices is None:
+            _ensure_site_packages()
+            from shared_code.prices import get_prices
 
-        from shared_code.data import get_connection, return_connection
+            # One lookup for the whole list; cached prices skip the database entirely
+            prices = get_prices(item.get("sku") for item in items)
 
-        conn = None
-        try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
-            total = 0.0
-            for item in items:
-                sku = item.get("sku")
-                qty_collected = item.get("qty_collected", item.get("qty", 1))
-
-                if not sku:
-                    logging.warning("Item %s has no SKU, skipping price lookup", item.get("id"))
-                    continue
-
-                # Query product price from database
-                cursor.execute("""
-                    SELECT price
-                    FROM spar.products
-                    WHERE sku = %s
-                """, (sku,))
-
-                result = cursor.fetchone()
-                if result:
-                    price = result[0]
-                    total += price * qty_collected
-                else:
-                    logging.warning("No price found for SKU %s", sku)
-
-            return round(total, 2)
-
-        finally:
-            if conn:
-                return_connection(conn)
+        total = Decimal("0")
+        for item in items:
+            sku = item.get("sku")
+            qty_collected = item.get("qty_collected", item.get("qty", 1))
+
+            if not sku:
+                logging.warning("Item %s has no SKU, skipping price lookup", item.get("id"))
+                continue
+
+            price = prices.get(sku)
+            if price is not None:
+                total += price * Decimal(str(qty_collected))
+            else:
+                logging.warning("No price found for SKU %s", sku)
+
+        return float(round(total, 2))
 
     except Exception as e:
         logging.error("Error calculating total amount: %s", e)
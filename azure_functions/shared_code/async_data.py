@@ -0,0 +1,560 @@
+"""Async variant of the shared_code.data API for the HTTP functions
+
+Backed by psycopg 3 and psycopg_pool.AsyncConnectionPool, so one worker can
+keep many requests in flight while they wait on Postgres. Both are imported
+through shared_code.lazy when the pool is first created, like psycopg2 in
+shared_code.data. Functions present in both modules return the same
+structures. The sync module keeps only what the Service Bus and timer
+functions (payment_engine, outbox_relay), the background writers
+(last_login), the health check and the benchmarks use; everything the HTTP
+functions serve, including auth_login and sync_items, lives here.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+import time
+import uuid
+import weakref
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from shared_code import cache, cursors, lazy, metrics, queries
+from shared_code.cache import read_cache
+from shared_code.queries import VersionConflict, decode_change_cursor, decode_list_cursor, encode_list_cursor
+from shared_code.settings import database_settings, pool_settings
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_FETCH_SIZE = 1000
+
+
+@functools.lru_cache(maxsize=None)
+def _raw_text_loader():
+    """psycopg Loader returning text columns as the UTF-8 bytes Postgres sent (for JSON passed straight through)"""
+    Loader = lazy.load("psycopg.adapt").Loader
+
+    class _RawTextLoader(Loader):
+        def load(self, data) -> bytes:
+            return bytes(data)
+
+    return _RawTextLoader
+
+
+@functools.lru_cache(maxsize=None)
+def _pool_class(timed: bool):
+    """The AsyncConnectionPool subclass to create; psycopg_pool is imported here, on first pool creation"""
+    AsyncConnectionPool = lazy.load("psycopg_pool").AsyncConnectionPool
+
+    class _ConnectionPool(AsyncConnectionPool):
+        """Remembers when each connection went idle, for the ``_check_idle`` checkout check"""
+
+        async def putconn(self, conn) -> None:
+            _idle_since[conn] = time.monotonic()
+            await super().putconn(conn)
+
+    if not timed:
+        return _ConnectionPool
+
+    class _TimedConnectionPool(_ConnectionPool):
+        """Records how long each checkout waited (used while metrics are on)"""
+
+        async def getconn(self, timeout: Optional[float] = None):
+            started = time.perf_counter()
+            conn = await super().getconn(timeout)
+            metrics.observe("db_pool_wait_seconds", time.perf_counter() - started, pool="async")
+            return conn
+
+    return _TimedConnectionPool
+
+
+# psycopg_pool.AsyncConnectionPool once created (psycopg is not imported before)
+_pool: Optional[Any] = None
+_pool_lock = asyncio.Lock()
+# Connection -> time.monotonic() when it was opened or last returned to the pool
+_idle_since: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+
+
+async def _configure(conn) -> None:
+    """psycopg_pool ``configure`` callback for new connections"""
+    _idle_since[conn] = time.monotonic()
+    if cursors.enabled():
+        await cursors.configure_async(conn)
+
+
+async def _check_idle(conn) -> None:
+    """psycopg_pool ``check`` callback: ping connections idle for longer than POSTGRES_POOL_CHECK_AFTER
+
+    Same rule as shared_code.pool; a connection that fails is replaced and the checkout retried.
+    """
+    idle_since = _idle_since.get(conn)
+    if idle_since is not None and time.monotonic() - idle_since < pool_settings()["check_after"]:
+        return
+    await lazy.load("psycopg_pool").AsyncConnectionPool.check_connection(conn)
+
+
+async def get_connection_pool():
+    """Get or create the async connection pool"""
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                try:
+                    db = database_settings()
+                    sizing = pool_settings()
+                    make_conninfo = lazy.load("psycopg.conninfo").make_conninfo
+                    pool = _pool_class(metrics.enabled)(
+                        make_conninfo(
+                            host=db["host"],
+                            dbname=db["database"],
+                            user=db["user"],
+                            password=db["password"],
+                            port=db["port"],
+                            sslmode=db["sslmode"],
+                        ),
+                        min_size=sizing["min_size"],
+                        max_size=sizing["max_size"],
+                        timeout=sizing["timeout"],
+                        max_lifetime=sizing["max_lifetime"],
+                        max_idle=sizing["max_idle"],
+                        name="spar-async",
+                        configure=_configure,
+                        check=_check_idle,
+                        open=False,
+                    )
+                    await pool.open()
+                    _pool = pool
+                    logging.info("Created async PostgreSQL connection pool")
+                except Exception as e:
+                    logging.error("Failed to create async connection pool: %s", e)
+                    raise
+    return _pool
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """psycopg_pool statistics for the async pool (empty before first use)"""
+    pool = _pool
+    return pool.get_stats() if pool is not None else {}
+
+
+# psycopg_pool measure -> the gauge data.py reports for the sync pool
+_POOL_GAUGES = {"pool_size": "size", "pool_available": "idle", "pool_max": "max_size", "requests_waiting": "waiting"}
+
+
+def _pool_gauges():
+    stats = get_pool_stats()
+    for key, name in _POOL_GAUGES.items():
+        if key in stats:
+            yield f"db_pool_{name}", {"pool": "async"}, stats[key]
+
+
+def _pool_counters():
+    stats = get_pool_stats()
+    for key in ("requests_num", "requests_queued", "requests_errors", "connections_num", "connections_lost"):
+        if key in stats:
+            yield f"db_pool_{key}_total", {"pool": "async"}, stats[key]
+
+
+if metrics.enabled:
+    metrics.register_collector("gauge", _pool_gauges)
+    metrics.register_collector("counter", _pool_counters)
+
+
+class AsyncListStream:
+    """Async counterpart of data.ListStream; iterate with ``async for``"""
+
+    def __init__(self, shop_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                 revision: Optional[int] = None):
+        self.shop_id = shop_id
+        self.limit = limit
+        self.cursor = cursor
+        self.after = decode_list_cursor(cursor) if cursor else None
+        self.revision = revision
+        self.next_cursor: Optional[str] = None
+
+    async def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        # Only paginated per-shop pages are cached; shop invalidation covers those
+        cacheable = cache.caches_page(self.shop_id, self.limit)
+        key = cache.lists_key(self.shop_id, self.limit, self.cursor)
+        cached = read_cache.get(key, self.revision) if cacheable else None
+        if cached is not None:
+            lists, self.next_cursor = cached
+            for list_data in lists:
+                yield list_data
+            return
+        cache.ensure_listener()
+
+        query, params = queries.list_stream_query(self.shop_id, self.limit, self.after)
+        collected: Optional[List[Dict[str, Any]]] = [] if cacheable else None
+        rows = 0
+        try:
+            pool = await get_connection_pool()
+            async with pool.connection() as conn:
+                async with conn.cursor(name="list_stream") as cursor:
+                    cursor.itersize = STREAM_FETCH_SIZE
+                    await cursor.execute(query, params)
+
+                    current: Optional[Dict[str, Any]] = None
+                    current_key = None
+                    count = 0
+                    async for row in cursor:
+                        rows += 1
+                        if collected is not None and rows > cache.MAX_PAGE_ROWS:
+                            collected = None
+                        if current is None or current["id"] != row[0]:
+                            if current is not None:
+                                if collected is not None:
+                                    collected.append(current)
+                                yield current
+                            count += 1
+                            if self.limit is not None and count > self.limit:
+                                self.next_cursor = encode_list_cursor(*current_key)
+                                current = None
+                                break
+                            current = queries.list_from_row(row[:7])
+                            current_key = (row[4], row[0])
+                        if row[7] is not None:
+                            current["items"].append(queries.item_from_row(row[7:]))
+                    if current is not None:
+                        if collected is not None:
+                            collected.append(current)
+                        yield current
+        except Exception as e:
+            logging.error("Error streaming lists: %s", e)
+            raise
+
+        # Only reached when the consumer read the whole page
+        if collected is not None:
+            read_cache.put(key, (collected, self.next_cursor), self.revision, self.shop_id,
+                           [(list_data["id"], list_data["shop_id"]) for list_data in collected])
+
+
+async def get_lists(shop_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get lists with their items, optionally filtered by shop_id and paginated"""
+    return [list_data async for list_data in AsyncListStream(shop_id, limit, cursor)]
+
+
+async def get_changes(shop_id: str, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """Lists, items and deletions of a shop changed since ``cursor`` (everything without one)
+
+    Raises ValueError for a malformed cursor.
+    """
+    since = decode_change_cursor(cursor) if cursor else None
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            db_cursor = conn.cursor()
+            await db_cursor.execute(queries.BEGIN_CHANGES_SNAPSHOT)
+            await db_cursor.execute(queries.SELECT_SNAPSHOT_XMIN)
+            xmin = (await db_cursor.fetchone())[0]
+
+            await db_cursor.execute(queries.SELECT_CHANGED_LISTS, (shop_id, since or "0"))
+            list_rows = await db_cursor.fetchall()
+            await db_cursor.execute(queries.SELECT_CHANGED_ITEMS, (shop_id, since or "0"))
+            item_rows = await db_cursor.fetchall()
+            deleted_rows = []
+            # A full sync has nothing to delete on the client
+            if since is not None:
+                await db_cursor.execute(queries.SELECT_DELETED_RECORDS, (shop_id, since))
+                deleted_rows = await db_cursor.fetchall()
+
+            return queries.changes_from_rows(list_rows, item_rows, deleted_rows, xmin)
+    except Exception as e:
+        logging.error("Error fetching changes for shop %s: %s", shop_id, e)
+        raise
+
+
+async def get_login_user(username: str) -> Optional[Tuple[Any, ...]]:
+    """(id, username, password_hash, shop_id, role, active) of a user, or None"""
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        cursor = await conn.execute(queries.SELECT_USER_FOR_LOGIN, (username,))
+        return await cursor.fetchone()
+
+
+async def get_list_revision(list_id: str, shop_id: Optional[str] = None) -> Optional[int]:
+    """Revision of a list, the validator for list_get (None if the list does not exist)"""
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        cursor = conn.cursor()
+        if shop_id:
+            await cursor.execute(queries.SELECT_SHOP_LIST_REVISION, (list_id, shop_id))
+        else:
+            await cursor.execute(queries.SELECT_LIST_REVISION, (list_id,))
+        row = await cursor.fetchone()
+        return row[0] if row else None
+
+
+async def get_shop_revision(shop_id: str) -> int:
+    """Change counter of a shop's lists, the validator for lists_get"""
+    pool = await get_connection_pool()
+    async with pool.connection() as conn:
+        cursor = conn.cursor()
+        await cursor.execute(queries.SELECT_SHOP_REVISION, (shop_id,))
+        row = await cursor.fetchone()
+        return row[0] if row else 0
+
+
+async def get_list(list_id: str, shop_id: Optional[str] = None, revision: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Get a specific list by ID, from the read cache when possible (see data.get_list)"""
+    key = cache.list_key(list_id, shop_id)
+    cached = read_cache.get(key, revision)
+    if cached is not None:
+        return cached
+    cache.ensure_listener()
+
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            if shop_id:
+                await cursor.execute(queries.SELECT_SHOP_LIST, (list_id, shop_id))
+            else:
+                await cursor.execute(queries.SELECT_LIST, (list_id,))
+
+            row = await cursor.fetchone()
+            if not row:
+                return None
+
+            list_data = queries.list_from_row(row)
+
+            await cursor.execute(queries.SELECT_LIST_ITEMS, (list_id,))
+            list_data["items"] = [queries.item_from_row(item_row) for item_row in await cursor.fetchall()]
+
+            read_cache.put(key, list_data, row[7], list_ids=[(list_id, list_data["shop_id"])])
+            return list_data
+    except Exception as e:
+        logging.error("Error fetching list %s: %s", list_id, e)
+        raise
+
+
+async def get_list_json(list_id: str, shop_id: Optional[str] = None, revision: Optional[int] = None) -> Optional[bytes]:
+    """get_list as UTF-8 JSON assembled by Postgres (see data.get_list_json)"""
+    key = cache.list_key(list_id, shop_id, raw=True)
+    cached = read_cache.get(key, revision)
+    if cached is not None:
+        return cached
+    cache.ensure_listener()
+
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.adapters.register_loader("text", _raw_text_loader())
+            if shop_id:
+                await cursor.execute(queries.SELECT_SHOP_LIST_JSON, (list_id, shop_id))
+            else:
+                await cursor.execute(queries.SELECT_LIST_JSON, (list_id,))
+            row = await cursor.fetchone()
+            if not row:
+                return None
+
+            read_cache.put(key, row[2], row[0], list_ids=[(list_id, row[1])])
+            return row[2]
+    except Exception as e:
+        logging.error("Error fetching list %s as JSON: %s", list_id, e)
+        raise
+
+
+async def get_lists_json(shop_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                         revision: Optional[int] = None) -> Tuple[bytes, Optional[str]]:
+    """A page of get_lists as a UTF-8 JSON array assembled by Postgres, and the next cursor"""
+    cacheable = cache.caches_page(shop_id, limit)
+    key = cache.lists_key(shop_id, limit, cursor, raw=True)
+    cached = read_cache.get(key, revision) if cacheable else None
+    if cached is not None:
+        return cached
+    cache.ensure_listener()
+
+    query, params = queries.list_json_page_query(shop_id, limit, decode_list_cursor(cursor) if cursor else None)
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            db_cursor = conn.cursor()
+            db_cursor.adapters.register_loader("text", _raw_text_loader())
+            await db_cursor.execute(query, params)
+            rows = await db_cursor.fetchall()
+    except Exception as e:
+        logging.error("Error fetching lists as JSON: %s", e)
+        raise
+
+    body, next_cursor, list_ids = queries.json_page(rows, limit)
+    if cacheable:
+        read_cache.put(key, (body, next_cursor), revision, shop_id, [(list_id, shop_id) for list_id in list_ids])
+    return body, next_cursor
+
+
+async def _notify_read_cache(cursor, targets: List[Tuple[Optional[str], Optional[str]]]) -> None:
+    """Queue read cache invalidations for other instances; sent by Postgres on commit"""
+    params = cache.notify_params(targets)
+    if params:
+        await cursor.executemany(queries.NOTIFY_READ_CACHE, params)
+
+
+async def update_item(list_id: str, item_id: str, status: str, qty_collected: Optional[int] = None,
+                      expected_version: Optional[int] = None, shop_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Update an item in a list; raises VersionConflict if ``expected_version`` is stale"""
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            if shop_id:
+                await cursor.execute(queries.UPDATE_SHOP_ITEM, (status, qty_collected, list_id, item_id, expected_version,
+                                                                expected_version, shop_id))
+            else:
+                await cursor.execute(queries.UPDATE_ITEM, (status, qty_collected, list_id, item_id, expected_version, expected_version))
+            row = await cursor.fetchone()
+            if not row:
+                if expected_version is None:
+                    return None
+                if shop_id:
+                    await cursor.execute(queries.SELECT_SHOP_ITEM, (list_id, item_id, shop_id))
+                else:
+                    await cursor.execute(queries.SELECT_ITEM, (list_id, item_id))
+                current = await cursor.fetchone()
+                if current:
+                    raise VersionConflict(queries.item_from_row(current))
+                return None
+
+            item_data = queries.item_from_row(row)
+
+            event = queries.item_updated_event(list_id, item_data, status, qty_collected)
+            await cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+            await _notify_read_cache(cursor, [(list_id, None)])
+
+            await conn.commit()
+            cache.invalidate(list_id, None)
+            return item_data
+    except VersionConflict:
+        raise
+    except Exception as e:
+        logging.error("Error updating item %s in list %s: %s", item_id, list_id, e)
+        raise
+
+
+async def sync_items(changes: List[Dict[str, Any]], shop_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Apply a batch of item changes in one transaction; one result per change, in order
+
+    Each change carries listId, itemId, status and optionally qtyCollected and
+    the expected version. Results are "applied", "conflict" (with the current
+    item) or "not-found"; with ``shop_id``, changes to other shops' lists are
+    "not-found". Applied changes are announced with one items-updated event
+    per list.
+    """
+    if not changes:
+        return []
+    results: List[Dict[str, Any]] = [{}] * len(changes)
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            for indexes in queries.sync_rounds(changes):
+                batch = [changes[index] for index in indexes]
+                await cursor.execute(queries.SYNC_ITEMS, queries.sync_items_params(batch, shop_id))
+                rows = {(row[0], row[1]): row for row in await cursor.fetchall()}
+                for index, change in zip(indexes, batch):
+                    results[index] = queries.sync_result(change, rows.get((change["listId"], change["itemId"])))
+
+            events = queries.items_synced_events(changes, results)
+            if events:
+                await cursor.executemany(queries.INSERT_OUTBOX_EVENT, [queries.outbox_params(event) for event in events])
+            touched = [(event["listId"], None) for event in events]
+            await _notify_read_cache(cursor, touched)
+
+            await conn.commit()
+            cache.invalidate_all(touched)
+            return results
+    except Exception as e:
+        logging.error("Error syncing %d item change(s): %s", len(changes), e)
+        raise
+
+
+async def complete_list(list_id: str, completed_by: Optional[str] = None, shop_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Mark a list as completed"""
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            if shop_id:
+                await cursor.execute(queries.COMPLETE_SHOP_LIST, (completed_by, list_id, shop_id))
+            else:
+                await cursor.execute(queries.COMPLETE_LIST, (completed_by, list_id))
+
+            if cursor.rowcount == 0:
+                return None
+
+            if shop_id:
+                await cursor.execute(queries.SELECT_COMPLETED_SHOP_LIST, (list_id, shop_id))
+            else:
+                await cursor.execute(queries.SELECT_COMPLETED_LIST, (list_id,))
+
+            row = await cursor.fetchone()
+            if not row:
+                return None
+
+            result = queries.completed_from_row(row)
+
+            # The list-completed event carries the items (with SKUs) for payment processing
+            await cursor.execute(queries.SELECT_LIST_ITEMS, (list_id,))
+            event = queries.list_completed_event(result, await cursor.fetchall())
+            await cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+            await _notify_read_cache(cursor, [(list_id, result["shop_id"])])
+
+            await conn.commit()
+            cache.invalidate(list_id, result["shop_id"])
+            return result
+    except Exception as e:
+        logging.error("Error completing list %s: %s", list_id, e)
+        raise
+
+
+async def create_list(title: str, shop_id: str, items: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Create a new shopping list"""
+    list_id = uuid.uuid4().hex
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            await cursor.execute(queries.INSERT_LIST, (list_id, shop_id, title))
+            list_row = await cursor.fetchone()
+
+            item_rows = []
+            if items:
+                await cursor.execute(queries.INSERT_ITEMS, queries.insert_items_params(list_id, items))
+                item_rows = await cursor.fetchall()
+
+            created = queries.created_list(list_row, item_rows)
+            await cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(queries.list_created_event(created)))
+            await _notify_read_cache(cursor, [(None, shop_id)])
+
+            await conn.commit()
+            cache.invalidate(None, shop_id)
+            return created
+    except Exception as e:
+        logging.error("Error creating list: %s", e)
+        raise
+
+
+async def delete_list(list_id: str, shop_id: Optional[str] = None) -> bool:
+    """Delete a shopping list"""
+    try:
+        pool = await get_connection_pool()
+        async with pool.connection() as conn:
+            cursor = conn.cursor()
+            if shop_id:
+                await cursor.execute(queries.DELETE_SHOP_LIST, (list_id, shop_id))
+            else:
+                await cursor.execute(queries.DELETE_LIST, (list_id,))
+
+            row = await cursor.fetchone()
+            success = row is not None
+            if success:
+                event = queries.list_deleted_event(list_id, row[0])
+                await cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+                await _notify_read_cache(cursor, [(list_id, row[0])])
+            await conn.commit()
+            if success:
+                cache.invalidate(list_id, row[0])
+            return success
+    except Exception as e:
+        logging.error("Error deleting list %s: %s", list_id, e)
+        raise
@@ -0,0 +1,247 @@
+"""Read-through cache for get_list / get_lists results
+
+Entries are kept in an LRU map bounded by READ_CACHE_MAX_SIZE and expire
+after READ_CACHE_TTL seconds. The write paths in shared_code.data and
+shared_code.async_data invalidate the affected list and shop after commit.
+With READ_CACHE_NOTIFY they also send a Postgres NOTIFY, and a listener
+thread applies invalidations from other instances.
+
+Entries remember the revision they were loaded at (see schema.sql). A
+caller that already knows the current revision (the ETag handlers) passes
+it to ``get`` and never gets an older copy, even before a notification
+from another instance has arrived. Cached values are shared: treat them as
+read-only. READ_CACHE_ENABLED=false turns the cache off.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import select
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+NOTIFY_CHANNEL = "spar_read_cache"
+
+
+class ReadCache:
+    """LRU + TTL cache with invalidation by list id and shop id"""
+
+    def __init__(self, max_size: int = 1000, ttl: float = 30.0, enabled: bool = True):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.enabled = enabled
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[int], float, Optional[str], Tuple[str, ...]]]" = OrderedDict()
+        self._by_list: Dict[str, Set[Hashable]] = {}
+        self._by_shop: Dict[str, Set[Hashable]] = {}
+        self._list_shops: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable, revision: Optional[int] = None) -> Any:
+        """Cached value, or None on a miss; with ``revision`` only a copy loaded at that revision counts"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            value, entry_revision, expires, _, _ = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            if revision is not None and entry_revision != revision:
+                self._remove(key)
+                self._stats["stale"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, revision: Optional[int] = None,
+            shop_id: Optional[str] = None, list_ids: Iterable[Tuple[str, Optional[str]]] = ()) -> None:
+        """Store ``value``; ``list_ids`` are the (list id, shop id) pairs it contains"""
+        if not self.enabled:
+            return
+        lists = tuple(list_id for list_id, _ in list_ids)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, revision, time.monotonic() + self.ttl, shop_id, lists)
+            if shop_id:
+                self._by_shop.setdefault(shop_id, set()).add(key)
+            for list_id, list_shop in list_ids:
+                self._by_list.setdefault(list_id, set()).add(key)
+                if list_shop:
+                    self._list_shops[list_id] = list_shop
+            while len(self._entries) > self.max_size:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+
+    def invalidate_list(self, list_id: str, shop_id: Optional[str] = None) -> None:
+        """Drop everything containing the list, and the shop's list pages"""
+        with self._lock:
+            shop_id = shop_id or self._list_shops.pop(list_id, None)
+            keys = set(self._by_list.pop(list_id, ()))
+            if shop_id:
+                keys |= self._by_shop.pop(shop_id, set())
+            for key in keys:
+                if self._remove(key):
+                    self._stats["invalidations"] += 1
+
+    def invalidate_shop(self, shop_id: str) -> None:
+        with self._lock:
+            for key in self._by_shop.pop(shop_id, set()):
+                if self._remove(key):
+                    self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_list.clear()
+            self._by_shop.clear()
+            self._list_shops.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries), max_size=self.max_size, enabled=self.enabled)
+
+    def _remove(self, key: Hashable) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        _, _, _, shop_id, lists = entry
+        if shop_id and shop_id in self._by_shop:
+            self._by_shop[shop_id].discard(key)
+            if not self._by_shop[shop_id]:
+                del self._by_shop[shop_id]
+        for list_id in lists:
+            keys = self._by_list.get(list_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_list[list_id]
+                    self._list_shops.pop(list_id, None)
+        return True
+
+
+read_cache = ReadCache(
+    max_size=int(os.getenv("READ_CACHE_MAX_SIZE", "1000")),
+    ttl=float(os.getenv("READ_CACHE_TTL", "30")),
+    enabled=os.getenv("READ_CACHE_ENABLED", "true").lower() in ("1", "true", "yes"),
+)
+
+# Pages of more list and item rows than this are streamed but not cached
+MAX_PAGE_ROWS = int(os.getenv("READ_CACHE_MAX_PAGE_ROWS", "5000"))
+
+# Cross-instance invalidation through LISTEN/NOTIFY
+NOTIFY_ENABLED = read_cache.enabled and os.getenv("READ_CACHE_NOTIFY", "false").lower() in ("1", "true", "yes")
+
+_listener: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+
+
+def list_key(list_id: str, shop_id: Optional[str], raw: bool = False) -> Tuple[str, str, Optional[str]]:
+    """Key for get_list results; ``raw`` for the encoded JSON of get_list_json"""
+    return ("list-json" if raw else "list", list_id, shop_id)
+
+
+def lists_key(shop_id: Optional[str], limit: Optional[int], cursor: Optional[str],
+              raw: bool = False) -> Tuple[str, Optional[str], Optional[int], Optional[str]]:
+    return ("lists-json" if raw else "lists", shop_id, limit, cursor)
+
+
+def caches_page(shop_id: Optional[str], limit: Optional[int]) -> bool:
+    """Whether a get_lists page is read from and stored in the cache
+
+    Only paginated per-shop pages: an unpaginated call returns every list of
+    the shop, and keeping that in memory next to the response would make the
+    default request unbounded twice over.
+    """
+    return read_cache.enabled and bool(shop_id) and limit is not None
+
+
+def notify_payload(list_id: Optional[str], shop_id: Optional[str]) -> str:
+    """Argument for queries.NOTIFY_READ_CACHE"""
+    return json.dumps({"list": list_id, "shop": shop_id})
+
+
+def notify_params(targets: Iterable[Tuple[Optional[str], Optional[str]]]) -> List[Tuple[str]]:
+    """Parameters for executemany(queries.NOTIFY_READ_CACHE, ...); empty unless READ_CACHE_NOTIFY is on
+
+    The notifications go out inside the writing transaction, so Postgres
+    delivers them only if it commits.
+    """
+    if not NOTIFY_ENABLED:
+        return []
+    return [(notify_payload(list_id, shop_id),) for list_id, shop_id in targets]
+
+
+def invalidate(list_id: Optional[str], shop_id: Optional[str]) -> None:
+    """Invalidate after a committed write to a list (or, without list_id, to a shop)"""
+    if list_id:
+        read_cache.invalidate_list(list_id, shop_id)
+    elif shop_id:
+        read_cache.invalidate_shop(shop_id)
+
+
+def invalidate_all(targets: Iterable[Tuple[Optional[str], Optional[str]]]) -> None:
+    for list_id, shop_id in targets:
+        invalidate(list_id, shop_id)
+
+
+def ensure_listener() -> None:
+    """Start the NOTIFY listener thread once, if cross-instance invalidation is on"""
+    global _listener
+    if not NOTIFY_ENABLED or (_listener is not None and _listener.is_alive()):
+        return
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(target=_listen, name="read-cache-listener", daemon=True)
+            _listener.start()
+
+
+def _listen() -> None:
+    from shared_code import lazy
+    from shared_code.settings import database_settings
+
+    psycopg2 = lazy.load("psycopg2")
+    backoff = 1.0
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(**database_settings())
+            conn.autocommit = True
+            conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # Anything may have changed while we were not listening
+            read_cache.clear()
+            backoff = 1.0
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notification = conn.notifies.pop(0)
+                    try:
+                        payload = json.loads(notification.payload)
+                        invalidate(payload.get("list"), payload.get("shop"))
+                    except (ValueError, AttributeError):
+                        read_cache.clear()
+        except Exception as e:
+            logging.warning("Read cache listener disconnected (%s); clearing cache and retrying in %.0fs", e, backoff)
+            read_cache.clear()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
@@ -0,0 +1,142 @@
+"""Cursor classes that time every statement, for shared_code.metrics and the slow-query log
+
+The data layers only install them when metrics or the slow-query log are on
+(``sync_connect_kwargs`` for the psycopg2 pool, ``configure_async`` for the
+psycopg pool), so otherwise they keep the drivers' own cursors. Statements are
+labelled with ``queries.query_name``. A server-side (named) cursor is reported
+when it is closed, with the time spent declaring it and fetching its rows
+(not the time the caller spent on them in between).
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Optional
+
+from shared_code import lazy, metrics, queries, slow_queries
+
+_sync_cursor: Optional[type] = None
+_async_cursors: Optional[tuple] = None
+
+
+def _record(query: Any, params: Any, seconds: float) -> None:
+    metrics.observe("db_query_duration_seconds", seconds, query=queries.query_name(query))
+    limit = slow_queries.threshold()
+    if limit and seconds >= limit:
+        slow_queries.record(query, params, seconds)
+
+
+def sync_cursor_class() -> type:
+    """psycopg2 cursor subclass timing execute/executemany, and iteration of named cursors"""
+    global _sync_cursor
+    if _sync_cursor is None:
+        base = lazy.load("psycopg2.extensions").cursor
+
+        class TimedCursor(base):
+            _statement = None
+            _elapsed = 0.0
+
+            def execute(self, query, vars=None):
+                started = time.perf_counter()
+                try:
+                    return super().execute(query, vars)
+                finally:
+                    if self.name is None:
+                        _record(query, vars, time.perf_counter() - started)
+                    else:
+                        self._statement = (query, vars)
+                        self._elapsed += time.perf_counter() - started
+
+            def executemany(self, query, vars_list):
+                started = time.perf_counter()
+                try:
+                    return super().executemany(query, vars_list)
+                finally:
+                    _record(query, None, time.perf_counter() - started)
+
+            def __next__(self):
+                if self.name is None:
+                    return super().__next__()
+                started = time.perf_counter()
+                try:
+                    return super().__next__()
+                finally:
+                    self._elapsed += time.perf_counter() - started
+
+            def close(self):
+                try:
+                    return super().close()
+                finally:
+                    if self._statement is not None:
+                        query, vars = self._statement
+                        self._statement = None
+                        _record(query, vars, self._elapsed)
+
+        _sync_cursor = TimedCursor
+    return _sync_cursor
+
+
+def async_cursor_classes() -> tuple:
+    """psycopg (client-side, server-side) cursor subclasses timing execute/executemany and fetches"""
+    global _async_cursors
+    if _async_cursors is None:
+        from psycopg import AsyncCursor, AsyncServerCursor
+
+        class TimedAsyncCursor(AsyncCursor):
+            async def execute(self, query, params=None, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await super().execute(query, params, **kwargs)
+                finally:
+                    _record(query, params, time.perf_counter() - started)
+
+            async def executemany(self, query, params_seq, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await super().executemany(query, params_seq, **kwargs)
+                finally:
+                    _record(query, None, time.perf_counter() - started)
+
+        class TimedAsyncServerCursor(AsyncServerCursor):
+            _statement = None
+            _elapsed = 0.0
+
+            async def execute(self, query, params=None, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await super().execute(query, params, **kwargs)
+                finally:
+                    self._statement = (query, params)
+                    self._elapsed += time.perf_counter() - started
+
+            async def __anext__(self):
+                started = time.perf_counter()
+                try:
+                    return await super().__anext__()
+                finally:
+                    self._elapsed += time.perf_counter() - started
+
+            async def close(self):
+                try:
+                    await super().close()
+                finally:
+                    if self._statement is not None:
+                        query, params = self._statement
+                        self._statement = None
+                        _record(query, params, self._elapsed)
+
+        _async_cursors = (TimedAsyncCursor, TimedAsyncServerCursor)
+    return _async_cursors
+
+
+def enabled() -> bool:
+    return metrics.enabled or slow_queries.enabled()
+
+
+def sync_connect_kwargs() -> Dict[str, Any]:
+    """Extra psycopg2.connect arguments for the sync pool (none when timing is off)"""
+    return {"cursor_factory": sync_cursor_class()} if enabled() else {}
+
+
+async def configure_async(conn) -> None:
+    """psycopg_pool ``configure`` callback installing the timed cursors on a new connection"""
+    conn.cursor_factory, conn.server_cursor_factory = async_cursor_classes()
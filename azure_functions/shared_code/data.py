@@ -1,24 +1,28 @@
 from __future__ import annotations
 
-import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 
-# Import database libraries
 import sys
-import os
 
-# Add the site-packages path to sys.path for Azure Functions
+# Add the site-packages path to sys.path for Azure Functions (only where it was deployed)
 site_packages_path = os.path.join(os.getcwd(), ".python_packages", "site-packages")
-if site_packages_path not in sys.path:
+if site_packages_path not in sys.path and os.path.isdir(site_packages_path):
     sys.path.insert(0, site_packages_path)
 
-import psycopg2
+import functools
 import threading
-from queue import Queue, Empty
 import time
 
+from shared_code import cache, cursors, lazy, metrics, queries
+from shared_code.cache import read_cache
+from shared_code.queries import VersionConflict, decode_list_cursor, encode_list_cursor
+from shared_code.settings import database_settings, pool_settings
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_FETCH_SIZE = 1000
+
 # Global connection pool
 _connection_pool = None
 _pool_lock = threading.Lock()
@@ -30,114 +34,45 @@ def get_connection_pool():
         with _pool_lock:
             if _connection_pool is None:  # Double-check locking
                 try:
-                    # Get database connection details from environment variables
-                    host = os.getenv("POSTGRES_HOST")
-                    database = os.getenv("POSTGRES_DATABASE")
-                    user = os.getenv("POSTGRES_USER")
-                    password = os.getenv("POSTGRES_PASSWORD")
-                    port = os.getenv("POSTGRES_PORT", "5432")
-                    
-                    # Try to load from local.settings.json for local development
-                    if not all([host, database, user, password]):
-                        import json
-                        try:
-                            base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
-                            paths = [
-                                os.path.join(os.getcwd(), "local.settings.json"),
-                                os.path.join(base_dir, "local.settings.json"),
-                            ]
-                            for path in paths:
-                                try:
-                                    with open(path, 'r') as f:
-                                        settings = json.load(f)
-                                        values = settings.get('Values', {})
-                                        host = host or values.get('POSTGRES_HOST')
-                                        database = database or values.get('POSTGRES_DATABASE')
-                                        user = user or values.get('POSTGRES_USER')
-                                        password = password or values.get('POSTGRES_PASSWORD')
-                                        port = port or values.get('POSTGRES_PORT', '5432')
-                                        if all([host, database, user, password]):
-                                            break
-                                except:
-                                    continue
-                        except:
-                            pass
-                    
-                    if not all([host, database, user, password]):
-                        raise Exception("Database environment variables are required: POSTGRES_HOST, POSTGRES_DATABASE, POSTGRES_USER, POSTGRES_PASSWORD")
-                    
-                    # Create simple connection pool using Queue
-                    _connection_pool = {
-                        'queue': Queue(maxsize=10),
-                        'host': host,
-                        'database': database,
-                        'user': user,
-                        'password': password,
-                        'port': port,
-                        'created_connections': 0,
-                        'max_connections': 10
-                    }
-                    
-                    # Pre-create one connection
-                    conn = psycopg2.connect(
-                        host=host,
-                        database=database,
-                        user=user,
-                        password=password,
-                        port=port,
-                        sslmode='require'
+                    # psycopg2 is imported on first use rather than at cold start
+                    psycopg2 = lazy.load("psycopg2")
+                    from shared_code.pool import ConnectionPool
+
+                    pool = ConnectionPool(
+                        connect=functools.partial(psycopg2.connect, **database_settings(), **cursors.sync_connect_kwargs()),
+                        **pool_settings()
                     )
-                    _connection_pool['queue'].put(conn)
-                    _connection_pool['created_connections'] = 1
-                    
+
+                    # Pre-create the minimum number of connections
+                    pool.fill()
+                    _connection_pool = pool
+
                     logging.info("Created PostgreSQL connection pool")
-                    
+
                 except Exception as e:
                     logging.error("Failed to create connection pool: %s", e)
                     raise
-    
+
     return _connection_pool
 
 def get_connection():
     """Get database connection from pool"""
     try:
+        if not metrics.enabled:
+            return get_connection_pool().getconn()
         pool = get_connection_pool()
-        
-        # Try to get existing connection
-        try:
-            conn = pool['queue'].get_nowait()
-            return conn
-        except Empty:
-            pass
-        
-        # Create new connection if under limit
-        with _pool_lock:
-            if pool['created_connections'] < pool['max_connections']:
-                conn = psycopg2.connect(
-                    host=pool['host'],
-                    database=pool['database'],
-                    user=pool['user'],
-                    password=pool['password'],
-                    port=pool['port'],
-                    sslmode='require'
-                )
-                pool['created_connections'] += 1
-                return conn
-        
-        # Wait for available connection
-        conn = pool['queue'].get(timeout=30)
+        started = time.perf_counter()
+        conn = pool.getconn()
+        metrics.observe("db_pool_wait_seconds", time.perf_counter() - started, pool="sync")
         return conn
-        
     except Exception as e:
         logging.error("Failed to get connection from pool: %s", e)
         raise
 
 def return_connection(conn):
-    """Return connection to pool"""
+    """Return connection to pool; any open transaction is rolled back"""
     try:
-        pool = get_connection_pool()
-        if conn and not conn.closed:
-            pool['queue'].put(conn)
+        get_connection_pool().putconn(conn)
     except Exception as e:
         logging.error("Failed to return connection to pool: %s", e)
         if conn:
@@ -146,180 +81,258 @@ def return_connection(conn):
             except:
                 pass
 
-def get_lists(shop_id: Optional[str] = None) -> List[Dict[str, Any]]:
-    """Get all lists, optionally filtered by shop_id"""
+def get_pool_stats() -> Dict[str, Any]:
+    """Counters and occupancy of the connection pool (empty before first use)"""
+    pool = _connection_pool
+    return pool.stats() if pool is not None else {}
+
+def _pool_gauges():
+    stats = get_pool_stats()
+    for key in ("size", "idle", "in_use", "max_size"):
+        if key in stats:
+            yield f"db_pool_{key}", {"pool": "sync"}, stats[key]
+
+def _pool_counters():
+    stats = get_pool_stats()
+    for key in ("checkouts", "waits", "timeouts", "evictions", "broken", "connects"):
+        if key in stats:
+            yield f"db_pool_{key}_total", {"pool": "sync"}, stats[key]
+
+if metrics.enabled:
+    metrics.register_collector("gauge", _pool_gauges)
+    metrics.register_collector("counter", _pool_counters)
+
+class ListStream:
+    """Lists with their items, newest first, streamed from a server-side cursor
+
+    Pages are keyset-paginated on (created_at DESC, id DESC). Iterate once;
+    afterwards next_cursor holds the cursor for the following page, or None
+    when this was the last one.
+    """
+
+    def __init__(self, shop_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                 revision: Optional[int] = None):
+        self.shop_id = shop_id
+        self.limit = limit
+        self.cursor = cursor
+        self.after = decode_list_cursor(cursor) if cursor else None
+        # Shop revision read before streaming; cached pages are only reused at the same revision
+        self.revision = revision
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # Only paginated per-shop pages are cached; shop invalidation covers those
+        cacheable = cache.caches_page(self.shop_id, self.limit)
+        key = cache.lists_key(self.shop_id, self.limit, self.cursor)
+        cached = read_cache.get(key, self.revision) if cacheable else None
+        if cached is not None:
+            lists, self.next_cursor = cached
+            yield from lists
+            return
+        cache.ensure_listener()
+
+        query, params = queries.list_stream_query(self.shop_id, self.limit, self.after)
+        collected: Optional[List[Dict[str, Any]]] = [] if cacheable else None
+        rows = 0
+        conn = None
+        try:
+            conn = get_connection()
+            with conn.cursor(name="list_stream") as cursor:
+                cursor.itersize = STREAM_FETCH_SIZE
+                cursor.execute(query, params)
+
+                current: Optional[Dict[str, Any]] = None
+                current_key = None
+                count = 0
+                for row in cursor:
+                    rows += 1
+                    if collected is not None and rows > cache.MAX_PAGE_ROWS:
+                        collected = None
+                    if current is None or current["id"] != row[0]:
+                        if current is not None:
+                            if collected is not None:
+                                collected.append(current)
+                            yield current
+                        count += 1
+                        if self.limit is not None and count > self.limit:
+                            self.next_cursor = encode_list_cursor(*current_key)
+                            current = None
+                            break
+                        current = queries.list_from_row(row[:7])
+                        current_key = (row[4], row[0])
+                    if row[7] is not None:
+                        current["items"].append(queries.item_from_row(row[7:]))
+                if current is not None:
+                    if collected is not None:
+                        collected.append(current)
+                    yield current
+        except Exception as e:
+            logging.error("Error streaming lists: %s", e)
+            raise
+        finally:
+            if conn:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+                return_connection(conn)
+
+        # Only reached when the consumer read the whole page
+        if collected is not None:
+            read_cache.put(key, (collected, self.next_cursor), self.revision, self.shop_id,
+                           [(list_data["id"], list_data["shop_id"]) for list_data in collected])
+
+def get_lists(shop_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Get lists with their items, optionally filtered by shop_id and paginated"""
+    return list(ListStream(shop_id, limit, cursor))
+
+def get_list(list_id: str, shop_id: Optional[str] = None, revision: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Get a specific list by ID
+
+    Served from the read cache when possible; with ``revision`` only a copy
+    loaded at that list revision is used.
+    """
+    key = cache.list_key(list_id, shop_id)
+    cached = read_cache.get(key, revision)
+    if cached is not None:
+        return cached
+    cache.ensure_listener()
+
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
         if shop_id:
-            cursor.execute("""
-                SELECT id, shop_id, title, status, created_at, completed_at, completed_by
-                FROM spar.lists 
-                WHERE shop_id = %s 
-                ORDER BY created_at DESC
-            """, (shop_id,))
+            cursor.execute(queries.SELECT_SHOP_LIST, (list_id, shop_id))
         else:
-            cursor.execute("""
-                SELECT id, shop_id, title, status, created_at, completed_at, completed_by
-                FROM spar.lists 
-                ORDER BY created_at DESC
-            """)
-        
-        lists = []
-        columns = [column[0] for column in cursor.description] if cursor.description else []
-        for row in cursor.fetchall():
-            row_dict = dict(zip(columns, row))
-            list_data = {
-                "id": row_dict["id"],
-                "shop_id": row_dict["shop_id"],
-                "title": row_dict.get("title"),
-                "status": row_dict["status"],
-                "created_at": row_dict["created_at"].isoformat() + "Z" if row_dict["created_at"] else None,
-                "completed_at": row_dict["completed_at"].isoformat() + "Z" if row_dict["completed_at"] else None,
-                "completed_by": row_dict["completed_by"],
-                "items": []
-            }
-            
-            # Get items for this list
-            cursor.execute("""
-                SELECT id, sku, name, qty_requested, qty_collected, status, version
-                FROM spar.list_items 
-                WHERE list_id = %s 
-                ORDER BY id
-            """, (row_dict["id"],))
-            
-            item_columns = [column[0] for column in cursor.description] if cursor.description else []
-            for item_row in cursor.fetchall():
-                item_row_dict = dict(zip(item_columns, item_row))
-                item_data = {
-                    "id": item_row_dict["id"],
-                    "name": item_row_dict["name"],
-                    "qty": item_row_dict["qty_requested"],
-                    "status": item_row_dict["status"],
-                    "version": item_row_dict["version"]
-                }
-                if item_row_dict["qty_collected"] is not None:
-                    item_data["qty_collected"] = item_row_dict["qty_collected"]
-                list_data["items"].append(item_data)
-            
-            lists.append(list_data)
-        
-        return lists
+            cursor.execute(queries.SELECT_LIST, (list_id,))
+
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        list_data = queries.list_from_row(row)
+
+        # Get items for this list
+        cursor.execute(queries.SELECT_LIST_ITEMS, (list_id,))
+        list_data["items"] = [queries.item_from_row(item_row) for item_row in cursor.fetchall()]
+
+        read_cache.put(key, list_data, row[7], list_ids=[(list_id, list_data["shop_id"])])
+        return list_data
     except Exception as e:
-        logging.error("Error fetching lists: %s", e)
+        logging.error("Error fetching list %s: %s", list_id, e)
         raise
     finally:
         if conn:
             return_connection(conn)
 
-def get_list(list_id: str, shop_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
-    """Get a specific list by ID"""
+def _notify_read_cache(cursor, targets: List[Tuple[Optional[str], Optional[str]]]) -> None:
+    """Queue read cache invalidations for other instances; sent by Postgres on commit"""
+    params = cache.notify_params(targets)
+    if params:
+        cursor.executemany(queries.NOTIFY_READ_CACHE, params)
+
+def get_list_json(list_id: str, shop_id: Optional[str] = None, revision: Optional[int] = None) -> Optional[bytes]:
+    """get_list as UTF-8 JSON assembled by Postgres (same document, no row mapping)"""
+    key = cache.list_key(list_id, shop_id, raw=True)
+    cached = read_cache.get(key, revision)
+    if cached is not None:
+        return cached
+    cache.ensure_listener()
+
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
         if shop_id:
-            cursor.execute("""
-                SELECT id, shop_id, title, status, created_at, completed_at, completed_by
-                FROM spar.lists 
-                WHERE id = %s AND shop_id = %s
-            """, (list_id, shop_id))
+            cursor.execute(queries.SELECT_SHOP_LIST_JSON, (list_id, shop_id))
         else:
-            cursor.execute("""
-                SELECT id, shop_id, title, status, created_at, completed_at, completed_by
-                FROM spar.lists 
-                WHERE id = %s
-            """, (list_id,))
-        
-        columns = [column[0] for column in cursor.description] if cursor.description else []
+            cursor.execute(queries.SELECT_LIST_JSON, (list_id,))
         row = cursor.fetchone()
         if not row:
             return None
-        
-        row_dict = dict(zip(columns, row))
-        list_data = {
-            "id": row_dict["id"],
-            "shop_id": row_dict["shop_id"],
-            "title": row_dict.get("title"),
-            "status": row_dict["status"],
-            "created_at": row_dict["created_at"].isoformat() + "Z" if row_dict["created_at"] else None,
-            "completed_at": row_dict["completed_at"].isoformat() + "Z" if row_dict["completed_at"] else None,
-            "completed_by": row_dict["completed_by"],
-            "items": []
-        }
-        
-        # Get items for this list
-        cursor.execute("""
-            SELECT id, sku, name, qty_requested, qty_collected, status, version
-            FROM spar.list_items 
-            WHERE list_id = %s 
-            ORDER BY id
-        """, (list_id,))
-        
-        item_columns = [column[0] for column in cursor.description]
-        for item_row in cursor.fetchall():
-            item_row_dict = dict(zip(item_columns, item_row))
-            item_data = {
-                "id": item_row_dict["id"],
-                "name": item_row_dict["name"],
-                "qty": item_row_dict["qty_requested"],
-                "status": item_row_dict["status"],
-                "version": item_row_dict["version"]
-            }
-            if item_row_dict["qty_collected"] is not None:
-                item_data["qty_collected"] = item_row_dict["qty_collected"]
-            list_data["items"].append(item_data)
-        
-        return list_data
+
+        body = row[2].encode("utf-8")
+        read_cache.put(key, body, row[0], list_ids=[(list_id, row[1])])
+        return body
     except Exception as e:
-        logging.error("Error fetching list %s: %s", list_id, e)
+        logging.error("Error fetching list %s as JSON: %s", list_id, e)
+        raise
+    finally:
+        if conn:
+            return_connection(conn)
+
+def get_lists_json(shop_id: Optional[str] = None, limit: Optional[int] = None, cursor: Optional[str] = None,
+                   revision: Optional[int] = None) -> Tuple[bytes, Optional[str]]:
+    """A page of get_lists as a UTF-8 JSON array assembled by Postgres, and the next cursor"""
+    cacheable = cache.caches_page(shop_id, limit)
+    key = cache.lists_key(shop_id, limit, cursor, raw=True)
+    cached = read_cache.get(key, revision) if cacheable else None
+    if cached is not None:
+        return cached
+    cache.ensure_listener()
+
+    query, params = queries.list_json_page_query(shop_id, limit, decode_list_cursor(cursor) if cursor else None)
+    conn = None
+    try:
+        conn = get_connection()
+        db_cursor = conn.cursor()
+        db_cursor.execute(query, params)
+        rows = [(row[0], row[1], row[2].encode("utf-8")) for row in db_cursor.fetchall()]
+    except Exception as e:
+        logging.error("Error fetching lists as JSON: %s", e)
         raise
     finally:
         if conn:
             return_connection(conn)
 
-def update_item(list_id: str, item_id: str, status: str, qty_collected: Optional[int] = None) -> Optional[Dict[str, Any]]:
-    """Update an item in a list"""
+    body, next_cursor, list_ids = queries.json_page(rows, limit)
+    if cacheable:
+        read_cache.put(key, (body, next_cursor), revision, shop_id, [(list_id, shop_id) for list_id in list_ids])
+    return body, next_cursor
+
+def update_item(list_id: str, item_id: str, status: str, qty_collected: Optional[int] = None,
+                expected_version: Optional[int] = None, shop_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Update an item in a list
+
+    With ``expected_version`` the update only applies if the stored version
+    matches; otherwise VersionConflict is raised carrying the current item.
+    """
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        # Update the item
-        cursor.execute("""
-            UPDATE spar.list_items 
-            SET status = %s, qty_collected = COALESCE(%s, qty_collected), version = version + 1
-            WHERE list_id = %s AND id = %s
-        """, (status, qty_collected, list_id, item_id))
-        
-        if cursor.rowcount == 0:
-            return None
-        
-        # Get the updated item
-        cursor.execute("""
-            SELECT id, sku, name, qty_requested, qty_collected, status, version
-            FROM spar.list_items 
-            WHERE list_id = %s AND id = %s
-        """, (list_id, item_id))
-        
-        columns = [column[0] for column in cursor.description] if cursor.description else []
+        # Update the item and read it back in one statement
+        if shop_id:
+            cursor.execute(queries.UPDATE_SHOP_ITEM, (status, qty_collected, list_id, item_id, expected_version,
+                                                      expected_version, shop_id))
+        else:
+            cursor.execute(queries.UPDATE_ITEM, (status, qty_collected, list_id, item_id, expected_version, expected_version))
         row = cursor.fetchone()
         if not row:
+            if expected_version is None:
+                return None
+            # Tell a stale version apart from a missing item
+            if shop_id:
+                cursor.execute(queries.SELECT_SHOP_ITEM, (list_id, item_id, shop_id))
+            else:
+                cursor.execute(queries.SELECT_ITEM, (list_id, item_id))
+            current = cursor.fetchone()
+            if current:
+                raise VersionConflict(queries.item_from_row(current))
             return None
-        
-        row_dict = dict(zip(columns, row))
-        item_data = {
-            "id": row_dict["id"],
-            "name": row_dict["name"],
-            "qty": row_dict["qty_requested"],
-            "status": row_dict["status"],
-            "version": row_dict["version"]
-        }
-        if row_dict["qty_collected"] is not None:
-            item_data["qty_collected"] = row_dict["qty_collected"]
-        
+
+        item_data = queries.item_from_row(row)
+
+        event = queries.item_updated_event(list_id, item_data, status, qty_collected)
+        cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+        _notify_read_cache(cursor, [(list_id, None)])
+
         conn.commit()
+        cache.invalidate(list_id, None)
         return item_data
+    except VersionConflict:
+        raise
     except Exception as e:
         logging.error("Error updating item %s in list %s: %s", item_id, list_id, e)
         raise
@@ -335,52 +348,33 @@ def complete_list(list_id: str, completed_by: Optional[str] = None, shop_id: Opt
         cursor = conn.cursor()
         # Update the list status
         if shop_id:
-            cursor.execute("""
-                UPDATE spar.lists
-                SET status = 'completed', completed_at = NOW(), completed_by = %s
-                WHERE id = %s AND shop_id = %s
-            """, (completed_by, list_id, shop_id))
+            cursor.execute(queries.COMPLETE_SHOP_LIST, (completed_by, list_id, shop_id))
         else:
-            cursor.execute("""
-                UPDATE spar.lists
-                SET status = 'completed', completed_at = NOW(), completed_by = %s
-                WHERE id = %s
-            """, (completed_by, list_id))
+            cursor.execute(queries.COMPLETE_LIST, (completed_by, list_id))
 
         if cursor.rowcount == 0:
             return None
 
         # Get the updated list
         if shop_id:
-            cursor.execute("""
-                SELECT id, shop_id, title, status, completed_at, completed_by
-                FROM spar.lists
-                WHERE id = %s AND shop_id = %s
-            """, (list_id, shop_id))
+            cursor.execute(queries.SELECT_COMPLETED_SHOP_LIST, (list_id, shop_id))
         else:
-            cursor.execute("""
-                SELECT id, shop_id, title, status, completed_at, completed_by
-                FROM spar.lists
-                WHERE id = %s
-            """, (list_id,))
+            cursor.execute(queries.SELECT_COMPLETED_LIST, (list_id,))
 
-        columns = [column[0] for column in cursor.description] if cursor.description else []
         row = cursor.fetchone()
         if not row:
             return None
 
-        row_dict = dict(zip(columns, row))
-        result = {
-            "listId": row_dict["id"],
-            "shopId": row_dict.get("shop_id"),
-            "shop_id": row_dict.get("shop_id"),
-            "title": row_dict.get("title"),
-            "status": row_dict["status"],
-            "completedAt": row_dict["completed_at"].isoformat() + "Z" if row_dict["completed_at"] else None,
-            "completedBy": row_dict["completed_by"]
-        }
+        result = queries.completed_from_row(row)
+
+        # The list-completed event carries the items (with SKUs) for payment processing
+        cursor.execute(queries.SELECT_LIST_ITEMS, (list_id,))
+        event = queries.list_completed_event(result, cursor.fetchall())
+        cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+        _notify_read_cache(cursor, [(list_id, result["shop_id"])])
 
         conn.commit()
+        cache.invalidate(list_id, result["shop_id"])
         return result
     except Exception as e:
         logging.error("Error completing list %s: %s", list_id, e)
@@ -397,7 +391,6 @@ def complete_list(list_id: str, completed_by: Optional[str] = None, shop_id: Opt
 def create_list(title: str, shop_id: str, items: List[Dict[str, Any]] = None) -> Dict[str, Any]:
     """Create a new shopping list"""
     import uuid
-    from datetime import datetime
 
     list_id = uuid.uuid4().hex
     conn = None
@@ -406,43 +399,22 @@ def create_list(title: str, shop_id: str, items: List[Dict[str, Any]] = None) ->
         conn = get_connection()
         cursor = conn.cursor()
         # Create the list
-        cursor.execute("""
-            INSERT INTO spar.lists (id, shop_id, title, status, created_at)
-            VALUES (%s, %s, %s, 'active', NOW())
-        """, (list_id, shop_id, title))
+        cursor.execute(queries.INSERT_LIST, (list_id, shop_id, title))
+        list_row = cursor.fetchone()
 
-        # Create items
+        # Create all items in one statement
+        item_rows = []
         if items:
-            for item in items:
-                cursor.execute("""
-                    INSERT INTO spar.list_items (id, list_id, sku, name, qty_requested, status, version)
-                    VALUES (%s, %s, %s, %s, %s, %s, 1)
-                """, (
-                    item.get("id", uuid.uuid4().hex),
-                    list_id,
-                    item.get("sku"),
-                    item["name"],
-                    item["qty"],
-                    item.get("status", "pending")
-                ))
+            cursor.execute(queries.INSERT_ITEMS, queries.insert_items_params(list_id, items))
+            item_rows = cursor.fetchall()
 
-        conn.commit()
+        created = queries.created_list(list_row, item_rows)
+        cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(queries.list_created_event(created)))
+        _notify_read_cache(cursor, [(None, shop_id)])
 
-        created = get_list(list_id, shop_id)
-        if created:
-            created["title"] = created.get("title") or title
-            created["shop_id"] = created.get("shop_id") or shop_id
-            return created
-
-        # Fallback structure if the DB lookup fails
-        return {
-            "id": list_id,
-            "title": title,
-            "status": "active",
-            "shop_id": shop_id,
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "items": items or []
-        }
+        conn.commit()
+        cache.invalidate(None, shop_id)
+        return created
     except Exception as e:
         logging.error("Error creating list: %s", e)
         if conn:
@@ -462,12 +434,19 @@ def delete_list(list_id: str, shop_id: Optional[str] = None) -> bool:
         conn = get_connection()
         cursor = conn.cursor()
         if shop_id:
-            cursor.execute("DELETE FROM spar.lists WHERE id = %s AND shop_id = %s", (list_id, shop_id))
+            cursor.execute(queries.DELETE_SHOP_LIST, (list_id, shop_id))
         else:
-            cursor.execute("DELETE FROM spar.lists WHERE id = %s", (list_id,))
+            cursor.execute(queries.DELETE_LIST, (list_id,))
 
-        success = cursor.rowcount > 0
+        row = cursor.fetchone()
+        success = row is not None
+        if success:
+            event = queries.list_deleted_event(list_id, row[0])
+            cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+            _notify_read_cache(cursor, [(list_id, row[0])])
         conn.commit()
+        if success:
+            cache.invalidate(list_id, row[0])
         return success
     except Exception as e:
         logging.error("Error deleting list %s: %s", list_id, e)
@@ -480,3 +459,33 @@ def delete_list(list_id: str, shop_id: Optional[str] = None) -> bool:
     finally:
         if conn:
             return_connection(conn)
+
+def insert_payment_transactions(transactions: List[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
+    """Record completed payments with one statement
+
+    Returns the transaction ids inserted and those skipped because their list
+    no longer exists; the rest were already recorded.
+    """
+    if not transactions:
+        return set(), set()
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.INSERT_PAYMENT_TRANSACTIONS, (
+            [t["transactionId"] for t in transactions],
+            [t["listId"] for t in transactions],
+            [t["shopId"] for t in transactions],
+            [t["amount"] for t in transactions],
+            [t["completedBy"] for t in transactions],
+        ))
+        rows = cursor.fetchall()
+        conn.commit()
+        return ({transaction_id for transaction_id, inserted in rows if inserted},
+                {transaction_id for transaction_id, inserted in rows if not inserted})
+    except Exception as e:
+        logging.error("Error recording %d payment transaction(s): %s", len(transactions), e)
+        raise
+    finally:
+        if conn:
+            return_connection(conn)
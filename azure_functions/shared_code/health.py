@@ -0,0 +1,135 @@
+"""Liveness and readiness answers for the ``health`` function
+
+Liveness is a constant: the worker answered, nothing else is touched.
+Readiness times a ``SELECT 1`` through the async pool (the one the HTTP
+functions use), and reports the occupancy of both connection pools and the
+Service Bus sender state. Pool wait figures are for the period since the
+previous check. The answer is computed at most once per HEALTH_CACHE_SECONDS
+and shared by concurrent probes, so a burst of probes against a struggling
+instance costs one round trip. Only the database decides readiness; Service
+Bus is reported but not required, since events wait in the outbox.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from shared_code import queries
+
+CACHE_SECONDS = float(os.getenv("HEALTH_CACHE_SECONDS", "5"))
+# Longest the readiness check waits for a connection plus the round trip
+DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))
+
+LIVE = {"status": "ok"}
+
+_cached: Optional[Tuple[float, bool, Dict[str, Any]]] = None
+_lock: Optional[asyncio.Lock] = None
+# Cumulative pool counters seen by the previous check, for the recent wait figures
+_previous: Dict[str, Tuple[float, float]] = {}
+
+
+async def readiness() -> Tuple[bool, Dict[str, Any]]:
+    """(ready, report); cached for CACHE_SECONDS"""
+    global _cached, _lock
+    if _lock is None:
+        _lock = asyncio.Lock()
+    cached = _cached
+    if cached is not None and time.monotonic() - cached[0] < CACHE_SECONDS:
+        return cached[1], dict(cached[2], cached=True)
+    async with _lock:
+        cached = _cached
+        if cached is not None and time.monotonic() - cached[0] < CACHE_SECONDS:
+            return cached[1], dict(cached[2], cached=True)
+        ready, report = await _check()
+        _cached = (time.monotonic(), ready, report)
+    return ready, dict(report, cached=False)
+
+
+def reset() -> None:
+    """Forget the cached answer"""
+    global _cached
+    _cached = None
+
+
+async def _check() -> Tuple[bool, Dict[str, Any]]:
+    from shared_code import async_data, data, servicebus
+
+    database = await _database(async_data)
+    pools = {"sync": _sync_pool(data.get_pool_stats()), "async": _async_pool(async_data.get_pool_stats())}
+    ready = database["ok"]
+    return ready, {
+        "status": "ready" if ready else "not-ready",
+        "checkedAt": datetime.now(timezone.utc),
+        "database": database,
+        "pools": pools,
+        "servicebus": _servicebus(servicebus),
+    }
+
+
+async def _database(async_data) -> Dict[str, Any]:
+    started = time.perf_counter()
+    try:
+        pool = await asyncio.wait_for(async_data.get_connection_pool(), DB_TIMEOUT)
+        async with pool.connection(timeout=DB_TIMEOUT) as conn:
+            await asyncio.wait_for(conn.execute(queries.SELECT_ONE), DB_TIMEOUT)
+    except Exception as e:
+        logging.warning("Readiness check: database unavailable: %s", e)
+        return {"ok": False, "error": type(e).__name__, "elapsedMs": _ms_since(started)}
+    return {"ok": True, "selectMs": _ms_since(started)}
+
+
+def _sync_pool(stats: Dict[str, Any]) -> Dict[str, Any]:
+    if not stats:
+        return {"open": False}
+    return {
+        "open": True,
+        "size": stats["size"],
+        "inUse": stats["in_use"],
+        "idle": stats["idle"],
+        "maxSize": stats["max_size"],
+        **_recent_wait("sync", stats["waits"], stats["wait_time_ms"]),
+    }
+
+
+def _async_pool(stats: Dict[str, Any]) -> Dict[str, Any]:
+    if not stats:
+        return {"open": False}
+    return {
+        "open": True,
+        "size": stats.get("pool_size", 0),
+        "inUse": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "idle": stats.get("pool_available", 0),
+        "maxSize": stats.get("pool_max"),
+        **_recent_wait("async", stats.get("requests_queued", 0), stats.get("requests_wait_ms", 0)),
+    }
+
+
+def _recent_wait(pool: str, waits: float, wait_ms: float) -> Dict[str, Any]:
+    """Checkouts that had to wait since the previous check, and their mean wait"""
+    previous_waits, previous_wait_ms = _previous.get(pool, (0, 0.0))
+    _previous[pool] = (waits, wait_ms)
+    recent = max(waits - previous_waits, 0)
+    return {
+        "recentWaits": recent,
+        "recentMeanWaitMs": round(max(wait_ms - previous_wait_ms, 0.0) / recent, 3) if recent else 0.0,
+    }
+
+
+def _servicebus(servicebus) -> Dict[str, Any]:
+    if not servicebus.is_configured():
+        return {"configured": False}
+    stats = servicebus.get_stats()
+    return {
+        "configured": True,
+        "senders": stats.get("senders", []),
+        "sent": stats.get("sent", 0),
+        "failed": stats.get("failed", 0),
+    }
+
+
+def _ms_since(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000.0, 3)
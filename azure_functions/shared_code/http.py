@@ -0,0 +1,166 @@
+"""HTTP helpers shared by the function handlers
+
+Handlers build their responses with ``json_response`` and the status helpers
+below instead of calling ``json.dumps`` themselves. Bodies are encoded by a
+pluggable serializer: orjson when it is installed (it writes UTF-8 bytes
+directly), otherwise the standard library. HTTP_JSON_SERIALIZER=json forces
+the stdlib one. Both produce the same compact JSON, encode datetimes as
+RFC 3339 (naive values are UTC, written with a trailing "Z") and Decimals as
+numbers. Error bodies are encoded once per message and reused.
+"""
+from __future__ import annotations
+
+import datetime
+import decimal
+import functools
+import json
+import logging
+import os
+from typing import Any, Dict, Optional
+
+import azure.functions as func
+
+JSON_MIMETYPE = "application/json"
+NO_CACHE = {"Cache-Control": "no-cache"}
+
+
+def _default(value: Any) -> Any:
+    """Encode the non-JSON types the data layer returns"""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None or value.utcoffset() == datetime.timedelta(0):
+            return value.replace(tzinfo=None).isoformat() + "Z"
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonSerializer:
+    """Standard library encoder"""
+
+    name = "json"
+
+    def __init__(self) -> None:
+        self._encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+
+    def dumps(self, value: Any) -> bytes:
+        return self._encoder.encode(value).encode("utf-8")
+
+
+class OrjsonSerializer:
+    """orjson encoder; datetimes are handled natively, Decimals through the shared default"""
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._dumps = orjson.dumps
+        self._option = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+        self._error = orjson.JSONEncodeError
+
+    def dumps(self, value: Any) -> bytes:
+        try:
+            return self._dumps(value, default=_default, option=self._option)
+        except self._error as exc:
+            # Same exception type as the stdlib serializer for callers
+            raise TypeError(str(exc)) from exc
+
+
+def make_serializer(name: str = "auto"):
+    """Serializer by name ("auto", "orjson" or "json"); "auto" prefers orjson"""
+    if name in ("auto", "orjson"):
+        try:
+            return OrjsonSerializer()
+        except ImportError:
+            if name == "orjson":
+                logging.warning("HTTP_JSON_SERIALIZER=orjson but orjson is not installed; using json")
+    return JsonSerializer()
+
+
+_serializer = make_serializer(os.getenv("HTTP_JSON_SERIALIZER", "auto").lower())
+
+
+def set_serializer(serializer) -> None:
+    """Replace the serializer used by every response helper (anything with ``dumps(value) -> bytes``)"""
+    global _serializer
+    _serializer = serializer
+    _error_body.cache_clear()
+
+
+def get_serializer():
+    return _serializer
+
+
+def dumps(value: Any) -> bytes:
+    """Encode ``value`` as UTF-8 JSON with the configured serializer"""
+    return _serializer.dumps(value)
+
+
+def json_response(value: Any, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> func.HttpResponse:
+    return func.HttpResponse(body=dumps(value), status_code=status_code, headers=headers, mimetype=JSON_MIMETYPE)
+
+
+def raw_json_response(body: bytes, status_code: int = 200, headers: Optional[Dict[str, str]] = None) -> func.HttpResponse:
+    """Response for a body that is already encoded JSON"""
+    return func.HttpResponse(body=body, status_code=status_code, headers=headers, mimetype=JSON_MIMETYPE)
+
+
+@functools.lru_cache(maxsize=256)
+def _error_body(message: str) -> bytes:
+    return dumps({"error": message})
+
+
+def error_response(status_code: int, message: str, headers: Optional[Dict[str, str]] = None) -> func.HttpResponse:
+    """``{"error": message}`` with a body encoded once per distinct message"""
+    return raw_json_response(_error_body(message), status_code, headers)
+
+
+def bad_request(message: str) -> func.HttpResponse:
+    return error_response(400, message)
+
+
+def unauthorized(message: str) -> func.HttpResponse:
+    return error_response(401, message)
+
+
+def forbidden(message: str) -> func.HttpResponse:
+    return error_response(403, message)
+
+
+def not_found(message: str = "not found") -> func.HttpResponse:
+    return error_response(404, message)
+
+
+def server_error(message: str = "database error") -> func.HttpResponse:
+    return error_response(500, message)
+
+
+def service_unavailable(message: str, retry_after: int = 1) -> func.HttpResponse:
+    return error_response(503, message, {"Retry-After": str(retry_after)})
+
+
+def not_modified(etag: str) -> func.HttpResponse:
+    return func.HttpResponse(status_code=304, headers={"ETag": etag, **NO_CACHE})
+
+
+def format_etag(revision) -> str:
+    """Strong ETag for a revision counter"""
+    return f'"{revision}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers ``etag`` (weak comparison, as RFC 9110 requires)"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
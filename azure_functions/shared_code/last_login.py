@@ -0,0 +1,124 @@
+"""Write-behind buffer for spar.users.last_login
+
+``record_login`` only notes the time in process. A background thread writes
+all pending stamps with one UPDATE (queries.UPDATE_LAST_LOGINS) at least every
+LAST_LOGIN_FLUSH_INTERVAL seconds, which bounds how stale last_login can get,
+and sooner once LAST_LOGIN_MAX_PENDING users are waiting. Repeated logins of
+the same user collapse into one row. Stamps that fail to write are kept for
+the next flush, and whatever is pending is written at interpreter exit.
+LAST_LOGIN_FLUSH_INTERVAL=0 has the thread write each stamp as soon as it is
+recorded. The caller (the async auth_login) never waits for the database.
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from shared_code import queries
+from shared_code.data import get_connection, return_connection
+
+_FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_INTERVAL", "10"))
+_MAX_PENDING = int(os.getenv("LAST_LOGIN_MAX_PENDING", "500"))
+
+_pending: Dict[str, datetime] = {}
+_lock = threading.Lock()
+# Serialises flushes so two writers never race on the same stamps
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_stopping = threading.Event()
+_worker: Optional[threading.Thread] = None
+_stats = {"recorded": 0, "written": 0, "flushes": 0, "failed": 0}
+
+
+def record_login(user_id: str) -> None:
+    """Note a successful login; written to the database by the next flush"""
+    now = datetime.now(timezone.utc)
+    with _lock:
+        _pending[user_id] = now
+        _stats["recorded"] += 1
+        full = len(_pending) >= _MAX_PENDING
+    _ensure_worker()
+    if full or _FLUSH_INTERVAL <= 0:
+        _wakeup.set()
+
+
+def flush() -> int:
+    """Write every pending stamp in one statement; returns how many users were updated"""
+    with _flush_lock:
+        with _lock:
+            if not _pending:
+                return 0
+            batch = dict(_pending)
+            _pending.clear()
+
+        conn = None
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
+            cursor.execute(queries.UPDATE_LAST_LOGINS, (list(batch), list(batch.values())))
+            conn.commit()
+        except Exception as e:
+            logging.warning("Writing last_login for %d user(s) failed; retrying on the next flush: %s", len(batch), e)
+            with _lock:
+                _stats["failed"] += 1
+                # Keep the newer of a stamp that arrived meanwhile and the one we failed to write
+                for user_id, stamp in batch.items():
+                    if _pending.get(user_id, stamp) <= stamp:
+                        _pending[user_id] = stamp
+            return 0
+        finally:
+            if conn:
+                return_connection(conn)
+
+        with _lock:
+            _stats["flushes"] += 1
+            _stats["written"] += len(batch)
+        return len(batch)
+
+
+def shutdown(timeout: float = 10.0) -> None:
+    """Stop the flush thread and write whatever is still pending"""
+    global _worker
+    worker = _worker
+    _worker = None
+    if worker is not None:
+        _stopping.set()
+        _wakeup.set()
+        worker.join(timeout)
+        _stopping.clear()
+    flush()
+
+
+def get_stats() -> Dict[str, Any]:
+    with _lock:
+        return dict(_stats, pending=len(_pending))
+
+
+def _ensure_worker() -> None:
+    global _worker
+    if _worker is not None and _worker.is_alive():
+        return
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="last-login-writer", daemon=True)
+            _worker.start()
+
+
+def _run() -> None:
+    while not _stopping.is_set():
+        # Interval 0: only woken by record_login
+        _wakeup.wait(_FLUSH_INTERVAL if _FLUSH_INTERVAL > 0 else None)
+        _wakeup.clear()
+        if _stopping.is_set():
+            return
+        try:
+            flush()
+        except Exception:
+            logging.exception("last_login flush failed")
+
+
+atexit.register(shutdown)
@@ -0,0 +1,43 @@
+"""Deferred imports of the heavy dependencies, with their import cost recorded
+
+psycopg2, psycopg, psycopg_pool, bcrypt and azure.servicebus are only imported
+on first use, so a function that never touches them does not pay for them at
+cold start. The first import of each is timed and logged; ``import_times``
+reports them (the warmup function logs it, benchmarks/bench_cold_start.py
+prints it).
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import Dict
+
+_import_ms: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def load(name: str) -> ModuleType:
+    """Import ``name`` (once) and return the module"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    with _lock:
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = (time.perf_counter() - started) * 1000.0
+        _import_ms[name] = round(elapsed, 3)
+    logging.info("Imported %s in %.1f ms", name, elapsed)
+    return module
+
+
+def import_times() -> Dict[str, float]:
+    """Milliseconds spent on each module first imported through ``load``"""
+    with _lock:
+        return dict(_import_ms)
@@ -0,0 +1,259 @@
+"""In-process metrics for the hot paths, exported in the Prometheus text format
+
+Off unless METRICS_ENABLED=true. When off, ``instrument`` returns handlers
+unchanged, the data layers keep their plain cursors and every ``observe`` /
+``increment`` call returns immediately, so disabled metrics cost one
+attribute check at most.
+
+What is recorded:
+
+- spar_db_query_duration_seconds{query}: each statement sent through the
+  data layers, named after its shared_code.queries constant (shared_code.cursors)
+- spar_db_slow_queries_total{query}: statements over SLOW_QUERY_MS (shared_code.slow_queries)
+- spar_db_pool_wait_seconds{pool}: time to check a connection out of the sync
+  or async pool, plus spar_db_pool_* gauges for their occupancy
+- spar_servicebus_send_seconds{queue} and spar_servicebus_send_failures_total{queue}
+  for the outbox relay's sends
+- spar_outbox_events_parked_total{event_type}: outbox events given up on
+- spar_function_duration_seconds{function,status}: end-to-end handler time
+
+``render()`` produces the exposition served by the ``metrics`` function
+(GET /api/metrics), which Prometheus or an OpenTelemetry collector's
+Prometheus receiver can scrape. Values are per worker process.
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+enabled = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+
+PREFIX = "spar_"
+# Seconds; fine at the low end, where queries and pool checkouts normally sit
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (name, labels, value) samples a collector reports at render time
+Sample = Tuple[str, Dict[str, Any], float]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return {"buckets": dict(zip(self.buckets + (float("inf"),), cumulative)), "sum": total, "count": running}
+
+
+class Counter:
+    def __init__(self) -> None:
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def increment(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Registry:
+    """Histograms and counters by (name, labels), plus gauges pulled from collectors"""
+
+    def __init__(self) -> None:
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], Counter] = {}
+        self._help: Dict[str, str] = {}
+        self._collectors: List[Tuple[str, Callable[[], Iterable[Sample]]]] = []
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def histogram(self, name: str, labels: Dict[str, Any]) -> Histogram:
+        key = (name, _label_key(labels))
+        metric = self._histograms.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._histograms.setdefault(key, Histogram())
+        return metric
+
+    def counter(self, name: str, labels: Dict[str, Any]) -> Counter:
+        key = (name, _label_key(labels))
+        metric = self._counters.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._counters.setdefault(key, Counter())
+        return metric
+
+    def register_collector(self, kind: str, collect: Callable[[], Iterable[Sample]]) -> None:
+        """``collect`` is called at render time; ``kind`` is "gauge" or "counter" for all its samples"""
+        with self._lock:
+            self._collectors.append((kind, collect))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Everything recorded, as plain data (for logs and tests)"""
+        result: Dict[str, Any] = {"histograms": {}, "counters": {}, "gauges": {}}
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            result["histograms"].setdefault(name, []).append({"labels": dict(labels), **histogram.snapshot()})
+        for (name, labels), counter in sorted(self._counters.items()):
+            result["counters"].setdefault(name, []).append({"labels": dict(labels), "value": counter.value})
+        for kind, name, labels, value in self._collect():
+            result["gauges" if kind == "gauge" else "counters"].setdefault(name, []).append(
+                {"labels": labels, "value": value})
+        return result
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        lines: List[str] = []
+        seen = set()
+
+        def header(name: str, kind: str) -> None:
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            header(name, "histogram")
+            data = histogram.snapshot()
+            for bound, count in data["buckets"].items():
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{PREFIX}{name}_bucket{_format_labels(labels + (('le', le),))} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_format_labels(labels)} {data['sum']!r}")
+            lines.append(f"{PREFIX}{name}_count{_format_labels(labels)} {data['count']}")
+        for (name, labels), counter in sorted(self._counters.items()):
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_format_labels(labels)} {counter.value!r}")
+        for kind, name, labels, value in self._collect():
+            header(name, kind)
+            lines.append(f"{PREFIX}{name}{_format_labels(_label_key(labels))} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def _collect(self) -> List[Tuple[str, str, Dict[str, Any], float]]:
+        samples = []
+        for kind, collect in list(self._collectors):
+            try:
+                samples.extend((kind, name, labels, value) for name, labels, value in collect())
+            except Exception as e:
+                logging.warning("Metrics collector %s failed: %s", getattr(collect, "__name__", collect), e)
+        return sorted(samples, key=lambda sample: (sample[1], sorted(sample[2].items())))
+
+
+def _label_key(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+registry = Registry()
+registry.describe("db_query_duration_seconds", "Time to execute a data-layer statement, by shared_code.queries name")
+registry.describe("db_slow_queries_total", "Statements over SLOW_QUERY_MS (shared_code.slow_queries)")
+registry.describe("db_pool_wait_seconds", "Time to check a connection out of the pool")
+registry.describe("servicebus_send_seconds", "Time to hand one batch of messages to Service Bus")
+registry.describe("servicebus_send_failures_total", "Messages Service Bus failed to accept")
+registry.describe("outbox_events_parked_total", "Outbox events given up on after OUTBOX_MAX_ATTEMPTS failed sends")
+registry.describe("function_duration_seconds", "End-to-end handler duration")
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    """Record one value in the ``name`` histogram (no-op when metrics are off)"""
+    if enabled:
+        registry.histogram(name, labels).observe(seconds)
+
+
+def increment(name: str, amount: float = 1.0, **labels: Any) -> None:
+    if enabled:
+        registry.counter(name, labels).increment(amount)
+
+
+def register_collector(kind: str, collect: Callable[[], Iterable[Sample]]) -> None:
+    registry.register_collector(kind, collect)
+
+
+def render() -> str:
+    return registry.render()
+
+
+def snapshot() -> Dict[str, Any]:
+    return registry.snapshot()
+
+
+def instrument(function_name: str) -> Callable[[Callable], Callable]:
+    """Decorator recording a function's end-to-end duration; returns ``fn`` itself when metrics are off
+
+    The wrapper keeps the signature (functools.wraps), which the Functions
+    host reads to bind parameters.
+    """
+
+    def decorate(fn: Callable) -> Callable:
+        if not enabled:
+            return fn
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                status: Optional[Any] = "error"
+                try:
+                    result = await fn(*args, **kwargs)
+                    status = getattr(result, "status_code", "ok")
+                    return result
+                finally:
+                    observe("function_duration_seconds", time.perf_counter() - started,
+                            function=function_name, status=status)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status: Optional[Any] = "error"
+            try:
+                result = fn(*args, **kwargs)
+                status = getattr(result, "status_code", "ok")
+                return result
+            finally:
+                observe("function_duration_seconds", time.perf_counter() - started,
+                        function=function_name, status=status)
+
+        return wrapper
+
+    return decorate
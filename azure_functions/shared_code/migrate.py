@@ -0,0 +1,295 @@
+"""Versioned schema migrations
+
+Every schema change after the original database/schema.sql is a numbered file
+in shared_code/migrations (``NNNN_description.sql``), written so that it also
+applies cleanly to a database loaded from the current schema.sql. Migrations
+are applied in version order, each at most once, and recorded in
+spar.schema_migrations with a checksum of the file. Runners take a Postgres
+advisory lock first, so several instances starting together apply each
+migration once.
+
+A migration runs in one transaction together with its bookkeeping row, unless
+its first line is ``-- migrate: no-transaction``. Such a migration (needed for
+``CREATE INDEX CONCURRENTLY``) is split on the ``;`` ending a line and its
+statements run one by one in autocommit, so they must be safe to repeat
+(``IF NOT EXISTS`` / ``IF EXISTS``): a migration interrupted halfway is run
+again from the start. An invalid index left behind by an interrupted
+``CREATE INDEX CONCURRENTLY IF NOT EXISTS`` is dropped before it is rebuilt.
+
+Run from the function app directory::
+
+    python -m shared_code.migrate status
+    python -m shared_code.migrate up [--target VERSION] [--dry-run]
+
+Deployments run ``up`` as a release step before the new code takes traffic
+(docker-compose has a one-shot ``migrate`` service for it). With
+MIGRATE_ON_STARTUP=true the warmup trigger also applies pending migrations
+(``run_on_startup``); they are never run from a request.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from shared_code import lazy
+from shared_code.settings import database_settings
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION = "-- migrate: no-transaction"
+# pg_try_advisory_lock key shared by every runner
+LOCK_KEY = 0x5350_4152
+LOCK_TIMEOUT = float(os.getenv("MIGRATE_LOCK_TIMEOUT", "300"))
+
+_FILE_NAME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+_STATEMENT_END = re.compile(r";[ \t]*(?:\n|$)")
+_CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)\s+ON\s+(?:ONLY\s+)?(\w+)\.", re.IGNORECASE
+)
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS spar.schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64) NOT NULL,
+        applied_at TIMESTAMP NOT NULL DEFAULT NOW(),
+        duration_ms NUMERIC(12, 3)
+    )
+"""
+SELECT_APPLIED = "SELECT version, checksum, applied_at FROM spar.schema_migrations ORDER BY version"
+INSERT_APPLIED = "INSERT INTO spar.schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)"
+SELECT_INDEX_VALID = """
+    SELECT i.indisvalid
+    FROM pg_index i
+    JOIN pg_class c ON c.oid = i.indexrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE n.nspname = %s AND c.relname = %s
+"""
+
+_startup_lock = threading.Lock()
+_startup_done = False
+
+
+class MigrationError(Exception):
+    pass
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    sql: str
+
+    @property
+    def transactional(self) -> bool:
+        return not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode("utf-8")).hexdigest()
+
+    def statements(self) -> List[str]:
+        """The migration split into statements (no-transaction migrations)"""
+        chunks = (chunk.strip() for chunk in _STATEMENT_END.split(self.sql))
+        return [chunk for chunk in chunks if _strip_comments(chunk)]
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Migrations in ``directory``, in version order"""
+    migrations: Dict[int, Migration] = {}
+    for file_name in sorted(os.listdir(directory)):
+        match = _FILE_NAME.match(file_name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Duplicate migration version {version}: {file_name}")
+        with open(os.path.join(directory, file_name), encoding="utf-8") as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def connect():
+    """A dedicated autocommit connection (not from the pools)"""
+    conn = lazy.load("psycopg2").connect(**database_settings())
+    conn.autocommit = True
+    return conn
+
+
+def status(conn, migrations: Optional[List[Migration]] = None) -> List[Dict[str, Any]]:
+    """Every known migration with whether (and when) it was applied and whether the file changed since"""
+    migrations = discover() if migrations is None else migrations
+    applied = _applied(conn)
+    result = []
+    for migration in migrations:
+        checksum, applied_at = applied.get(migration.version, (None, None))
+        result.append({
+            "version": migration.version,
+            "name": migration.name,
+            "applied_at": applied_at,
+            "changed": checksum is not None and checksum != migration.checksum,
+        })
+    return result
+
+
+def migrate(conn=None, target: Optional[int] = None, dry_run: bool = False,
+            migrations: Optional[List[Migration]] = None) -> List[Migration]:
+    """Apply pending migrations up to ``target`` (all by default); returns the ones applied (or due)"""
+    migrations = discover() if migrations is None else migrations
+    own_conn = conn is None
+    conn = connect() if own_conn else conn
+    conn.autocommit = True
+    try:
+        _lock(conn)
+        try:
+            applied = _applied(conn)
+            for migration in migrations:
+                checksum = applied.get(migration.version, (None,))[0]
+                if checksum is not None and checksum != migration.checksum:
+                    logging.warning("Migration %04d_%s changed after it was applied", migration.version,
+                                    migration.name)
+            due = [m for m in migrations
+                   if m.version not in applied and (target is None or m.version <= target)]
+            if dry_run:
+                return due
+            for migration in due:
+                _apply(conn, migration)
+            return due
+        finally:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def run_on_startup() -> None:
+    """Apply pending migrations once per process when MIGRATE_ON_STARTUP=true (from warmup)
+
+    Failures are logged, not raised: the previous schema keeps serving.
+    """
+    global _startup_done
+    if _startup_done:
+        return
+    with _startup_lock:
+        if _startup_done:
+            return
+        _startup_done = True
+        if os.getenv("MIGRATE_ON_STARTUP", "false").lower() not in ("1", "true", "yes"):
+            return
+        try:
+            applied = migrate()
+            if applied:
+                logging.info("Applied migrations: %s", ", ".join(f"{m.version:04d}_{m.name}" for m in applied))
+        except Exception as e:
+            logging.error("Schema migration at startup failed: %s", e)
+
+
+def _applied(conn) -> Dict[int, tuple]:
+    with conn.cursor() as cursor:
+        cursor.execute(CREATE_MIGRATIONS_TABLE)
+        cursor.execute(SELECT_APPLIED)
+        return {version: (checksum, applied_at) for version, checksum, applied_at in cursor.fetchall()}
+
+
+def _lock(conn) -> None:
+    # Polled rather than pg_advisory_lock: a session blocked in a statement would hold up
+    # the other runner's CREATE INDEX CONCURRENTLY, which waits for open transactions
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    with conn.cursor() as cursor:
+        while True:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (LOCK_KEY,))
+            if cursor.fetchone()[0]:
+                return
+            if time.monotonic() >= deadline:
+                raise MigrationError("Timed out waiting for another migration runner")
+            time.sleep(1.0)
+
+
+def _apply(conn, migration: Migration) -> None:
+    label = f"{migration.version:04d}_{migration.name}"
+    logging.info("Applying migration %s", label)
+    started = time.perf_counter()
+    try:
+        if migration.transactional:
+            conn.autocommit = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(migration.sql)
+                    cursor.execute(INSERT_APPLIED, (migration.version, migration.name, migration.checksum,
+                                                    _ms_since(started)))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.autocommit = True
+            return
+        with conn.cursor() as cursor:
+            for statement in migration.statements():
+                _drop_invalid_index(cursor, statement)
+                cursor.execute(statement)
+            cursor.execute(INSERT_APPLIED, (migration.version, migration.name, migration.checksum,
+                                            _ms_since(started)))
+    except Exception as e:
+        raise MigrationError(f"Migration {label} failed: {e}") from e
+    logging.info("Applied migration %s in %.0f ms", label, _ms_since(started))
+
+
+def _drop_invalid_index(cursor, statement: str) -> None:
+    match = _CONCURRENT_INDEX.search(statement)
+    if not match:
+        return
+    index, schema = match.group(1), match.group(2)
+    cursor.execute(SELECT_INDEX_VALID, (schema, index))
+    row = cursor.fetchone()
+    if row is not None and not row[0]:
+        logging.warning("Dropping invalid index %s.%s left by an interrupted build", schema, index)
+        cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{schema}"."{index}"')
+
+
+def _strip_comments(sql: str) -> str:
+    return "\n".join(line for line in sql.splitlines() if not line.strip().startswith("--")).strip()
+
+
+def _ms_since(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000.0, 3)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m shared_code.migrate", description="Versioned schema migrations")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="list migrations and whether they are applied")
+    up = commands.add_parser("up", help="apply pending migrations")
+    up.add_argument("--target", type=int, help="stop after this version")
+    up.add_argument("--dry-run", action="store_true", help="only list what would be applied")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "status":
+        conn = connect()
+        try:
+            for entry in status(conn):
+                state = f"applied {entry['applied_at']:%Y-%m-%d %H:%M:%S}" if entry["applied_at"] else "pending"
+                changed = "  (file changed since)" if entry["changed"] else ""
+                print(f"{entry['version']:04d}_{entry['name']:<40} {state}{changed}")
+        finally:
+            conn.close()
+        return 0
+
+    due = migrate(target=args.target, dry_run=args.dry_run)
+    if args.dry_run:
+        for migration in due:
+            print(f"{migration.version:04d}_{migration.name} ({'transaction' if migration.transactional else 'no transaction'})")
+    elif not due:
+        print("Schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
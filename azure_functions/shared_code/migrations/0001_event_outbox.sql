@@ -0,0 +1,11 @@
+-- Transactional outbox: domain events written alongside the change they describe,
+-- relayed to Service Bus by the outbox_relay function.
+CREATE TABLE IF NOT EXISTS spar.event_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(100) NOT NULL,
+    list_id VARCHAR(255),
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+COMMENT ON TABLE spar.event_outbox IS 'Domain events pending relay to Service Bus';
@@ -0,0 +1,70 @@
+-- Change tracking for the lists_changes feed: every insert/update stamps the row with the
+-- writing transaction id, deletes leave a tombstone in spar.deleted_records.
+ALTER TABLE spar.lists ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+ALTER TABLE spar.list_items ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS idx_lists_shop_change_xid ON spar.lists(shop_id, change_xid);
+CREATE INDEX IF NOT EXISTS idx_list_items_change_xid ON spar.list_items(change_xid);
+
+CREATE TABLE IF NOT EXISTS spar.deleted_records (
+    id BIGSERIAL PRIMARY KEY,
+    record_type VARCHAR(20) NOT NULL CHECK (record_type IN ('list', 'item')),
+    record_id VARCHAR(255) NOT NULL,
+    list_id VARCHAR(255) NOT NULL,
+    shop_id VARCHAR(255) NOT NULL,
+    change_xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    deleted_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_deleted_records_shop_change_xid ON spar.deleted_records(shop_id, change_xid);
+
+CREATE OR REPLACE FUNCTION spar.stamp_change_xid()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_xid = pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION spar.record_list_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.deleted_records (record_type, record_id, list_id, shop_id)
+    VALUES ('list', OLD.id, OLD.id, OLD.shop_id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Items removed by a list delete cascade are covered by the list's tombstone
+CREATE OR REPLACE FUNCTION spar.record_item_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.deleted_records (record_type, record_id, list_id, shop_id)
+    SELECT 'item', OLD.id, OLD.list_id, l.shop_id
+    FROM spar.lists l
+    WHERE l.id = OLD.list_id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER stamp_lists_change_xid
+    BEFORE UPDATE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.stamp_change_xid();
+
+CREATE OR REPLACE TRIGGER stamp_list_items_change_xid
+    BEFORE UPDATE ON spar.list_items
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.stamp_change_xid();
+
+CREATE OR REPLACE TRIGGER record_lists_deletion
+    AFTER DELETE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.record_list_deletion();
+
+CREATE OR REPLACE TRIGGER record_list_items_deletion
+    AFTER DELETE ON spar.list_items
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.record_item_deletion();
+
+COMMENT ON TABLE spar.deleted_records IS 'Tombstones of deleted lists and items for the change feed';
@@ -0,0 +1,71 @@
+-- Revisions for conditional GETs (ETag): a list's revision moves with any change to it or
+-- its items, a shop's revision with any change to its lists.
+ALTER TABLE spar.lists ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 1;
+
+CREATE TABLE IF NOT EXISTS spar.shop_revisions (
+    shop_id VARCHAR(255) PRIMARY KEY,
+    revision BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION spar.bump_list_revision()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.revision = OLD.revision + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level, so a batch of item changes touches each parent list once
+CREATE OR REPLACE FUNCTION spar.bump_lists_for_items()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE spar.lists SET revision = revision + 1
+        WHERE id IN (SELECT DISTINCT list_id FROM old_items);
+    ELSE
+        UPDATE spar.lists SET revision = revision + 1
+        WHERE id IN (SELECT DISTINCT list_id FROM new_items);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION spar.bump_shop_revision()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.shop_revisions (shop_id, revision)
+    VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.shop_id ELSE NEW.shop_id END, 1)
+    ON CONFLICT (shop_id) DO UPDATE SET revision = spar.shop_revisions.revision + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER bump_lists_revision
+    BEFORE UPDATE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.bump_list_revision();
+
+CREATE OR REPLACE TRIGGER bump_lists_for_item_inserts
+    AFTER INSERT ON spar.list_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_lists_for_items();
+
+CREATE OR REPLACE TRIGGER bump_lists_for_item_updates
+    AFTER UPDATE ON spar.list_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_lists_for_items();
+
+CREATE OR REPLACE TRIGGER bump_lists_for_item_deletes
+    AFTER DELETE ON spar.list_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_lists_for_items();
+
+CREATE OR REPLACE TRIGGER bump_shop_revision
+    AFTER INSERT OR UPDATE OR DELETE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.bump_shop_revision();
+
+COMMENT ON TABLE spar.shop_revisions IS 'Per-shop change counter used as the lists_get ETag';
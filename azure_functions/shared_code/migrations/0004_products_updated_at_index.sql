@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+-- The price cache refresh reads products changed since its watermark (updated_at > ?).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_products_updated_at ON spar.products (updated_at);
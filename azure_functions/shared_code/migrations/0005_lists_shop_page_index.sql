@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- lists_get pages: WHERE shop_id = ? [AND (created_at, id) < (?, ?)] ORDER BY created_at DESC, id DESC LIMIT n.
+-- The composite index returns a page in order without sorting the shop's lists; it also
+-- covers everything idx_lists_shop_id was used for.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lists_shop_created_id ON spar.lists (shop_id, created_at DESC, id DESC);
+DROP INDEX CONCURRENTLY IF EXISTS spar.idx_lists_shop_id;
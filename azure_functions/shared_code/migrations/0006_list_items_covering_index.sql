@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Item fetches (WHERE list_id = ? ORDER BY id, and the per-list joins of the list queries)
+-- read every item column: with them included the items come from the index alone, in order.
+-- Replaces idx_list_items_list_id; its leading column serves the cascade from spar.lists.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_list_items_list_id_id ON spar.list_items (list_id, id)
+    INCLUDE (sku, name, qty_requested, qty_collected, status, version);
+DROP INDEX CONCURRENTLY IF EXISTS spar.idx_list_items_list_id;
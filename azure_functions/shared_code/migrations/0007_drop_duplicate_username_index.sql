@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+-- users.username is UNIQUE, so users_username_key already indexes it; this one only cost writes.
+DROP INDEX CONCURRENTLY IF EXISTS spar.idx_users_username;
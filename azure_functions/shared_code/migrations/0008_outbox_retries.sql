@@ -0,0 +1,6 @@
+-- Outbox events Service Bus rejects are retried with backoff and parked after
+-- OUTBOX_MAX_ATTEMPTS failures, so one poison event cannot hold up the rest.
+ALTER TABLE spar.event_outbox ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE spar.event_outbox ADD COLUMN IF NOT EXISTS next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW();
+ALTER TABLE spar.event_outbox ADD COLUMN IF NOT EXISTS last_error TEXT;
+ALTER TABLE spar.event_outbox ADD COLUMN IF NOT EXISTS parked_at TIMESTAMP;
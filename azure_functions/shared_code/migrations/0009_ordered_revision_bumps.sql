@@ -0,0 +1,52 @@
+-- Revision bumps without lock-order deadlocks. Item statements lock their parent lists in
+-- id order before bumping them, and a shop's revision is bumped once per statement on
+-- spar.lists (shops in shop_id order) rather than once per list row.
+CREATE OR REPLACE FUNCTION spar.bump_lists_for_items()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE spar.lists l SET revision = l.revision + 1
+        FROM (SELECT id FROM spar.lists WHERE id IN (SELECT list_id FROM old_items)
+              ORDER BY id FOR NO KEY UPDATE) locked
+        WHERE l.id = locked.id;
+    ELSE
+        UPDATE spar.lists l SET revision = l.revision + 1
+        FROM (SELECT id FROM spar.lists WHERE id IN (SELECT list_id FROM new_items)
+              ORDER BY id FOR NO KEY UPDATE) locked
+        WHERE l.id = locked.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS bump_shop_revision ON spar.lists;
+
+CREATE OR REPLACE FUNCTION spar.bump_shop_revision()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.shop_revisions AS s (shop_id, revision)
+    SELECT shop_id, 1
+    FROM (SELECT DISTINCT shop_id FROM changed_lists) changed
+    ORDER BY shop_id
+    ON CONFLICT (shop_id) DO UPDATE SET revision = s.revision + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER bump_shop_revision_on_insert
+    AFTER INSERT ON spar.lists
+    REFERENCING NEW TABLE AS changed_lists
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_shop_revision();
+
+CREATE OR REPLACE TRIGGER bump_shop_revision_on_update
+    AFTER UPDATE ON spar.lists
+    REFERENCING NEW TABLE AS changed_lists
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_shop_revision();
+
+CREATE OR REPLACE TRIGGER bump_shop_revision_on_delete
+    AFTER DELETE ON spar.lists
+    REFERENCING OLD TABLE AS changed_lists
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_shop_revision();
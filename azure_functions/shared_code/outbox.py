@@ -0,0 +1,127 @@
+"""Relay of domain events from spar.event_outbox to Service Bus
+
+The data layer writes each event in the same transaction as the change it
+describes, so an event exists if and only if the change was committed. The
+relay claims a batch with FOR UPDATE SKIP LOCKED (concurrent relays never
+pick the same rows), sends it, and deletes the delivered rows in the same
+transaction, so delivery is at-least-once.
+
+If Service Bus rejects the batch, its events are sent one by one to find the
+ones at fault. An event that fails is retried after a backoff of
+OUTBOX_RETRY_SECONDS, doubling up to OUTBOX_RETRY_MAX_SECONDS, and parked
+after OUTBOX_MAX_ATTEMPTS failures: it stays in the table with ``parked_at``
+and ``last_error`` set and is no longer claimed, so one poison event (e.g. a
+payload over the message size limit) cannot hold up the events behind it. A
+retried event can arrive after later events of the same list. Errors that
+mean Service Bus itself is unavailable (``servicebus.is_outage``: connection,
+authentication, timeouts, throttling, a missing or full queue) never count as
+an attempt: the rest of the batch is left as it is for the next run, so an
+outage of any length parks nothing.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from typing import Dict, List
+
+from shared_code import metrics, queries, servicebus
+from shared_code.data import get_connection, return_connection
+
+# Events claimed per transaction
+BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "10"))
+RETRY_SECONDS = float(os.getenv("OUTBOX_RETRY_SECONDS", "5"))
+RETRY_MAX_SECONDS = float(os.getenv("OUTBOX_RETRY_MAX_SECONDS", "900"))
+
+
+def relay(batch_size: int = BATCH_SIZE, max_batches: int = 20) -> int:
+    """Send pending outbox events; returns how many were relayed"""
+    relayed = 0
+    for _ in range(max_batches):
+        count = relay_batch(batch_size)
+        relayed += count
+        if count < batch_size:
+            break
+    return relayed
+
+
+def relay_batch(batch_size: int = BATCH_SIZE) -> int:
+    """Claim, send and delete one batch of outbox events in a single transaction; returns how many were delivered"""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(queries.CLAIM_OUTBOX_EVENTS, (batch_size,))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        if servicebus.is_configured():
+            delivered = _send(cursor, rows)
+        else:
+            logging.info("SERVICEBUS_CONNECTION missing; discarding %d outbox event(s)", len(rows))
+            delivered = [row[0] for row in rows]
+
+        if delivered:
+            cursor.execute(queries.DELETE_OUTBOX_EVENTS, (delivered,))
+        conn.commit()
+        return len(delivered)
+    except Exception as e:
+        logging.error("Error relaying outbox events: %s", e)
+        raise
+    finally:
+        if conn:
+            return_connection(conn)
+
+
+def backoff(attempts: int) -> float:
+    """Seconds before an event that failed ``attempts`` times is tried again"""
+    return min(RETRY_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def _send(cursor, rows) -> List[int]:
+    """Send the claimed rows; returns the ids delivered and records the failures"""
+    try:
+        _send_rows(rows)
+        return [row[0] for row in rows]
+    except Exception as e:
+        if servicebus.is_outage(e):
+            logging.warning("Service Bus unavailable; %d outbox event(s) left for the next run: %s", len(rows), e)
+            return []
+        logging.warning("Outbox batch of %d event(s) failed, sending them one by one: %s", len(rows), e)
+
+    delivered: List[int] = []
+    for index, row in enumerate(rows):
+        try:
+            _send_rows([row])
+        except Exception as e:
+            if servicebus.is_outage(e):
+                logging.warning("Service Bus unavailable; %d outbox event(s) left for the next run: %s",
+                                len(rows) - index, e)
+                break
+            _record_failure(cursor, row, e)
+            continue
+        delivered.append(row[0])
+    return delivered
+
+
+def _send_rows(rows) -> None:
+    by_queue: Dict[str, List[str]] = {}
+    for _, event_type, body, _ in rows:
+        for queue_name in servicebus.queue_names(event_type):
+            by_queue.setdefault(queue_name, []).append(body)
+    for queue_name, bodies in by_queue.items():
+        servicebus.send_events(queue_name, bodies)
+
+
+def _record_failure(cursor, row, error: Exception) -> None:
+    event_id, event_type, _, attempts = row
+    attempts += 1
+    park = attempts >= MAX_ATTEMPTS
+    cursor.execute(queries.RECORD_OUTBOX_FAILURE, (attempts, str(error)[:1000], backoff(attempts), park, event_id))
+    if park:
+        metrics.increment("outbox_events_parked_total", event_type=event_type)
+        logging.error("Outbox event %s (%s) parked after %d failed sends: %s", event_id, event_type, attempts, error)
+    else:
+        logging.warning("Outbox event %s (%s) failed (attempt %d), retrying in %.0f s: %s", event_id, event_type,
+                        attempts, backoff(attempts), error)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the pool's wait timeout"""
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 connection pool
+
+    - keeps between min_size and max_size connections open
+    - checks connections on checkout: closed or broken ones are replaced, and
+      ones idle for longer than check_after seconds are pinged first
+    - closes connections older than max_lifetime, and idle ones beyond
+      min_size after max_idle seconds
+    - rolls back whatever a caller left open when the connection comes back
+    - waits at most timeout seconds for a free connection, then raises PoolTimeout
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 10,
+        timeout: float = 5.0,
+        max_lifetime: float = 1800.0,
+        max_idle: float = 300.0,
+        check_after: float = 30.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_after = check_after
+
+        self._cond = threading.Condition()
+        # (connection, idle_since) pairs, most recently returned on the right
+        self._idle: Deque[Tuple[Any, float]] = deque()
+        # id(connection) -> creation time for every connection the pool owns
+        self._born: Dict[int, float] = {}
+        self._size = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._evictions = 0
+        self._broken = 0
+        self._connects = 0
+
+    def fill(self) -> None:
+        """Open connections until the pool holds min_size of them"""
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            conn = self._open()
+            self._put_idle(conn)
+
+    def getconn(self):
+        """Check out a healthy connection, waiting up to timeout seconds for one"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("connection pool is closed")
+                    entry = self._pop_idle()
+                    if entry is not None:
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            "no database connection available after %.1fs (%d of %d in use)"
+                            % (self.timeout, self._size - len(self._idle), self.max_size)
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                conn = self._open()
+            else:
+                conn, idle_since = entry
+                if not self._is_healthy(conn, idle_since):
+                    self._discard(conn, broken=True)
+                    continue
+
+            with self._cond:
+                self._checkouts += 1
+                if waited:
+                    self._waits += 1
+                    self._wait_time += time.monotonic() - started
+            return conn
+
+    def putconn(self, conn) -> None:
+        """Return a connection, rolling back any transaction left open on it"""
+        if id(conn) not in self._born:
+            conn.close()
+            return
+        if conn.closed or self._closed:
+            self._discard(conn, broken=bool(conn.closed))
+            return
+        try:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._discard(conn, broken=True)
+                return
+            if status != extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            if conn.autocommit:
+                conn.autocommit = False
+        except psycopg2.Error as e:
+            logging.warning("Discarding connection that failed to reset: %s", e)
+            self._discard(conn, broken=True)
+            return
+        if time.monotonic() - self._born[id(conn)] > self.max_lifetime:
+            self._discard(conn, evicted=True)
+            return
+        self._put_idle(conn)
+
+    def close(self) -> None:
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = [conn for conn, _ in self._idle]
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn in idle:
+            self._discard(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000.0, 3),
+                "timeouts": self._timeouts,
+                "evictions": self._evictions,
+                "broken": self._broken,
+                "connects": self._connects,
+            }
+
+    def _open(self):
+        """Open a connection for a slot already reserved in _size"""
+        try:
+            conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._born[id(conn)] = time.monotonic()
+            self._connects += 1
+        return conn
+
+    def _pop_idle(self) -> Optional[Tuple[Any, float]]:
+        """Take the most recently used idle connection, evicting expired ones; caller holds the lock"""
+        now = time.monotonic()
+        # The oldest idle connections sit on the left; trim those idle too long
+        while self._idle and self._size > self.min_size and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._drop_locked(conn, evicted=True)
+        while self._idle:
+            conn, idle_since = self._idle.pop()
+            if now - self._born[id(conn)] > self.max_lifetime:
+                self._drop_locked(conn, evicted=True)
+                continue
+            return conn, idle_since
+        return None
+
+    def _is_healthy(self, conn, idle_since: float) -> bool:
+        if conn.closed or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            return False
+        if time.monotonic() - idle_since < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logging.warning("Discarding broken pooled connection: %s", e)
+            return False
+
+    def _put_idle(self, conn) -> None:
+        with self._cond:
+            if self._closed:
+                self._drop_locked(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _discard(self, conn, evicted: bool = False, broken: bool = False) -> None:
+        with self._cond:
+            self._drop_locked(conn, evicted, broken)
+            self._cond.notify()
+
+    def _drop_locked(self, conn, evicted: bool = False, broken: bool = False) -> None:
+        if self._born.pop(id(conn), None) is not None:
+            self._size -= 1
+        if evicted:
+            self._evictions += 1
+        if broken:
+            self._broken += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
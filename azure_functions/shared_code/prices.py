@@ -0,0 +1,175 @@
+"""Process-wide product price cache for the payment engine
+
+Prices are looked up with a single ``sku = ANY(%s)`` query for whatever is not
+cached. Entries expire after PRICE_CACHE_TTL seconds and the least recently
+used are evicted beyond PRICE_CACHE_MAX_SIZE. Every PRICE_CACHE_REFRESH_INTERVAL
+seconds the cache asks Postgres for products whose ``updated_at`` moved past
+the last watermark and refreshes just those entries, so price changes show up
+without waiting for the TTL. ``updated_at`` is the writing transaction's start
+time, so a change committed after a refresh may carry a time below the
+watermark; each refresh therefore looks PRICE_CACHE_REFRESH_OVERLAP seconds
+further back and re-reads what it already saw there. Writes that stay open
+longer than that are only picked up when their entries expire. Unknown SKUs
+are cached as None; inserting the product later also moves ``updated_at`` and
+is picked up by the same refresh.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from shared_code import queries
+from shared_code.data import get_connection, return_connection
+
+_MAX_SIZE = int(os.getenv("PRICE_CACHE_MAX_SIZE", "10000"))
+_TTL = float(os.getenv("PRICE_CACHE_TTL", "300"))
+_REFRESH_INTERVAL = float(os.getenv("PRICE_CACHE_REFRESH_INTERVAL", "30"))
+_REFRESH_OVERLAP = float(os.getenv("PRICE_CACHE_REFRESH_OVERLAP", "60"))
+
+
+class PriceCache:
+    """LRU + TTL map of sku -> price, kept fresh through products.updated_at"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0, refresh_interval: float = 30.0,
+                 refresh_overlap: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.refresh_interval = refresh_interval
+        self.refresh_overlap = timedelta(seconds=refresh_overlap)
+        self._entries: "OrderedDict[str, Tuple[Optional[Decimal], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._watermark = None
+        self._next_refresh = 0.0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0, "refreshes": 0}
+
+    def lookup(self, skus: Iterable[str]) -> Tuple[Dict[str, Optional[Decimal]], List[str]]:
+        """Split skus into cached prices and the ones that must be fetched"""
+        now = time.monotonic()
+        found: Dict[str, Optional[Decimal]] = {}
+        missing: List[str] = []
+        with self._lock:
+            for sku in skus:
+                entry = self._entries.get(sku)
+                if entry is not None and entry[1] <= now:
+                    del self._entries[sku]
+                    self._stats["expirations"] += 1
+                    entry = None
+                if entry is None:
+                    missing.append(sku)
+                    continue
+                self._entries.move_to_end(sku)
+                found[sku] = entry[0]
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(missing)
+        return found, missing
+
+    def store(self, prices: Dict[str, Optional[Decimal]]) -> None:
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for sku, price in prices.items():
+                self._entries[sku] = (price, expires)
+                self._entries.move_to_end(sku)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def refresh_due(self) -> bool:
+        return time.monotonic() >= self._next_refresh
+
+    def refresh(self, cursor) -> None:
+        """Apply product changes made since the last refresh"""
+        with self._lock:
+            watermark = self._watermark
+            self._next_refresh = time.monotonic() + self.refresh_interval
+        if watermark is None:
+            # First use: anything cached from here on is at least as new as this
+            cursor.execute(queries.SELECT_PRODUCTS_WATERMARK)
+            row = cursor.fetchone()
+            with self._lock:
+                # An empty products table has no watermark yet; every later row is newer than this
+                self._watermark = (row[0] if row else None) or datetime.min
+                self._entries.clear()
+            return
+
+        # Look back by the overlap for changes committed after the previous refresh read past them
+        since = watermark - self.refresh_overlap if watermark - datetime.min > self.refresh_overlap else watermark
+        cursor.execute(queries.SELECT_CHANGED_PRODUCT_PRICES, (since,))
+        rows = cursor.fetchall()
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._stats["refreshes"] += 1
+            for sku, price, updated_at in rows:
+                entry = self._entries.get(sku)
+                # Rows in the overlap are mostly seen already; only changed prices count
+                if entry is not None and entry[0] != price:
+                    self._entries[sku] = (price, expires)
+                    self._stats["invalidations"] += 1
+                if updated_at > self._watermark:
+                    self._watermark = updated_at
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._watermark = None
+            self._next_refresh = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats, size=len(self._entries), max_size=self.max_size)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+_cache = PriceCache(_MAX_SIZE, _TTL, _REFRESH_INTERVAL, _REFRESH_OVERLAP)
+
+
+def get_prices(skus: Iterable[str]) -> Dict[str, Optional[Decimal]]:
+    """Price per SKU (None when the product does not exist)
+
+    Only takes a database connection when a change check is due or some SKU
+    is not cached.
+    """
+    unique = list(dict.fromkeys(sku for sku in skus if sku))
+    if not unique:
+        return {}
+
+    conn = None
+    try:
+        if _cache.refresh_due():
+            conn = get_connection()
+            _cache.refresh(conn.cursor())
+
+        prices, missing = _cache.lookup(unique)
+        if missing:
+            if conn is None:
+                conn = get_connection()
+            cursor = conn.cursor()
+            cursor.execute(queries.SELECT_PRODUCT_PRICES, (missing,))
+            fetched: Dict[str, Optional[Decimal]] = dict.fromkeys(missing)
+            fetched.update(cursor.fetchall())
+            _cache.store(fetched)
+            prices.update(fetched)
+    finally:
+        if conn:
+            return_connection(conn)
+
+    stats = _cache.stats()
+    logging.info("Price lookup for %d SKU(s): %d fetched from database; cache hit rate %.1f%% (%d entries)",
+                 len(unique), len(missing), stats["hit_rate"] * 100, stats["size"])
+    return prices
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    """Counters of the process-wide price cache"""
+    return _cache.stats()
+
+
+def clear_cache() -> None:
+    _cache.clear()
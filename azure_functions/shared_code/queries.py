@@ -0,0 +1,630 @@
+"""SQL and row mapping shared by the sync (data) and async (async_data) layers
+
+Both psycopg2 and psycopg 3 use %s placeholders, so the statements here run
+unchanged on either driver.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+LIST_COLUMNS = "id, shop_id, title, status, created_at, completed_at, completed_by"
+ITEM_COLUMNS = "id, sku, name, qty_requested, qty_collected, status, version"
+_ITEM_WIDTH = len(ITEM_COLUMNS.split(", "))
+
+
+def _item_columns(alias: str) -> str:
+    return ", ".join(f"{alias}.{column}" for column in ITEM_COLUMNS.split(", "))
+
+
+# The trailing revision column is ignored by list_from_row; get_list stores it with cached copies
+SELECT_LIST = f"SELECT {LIST_COLUMNS}, revision FROM spar.lists WHERE id = %s"
+SELECT_SHOP_LIST = SELECT_LIST + " AND shop_id = %s"
+
+# Validators for conditional GETs; both are maintained by triggers (see schema.sql)
+SELECT_LIST_REVISION = "SELECT revision FROM spar.lists WHERE id = %s"
+SELECT_SHOP_LIST_REVISION = SELECT_LIST_REVISION + " AND shop_id = %s"
+SELECT_SHOP_REVISION = "SELECT revision FROM spar.shop_revisions WHERE shop_id = %s"
+
+
+def _json_timestamp(column: str) -> str:
+    """SQL for a timestamp as shared_code.http writes it (microseconds only when non-zero, "Z")"""
+    return (
+        f"""to_char({column}, 'YYYY-MM-DD"T"HH24:MI:SS')"""
+        f""" || CASE WHEN to_char({column}, 'US') = '000000' THEN '' ELSE '.' || to_char({column}, 'US') END || 'Z'"""
+    )
+
+
+# One list with its items as JSON text, built by Postgres (SQL_JSON_ENDPOINTS). Same keys,
+# order and values as list_from_row/item_from_row; json_strip_nulls only drops qty_collected.
+LIST_DOCUMENT = f"""
+    json_build_object(
+        'id', l.id, 'shop_id', l.shop_id, 'title', l.title, 'status', l.status,
+        'created_at', {_json_timestamp("l.created_at")},
+        'completed_at', {_json_timestamp("l.completed_at")},
+        'completed_by', l.completed_by,
+        'items', COALESCE((
+            SELECT json_agg(json_strip_nulls(json_build_object(
+                'id', i.id, 'name', i.name, 'qty', i.qty_requested, 'status', i.status,
+                'version', i.version, 'qty_collected', i.qty_collected
+            )) ORDER BY i.id)
+            FROM spar.list_items i
+            WHERE i.list_id = l.id
+        ), '[]'::json)
+    )::text
+"""
+
+SELECT_LIST_JSON = f"SELECT l.revision, l.shop_id, {LIST_DOCUMENT} FROM spar.lists l WHERE l.id = %s"
+SELECT_SHOP_LIST_JSON = SELECT_LIST_JSON + " AND l.shop_id = %s"
+
+SELECT_LIST_ITEMS = f"""
+    SELECT {ITEM_COLUMNS}
+    FROM spar.list_items
+    WHERE list_id = %s
+    ORDER BY id
+"""
+
+# The last parameter is the expected version (passed twice); NULL skips the check
+UPDATE_ITEM = f"""
+    UPDATE spar.list_items
+    SET status = %s, qty_collected = COALESCE(%s, qty_collected), version = version + 1
+    WHERE list_id = %s AND id = %s
+      AND (%s::integer IS NULL OR version = %s::integer)
+    RETURNING {ITEM_COLUMNS}
+"""
+# UPDATE_ITEM limited to lists of one shop (last parameter)
+UPDATE_SHOP_ITEM = f"""
+    UPDATE spar.list_items
+    SET status = %s, qty_collected = COALESCE(%s, qty_collected), version = version + 1
+    WHERE list_id = %s AND id = %s
+      AND (%s::integer IS NULL OR version = %s::integer)
+      AND EXISTS (SELECT 1 FROM spar.lists l WHERE l.id = list_items.list_id AND l.shop_id = %s)
+    RETURNING {ITEM_COLUMNS}
+"""
+
+# Set-based variant of UPDATE_ITEM for items_sync: one array parameter per column
+# (list_id, item_id, status, qty_collected, expected_version), each item at most once,
+# then the shop the lists must belong to (twice; NULL for any shop). Yields per change in
+# that shop the updated row (NULL if not applied) and the row as it was before the
+# statement (NULL if the item does not exist).
+SYNC_ITEMS = f"""
+    WITH c AS (
+        SELECT *
+        FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::integer[], %s::integer[])
+            AS c(list_id, item_id, status, qty_collected, expected_version)
+        WHERE %s::varchar IS NULL
+           OR EXISTS (SELECT 1 FROM spar.lists l WHERE l.id = c.list_id AND l.shop_id = %s::varchar)
+    ), updated AS (
+        UPDATE spar.list_items i
+        SET status = c.status, qty_collected = COALESCE(c.qty_collected, i.qty_collected), version = i.version + 1
+        FROM c
+        WHERE i.list_id = c.list_id AND i.id = c.item_id
+          AND (c.expected_version IS NULL OR i.version = c.expected_version)
+        RETURNING i.list_id, {_item_columns("i")}
+    )
+    SELECT c.list_id, c.item_id,
+           {_item_columns("u")},
+           {_item_columns("i")}
+    FROM c
+    LEFT JOIN updated u ON u.list_id = c.list_id AND u.id = c.item_id
+    LEFT JOIN spar.list_items i ON i.list_id = c.list_id AND i.id = c.item_id
+"""
+
+SELECT_ITEM = f"""
+    SELECT {ITEM_COLUMNS}
+    FROM spar.list_items
+    WHERE list_id = %s AND id = %s
+"""
+SELECT_SHOP_ITEM = SELECT_ITEM + " AND EXISTS (SELECT 1 FROM spar.lists l WHERE l.id = list_items.list_id AND l.shop_id = %s)"
+
+COMPLETE_LIST = """
+    UPDATE spar.lists
+    SET status = 'completed', completed_at = NOW(), completed_by = %s
+    WHERE id = %s
+"""
+COMPLETE_SHOP_LIST = COMPLETE_LIST + " AND shop_id = %s"
+
+SELECT_COMPLETED_LIST = """
+    SELECT id, shop_id, title, status, completed_at, completed_by
+    FROM spar.lists
+    WHERE id = %s
+"""
+SELECT_COMPLETED_SHOP_LIST = SELECT_COMPLETED_LIST + " AND shop_id = %s"
+
+INSERT_LIST = f"""
+    INSERT INTO spar.lists (id, shop_id, title, status, created_at)
+    VALUES (%s, %s, %s, 'active', NOW())
+    RETURNING {LIST_COLUMNS}
+"""
+
+# All items of a list in one statement: one array parameter per column (see insert_items_params)
+INSERT_ITEMS = f"""
+    INSERT INTO spar.list_items (id, list_id, sku, name, qty_requested, status, version)
+    SELECT t.id, %s, t.sku, t.name, t.qty, t.status, 1
+    FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::integer[], %s::varchar[])
+        AS t(id, sku, name, qty, status)
+    RETURNING {ITEM_COLUMNS}
+"""
+
+SELECT_PRODUCT_PRICES = "SELECT sku, price FROM spar.products WHERE sku = ANY(%s)"
+
+# Products changed since a previous updated_at watermark (maintained by the update trigger)
+SELECT_CHANGED_PRODUCT_PRICES = """
+    SELECT sku, price, updated_at
+    FROM spar.products
+    WHERE updated_at > %s
+"""
+SELECT_PRODUCTS_WATERMARK = "SELECT MAX(updated_at) FROM spar.products"
+
+# Bulk insert of one batch of payments; rows for lists deleted in the meantime are skipped
+# and redelivered payments (same transaction_id) are no-ops
+# One row per transaction not recorded before: (transaction_id, inserted); inserted is
+# false when the list was deleted before its payment could be recorded
+INSERT_PAYMENT_TRANSACTIONS = """
+    WITH t AS (
+        SELECT *
+        FROM unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::numeric[], %s::varchar[])
+            AS t(transaction_id, list_id, shop_id, amount, completed_by)
+    ), inserted AS (
+        INSERT INTO spar.payment_transactions (transaction_id, list_id, shop_id, amount, status, completed_by)
+        SELECT t.transaction_id, t.list_id, t.shop_id, t.amount, 'completed', t.completed_by
+        FROM t
+        WHERE EXISTS (SELECT 1 FROM spar.lists l WHERE l.id = t.list_id)
+        ON CONFLICT (transaction_id) DO NOTHING
+        RETURNING transaction_id
+    )
+    SELECT transaction_id, TRUE FROM inserted
+    UNION ALL
+    SELECT t.transaction_id, FALSE
+    FROM t
+    WHERE NOT EXISTS (SELECT 1 FROM spar.lists l WHERE l.id = t.list_id)
+      AND NOT EXISTS (SELECT 1 FROM spar.payment_transactions p WHERE p.transaction_id = t.transaction_id)
+"""
+
+# auth_login; the password check happens after the connection is returned
+SELECT_USER_FOR_LOGIN = """
+    SELECT id, username, password_hash, shop_id, role, active
+    FROM spar.users
+    WHERE username = %s
+"""
+
+# Readiness round trip (shared_code.health)
+SELECT_ONE = "SELECT 1"
+
+# Buffered login stamps (shared_code.last_login); GREATEST keeps a late flush from moving a stamp back
+UPDATE_LAST_LOGINS = """
+    UPDATE spar.users u
+    SET last_login = GREATEST(u.last_login, s.last_login)
+    FROM unnest(%s::varchar[], %s::timestamptz[]) AS s(id, last_login)
+    WHERE u.id = s.id
+"""
+
+DELETE_LIST = "DELETE FROM spar.lists WHERE id = %s RETURNING shop_id"
+DELETE_SHOP_LIST = "DELETE FROM spar.lists WHERE id = %s AND shop_id = %s RETURNING shop_id"
+
+# Change feed (lists_changes). The reads run in one REPEATABLE READ transaction so the
+# returned rows and the next cursor (the snapshot's xmin) come from the same snapshot.
+# Rows carry the id of the transaction that last wrote them (change_xid, see schema.sql).
+BEGIN_CHANGES_SNAPSHOT = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+SELECT_SNAPSHOT_XMIN = "SELECT pg_snapshot_xmin(pg_current_snapshot())::text"
+
+SELECT_CHANGED_LISTS = f"""
+    SELECT {LIST_COLUMNS}
+    FROM spar.lists
+    WHERE shop_id = %s AND change_xid >= %s::xid8
+    ORDER BY created_at DESC, id DESC
+"""
+
+SELECT_CHANGED_ITEMS = f"""
+    SELECT i.list_id, {_item_columns("i")}
+    FROM spar.list_items i
+    JOIN spar.lists l ON l.id = i.list_id
+    WHERE l.shop_id = %s AND i.change_xid >= %s::xid8
+    ORDER BY i.list_id, i.id
+"""
+
+SELECT_DELETED_RECORDS = """
+    SELECT record_type, record_id, list_id
+    FROM spar.deleted_records
+    WHERE shop_id = %s AND change_xid >= %s::xid8
+    ORDER BY id
+"""
+
+# Cross-instance read cache invalidation (shared_code.cache); delivered on commit
+NOTIFY_READ_CACHE = "SELECT pg_notify('spar_read_cache', %s)"
+
+# Domain events are written to the outbox in the same transaction as the change
+# they describe and relayed to Service Bus by shared_code.outbox
+INSERT_OUTBOX_EVENT = """
+    INSERT INTO spar.event_outbox (event_type, list_id, payload)
+    VALUES (%s, %s, %s::jsonb)
+"""
+
+CLAIM_OUTBOX_EVENTS = """
+    SELECT id, event_type, payload::text, attempts
+    FROM spar.event_outbox
+    WHERE parked_at IS NULL AND next_attempt_at <= NOW()
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+"""
+
+DELETE_OUTBOX_EVENTS = "DELETE FROM spar.event_outbox WHERE id = ANY(%s)"
+
+# A failed send: retry after the backoff, or park the event (parked_at) for good
+RECORD_OUTBOX_FAILURE = """
+    UPDATE spar.event_outbox
+    SET attempts = %s,
+        last_error = %s,
+        next_attempt_at = NOW() + %s * INTERVAL '1 second',
+        parked_at = CASE WHEN %s THEN NOW() END
+    WHERE id = %s
+"""
+
+
+class VersionConflict(Exception):
+    """An optimistic update's expected version no longer matches; ``current`` is the stored item"""
+
+    def __init__(self, current: Dict[str, Any]):
+        super().__init__(f"item {current['id']} is at version {current['version']}")
+        self.current = current
+
+
+def format_timestamp(value) -> Optional[str]:
+    """Timestamp as written into event payloads (responses go through shared_code.http)"""
+    return value.isoformat() + "Z" if value else None
+
+
+def list_from_row(row) -> Dict[str, Any]:
+    """Map an (id, shop_id, title, status, created_at, completed_at, completed_by) row"""
+    return {
+        "id": row[0],
+        "shop_id": row[1],
+        "title": row[2],
+        "status": row[3],
+        "created_at": row[4],
+        "completed_at": row[5],
+        "completed_by": row[6],
+        "items": []
+    }
+
+
+def item_from_row(row) -> Dict[str, Any]:
+    """Map an (id, sku, name, qty_requested, qty_collected, status, version) row"""
+    item_data = {
+        "id": row[0],
+        "name": row[2],
+        "qty": row[3],
+        "status": row[5],
+        "version": row[6]
+    }
+    if row[4] is not None:
+        item_data["qty_collected"] = row[4]
+    return item_data
+
+
+def completed_from_row(row) -> Dict[str, Any]:
+    """Map an (id, shop_id, title, status, completed_at, completed_by) row"""
+    return {
+        "listId": row[0],
+        "shopId": row[1],
+        "shop_id": row[1],
+        "title": row[2],
+        "status": row[3],
+        "completedAt": row[4],
+        "completedBy": row[5]
+    }
+
+
+def insert_items_params(list_id: str, items: List[Dict[str, Any]]) -> Tuple[Any, ...]:
+    """Parameters for INSERT_ITEMS; items without an id get a generated one"""
+    return (
+        list_id,
+        [item.get("id") or uuid.uuid4().hex for item in items],
+        [item.get("sku") for item in items],
+        [item["name"] for item in items],
+        [item["qty"] for item in items],
+        [item.get("status", "pending") for item in items],
+    )
+
+
+def created_list(list_row, item_rows) -> Dict[str, Any]:
+    """Build the create_list response from the INSERT ... RETURNING rows"""
+    list_data = list_from_row(list_row)
+    # Same order get_list returns them in
+    list_data["items"] = [item_from_row(row) for row in sorted(item_rows, key=lambda row: row[0])]
+    return list_data
+
+
+def outbox_params(payload: Dict[str, Any]) -> Tuple[str, Optional[str], str]:
+    """Parameters for INSERT_OUTBOX_EVENT"""
+    return payload["type"], payload.get("listId"), json.dumps(payload, ensure_ascii=False)
+
+
+def list_created_event(list_data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "list-created",
+        "listId": list_data["id"],
+        "title": list_data["title"],
+        "shopId": list_data["shop_id"],
+        "itemCount": len(list_data["items"]),
+    }
+
+
+def item_updated_event(list_id: str, item_data: Dict[str, Any], status: str, qty_collected: Optional[int]) -> Dict[str, Any]:
+    changes: Dict[str, Any] = {"status": status}
+    if qty_collected is not None:
+        changes["qtyCollected"] = qty_collected
+    return {
+        "type": "item-updated",
+        "listId": list_id,
+        "itemId": item_data["id"],
+        "changes": changes,
+        "version": item_data.get("version"),
+    }
+
+
+def list_completed_event(result: Dict[str, Any], item_rows) -> Dict[str, Any]:
+    """Payload for the list-updates and payment queues; items carry their SKU for pricing"""
+    items = []
+    for row in item_rows:
+        item_data = item_from_row(row)
+        item_data["sku"] = row[1]
+        items.append(item_data)
+    return {
+        "type": "list-completed",
+        "listId": result["listId"],
+        "shopId": result.get("shopId") or "unknown",
+        "status": "COMPLETED",
+        "completedAt": format_timestamp(result.get("completedAt")),
+        "completedBy": result.get("completedBy") or "unknown",
+        "items": items,
+        "title": result.get("title") or f"List {result['listId']}",
+    }
+
+
+def sync_rounds(changes: List[Dict[str, Any]]) -> List[List[int]]:
+    """Split change indexes into rounds in which every item appears at most once
+
+    Round n holds each item's n-th change, so repeated changes to one item
+    apply in order while a typical batch still needs a single statement.
+    """
+    rounds: List[List[int]] = []
+    seen: Dict[Tuple[str, str], int] = {}
+    for index, change in enumerate(changes):
+        key = (change["listId"], change["itemId"])
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        if occurrence == len(rounds):
+            rounds.append([])
+        rounds[occurrence].append(index)
+    return rounds
+
+
+def sync_items_params(changes: List[Dict[str, Any]], shop_id: Optional[str] = None) -> Tuple[Any, ...]:
+    """Parameters for SYNC_ITEMS; changes to lists of other shops than ``shop_id`` are left out"""
+    return (
+        [change["listId"] for change in changes],
+        [change["itemId"] for change in changes],
+        [change["status"] for change in changes],
+        [change.get("qtyCollected") for change in changes],
+        [change.get("version") for change in changes],
+        shop_id,
+        shop_id,
+    )
+
+
+def sync_result(change: Dict[str, Any], row) -> Dict[str, Any]:
+    """Per-change result from a SYNC_ITEMS row (or None when nothing matched)"""
+    result: Dict[str, Any] = {"listId": change["listId"], "itemId": change["itemId"]}
+    updated = row[2:2 + _ITEM_WIDTH] if row else None
+    current = row[2 + _ITEM_WIDTH:] if row else None
+    if updated and updated[0] is not None:
+        result["result"] = "applied"
+        result["item"] = item_from_row(updated)
+    elif current and current[0] is not None:
+        result["result"] = "conflict"
+        result["item"] = item_from_row(current)
+    else:
+        result["result"] = "not-found"
+        return result
+    result["version"] = result["item"]["version"]
+    return result
+
+
+def items_synced_events(changes: List[Dict[str, Any]], results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """One items-updated event per list covering every applied change, in order"""
+    events: Dict[str, Dict[str, Any]] = {}
+    for change, result in zip(changes, results):
+        if result["result"] != "applied":
+            continue
+        item_changes: Dict[str, Any] = {"status": change["status"]}
+        if change.get("qtyCollected") is not None:
+            item_changes["qtyCollected"] = change["qtyCollected"]
+        event = events.setdefault(change["listId"], {
+            "type": "items-updated",
+            "listId": change["listId"],
+            "items": [],
+        })
+        event["items"].append({"itemId": change["itemId"], "changes": item_changes, "version": result["version"]})
+    return list(events.values())
+
+
+def list_deleted_event(list_id: str, shop_id: Optional[str]) -> Dict[str, Any]:
+    return {
+        "type": "list-deleted",
+        "listId": list_id,
+        "shopId": shop_id,
+    }
+
+
+# Largest xid8 value; change cursors outside 0..XID8_MAX are rejected
+XID8_MAX = 2 ** 64 - 1
+
+
+def encode_change_cursor(xmin: str) -> str:
+    """Opaque change-feed cursor for a snapshot xmin"""
+    return base64.urlsafe_b64encode(json.dumps({"xmin": xmin}).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_change_cursor(token: str) -> str:
+    """The xmin inside a cursor produced by encode_change_cursor; raises ValueError if malformed
+
+    The value is cast to xid8 by the change queries, so anything outside its
+    range (0 to 2**64 - 1) is rejected here rather than failing in Postgres.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        xmin = json.loads(raw)["xmin"]
+        if not isinstance(xmin, (str, int)) or isinstance(xmin, bool):
+            raise TypeError(f"xmin must be a string or integer, not {type(xmin).__name__}")
+        value = int(xmin)
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError("cursor is invalid") from exc
+    if not 0 <= value <= XID8_MAX:
+        raise ValueError("cursor is invalid")
+    return str(value)
+
+
+def changes_from_rows(list_rows, item_rows, deleted_rows, xmin: str) -> Dict[str, Any]:
+    """Assemble the lists_changes response
+
+    Changed lists are reported without their items; changed items carry
+    their listId. A row may be repeated by the next poll if its transaction
+    was still in flight, so clients apply changes as upserts.
+    """
+    lists = []
+    for row in list_rows:
+        list_data = list_from_row(row)
+        del list_data["items"]
+        lists.append(list_data)
+    items = []
+    for row in item_rows:
+        item_data = item_from_row(row[1:])
+        item_data["listId"] = row[0]
+        items.append(item_data)
+    deleted: Dict[str, List[Any]] = {"lists": [], "items": []}
+    for record_type, record_id, list_id in deleted_rows:
+        if record_type == "list":
+            deleted["lists"].append(record_id)
+        else:
+            deleted["items"].append({"listId": list_id, "id": record_id})
+    return {"lists": lists, "items": items, "deleted": deleted, "cursor": encode_change_cursor(xmin)}
+
+
+def encode_list_cursor(created_at, list_id: str) -> str:
+    """Build the opaque keyset cursor pointing just past the given list"""
+    raw = json.dumps([created_at.isoformat(), list_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_list_cursor(token: str) -> Tuple[datetime, str]:
+    """Parse a cursor produced by encode_list_cursor; raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        created_at, list_id = json.loads(raw)
+        return datetime.fromisoformat(created_at), str(list_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("cursor is invalid") from exc
+
+
+def list_stream_query(
+    shop_id: Optional[str],
+    limit: Optional[int],
+    after: Optional[Tuple[datetime, str]],
+) -> Tuple[str, List[Any]]:
+    """Lists joined with their items, newest first, keyset-paginated on (created_at DESC, id DESC)
+
+    Each list's rows are contiguous. With a limit, one extra list is selected
+    so the caller can tell whether another page follows.
+    """
+    where, limit_clause, params = _page_filter(shop_id, limit, after)
+    return _named("list_stream_query", f"""
+        WITH page AS (
+            SELECT {LIST_COLUMNS}
+            FROM spar.lists
+            {where}
+            ORDER BY created_at DESC, id DESC
+            {limit_clause}
+        )
+        SELECT p.id, p.shop_id, p.title, p.status, p.created_at, p.completed_at, p.completed_by,
+               i.id, i.sku, i.name, i.qty_requested, i.qty_collected, i.status, i.version
+        FROM page p
+        LEFT JOIN spar.list_items i ON i.list_id = p.id
+        ORDER BY p.created_at DESC, p.id DESC, i.id
+    """), params
+
+
+def list_json_page_query(
+    shop_id: Optional[str],
+    limit: Optional[int],
+    after: Optional[Tuple[datetime, str]],
+) -> Tuple[str, List[Any]]:
+    """Like list_stream_query, but one (id, created_at, JSON document) row per list"""
+    where, limit_clause, params = _page_filter(shop_id, limit, after)
+    return _named("list_json_page_query", f"""
+        SELECT l.id, l.created_at, {LIST_DOCUMENT}
+        FROM (
+            SELECT {LIST_COLUMNS}
+            FROM spar.lists
+            {where}
+            ORDER BY created_at DESC, id DESC
+            {limit_clause}
+        ) l
+        ORDER BY l.created_at DESC, l.id DESC
+    """), params
+
+
+def _page_filter(
+    shop_id: Optional[str],
+    limit: Optional[int],
+    after: Optional[Tuple[datetime, str]],
+) -> Tuple[str, str, List[Any]]:
+    conditions: List[str] = []
+    params: List[Any] = []
+    if shop_id:
+        conditions.append("shop_id = %s")
+        params.append(shop_id)
+    if after:
+        conditions.append("(created_at, id) < (%s, %s)")
+        params.extend(after)
+    limit_clause = ""
+    if limit is not None:
+        limit_clause = "LIMIT %s"
+        params.append(limit + 1)
+    where = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return where, limit_clause, params
+
+
+def json_page(rows, limit: Optional[int]) -> Tuple[bytes, Optional[str], List[str]]:
+    """JSON array bytes, next cursor and list ids from list_json_page_query rows (documents as bytes)"""
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_list_cursor(rows[-1][1], rows[-1][0])
+    return b"[" + b",".join(row[2] for row in rows) + b"]", next_cursor, [row[0] for row in rows]
+
+
+# Names of built statements (a handful of variants per builder), see query_name
+_built_names: Dict[str, str] = {}
+_constant_names: Dict[str, str] = {}
+
+
+def _named(name: str, query: str) -> str:
+    _built_names[query] = name
+    return query
+
+
+def query_name(query: Any) -> str:
+    """Name of a statement for metrics and logs: its constant in lower case, its builder, else other"""
+    if not _constant_names:
+        _constant_names.update(
+            (value, name.lower()) for name, value in list(globals().items())
+            if name.isupper() and isinstance(value, str)
+        )
+    if not isinstance(query, str):
+        return "other"
+    return _constant_names.get(query) or _built_names.get(query, "other")
@@ -1,61 +1,171 @@
 from __future__ import annotations
 
-import json
-import logging
+import atexit
 import os
-from typing import Any, Dict, Optional
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from shared_code import lazy, metrics
 
 _CONNECTION: Optional[str] = os.getenv("SERVICEBUS_CONNECTION")
 _QUEUE_NAME: str = os.getenv("SERVICEBUS_QUEUE_NAME", "list-updates")
+_PAYMENT_QUEUE_NAME = "payment-queue"
 
+# Events reach Service Bus only through the outbox relay (shared_code.outbox), which
+# calls send_events; the client and one sender per queue are kept for the process
+_client = None
+_senders: Dict[str, Any] = {}
+# Senders are not thread-safe
+_sender_lock = threading.RLock()
+_stats = {"sent": 0, "failed": 0, "batches": 0}
+_stats_lock = threading.Lock()
 
-def _get_safe_event_summary(payload: Dict[str, Any]) -> str:
-    """Extract only non-sensitive metadata for logging"""
-    event_type = payload.get("type", "unknown")
-    list_id = payload.get("listId", "unknown")
-    return f"type={event_type}, listId={list_id}"
+# azure.servicebus.exceptions raised when Service Bus cannot take any message right now,
+# as opposed to rejecting the one being sent
+_OUTAGE_ERRORS = (
+    "ServiceBusConnectionError",
+    "ServiceBusCommunicationError",
+    "ServiceBusAuthenticationError",
+    "OperationTimeoutError",
+    "ServiceBusServerBusyError",
+    "ServiceBusQuotaExceededError",
+    "MessagingEntityNotFoundError",
+    "MessagingEntityDisabledError",
+)
 
 
-def publish_event(payload: Dict[str, Any]) -> None:
-    if not _CONNECTION:
-        logging.info("SERVICEBUS_CONNECTION missing; skipping publish")
-        return
-    
-    # Try to import and use Service Bus, fallback to logging if not available
+def is_configured() -> bool:
+    return bool(_CONNECTION)
+
+
+def queue_names(event_type: Optional[str]) -> List[str]:
+    """Queues an event of the given type is delivered to"""
+    # list-completed events also go to the payment queue
+    if event_type == "list-completed":
+        return [_QUEUE_NAME, _PAYMENT_QUEUE_NAME]
+    return [_QUEUE_NAME]
+
+
+def send_events(queue_name: str, bodies: List[str]) -> None:
+    """Send already-serialised events synchronously, raising if Service Bus rejects them
+
+    Used by the outbox relay, which only deletes events once they are delivered.
+    """
     try:
-        from azure.servicebus import ServiceBusClient, ServiceBusMessage
-        
-        # Use a very short timeout to avoid delays
-        with ServiceBusClient.from_connection_string(_CONNECTION, connection_timeout=2) as client:
-            with client.get_queue_sender(queue_name=_QUEUE_NAME) as sender:
-                sender.send_messages(ServiceBusMessage(json.dumps(payload, ensure_ascii=False)))
-                logging.info("Successfully published event to Service Bus.")
-                
-                # If this is a list-completed event, also send to payment queue
-                if payload.get("type") == "list-completed":
-                    publish_to_payment_queue(payload)
-                    
+        _send_batch(queue_name, bodies)
+    except Exception:
+        _count("failed", len(bodies))
+        metrics.increment("servicebus_send_failures_total", len(bodies), queue=queue_name)
+        _reset_sender(queue_name)
+        raise
+    _count("sent", len(bodies))
+
+
+def is_outage(error: Exception) -> bool:
+    """Whether a send failed because Service Bus is unreachable or refusing everything, not because of the message"""
+    if isinstance(error, (ConnectionError, TimeoutError, ImportError)):
+        return True
+    try:
+        exceptions = lazy.load("azure.servicebus.exceptions")
     except ImportError:
-        logging.warning("azure-servicebus not available; event not published (%s)", _get_safe_event_summary(payload))
-    except Exception as e:
-        # Don't let Service Bus errors slow down the main operation
-        logging.warning("Service Bus publish failed (non-critical): %s", str(e))
-        # Log event summary without sensitive data
-        logging.info("Event not published (%s)", _get_safe_event_summary(payload))
+        return False
+    return isinstance(error, tuple(getattr(exceptions, name) for name in _OUTAGE_ERRORS if hasattr(exceptions, name)))
 
 
-def publish_to_payment_queue(payload: Dict[str, Any]) -> None:
-    """Send completed list to payment queue for processing"""
+def open_senders() -> None:
+    """Create the client and the queue senders ahead of the first send (warmup)"""
     if not _CONNECTION:
-        logging.info("SERVICEBUS_CONNECTION missing; skipping payment queue publish")
         return
-        
-    try:
-        from azure.servicebus import ServiceBusClient, ServiceBusMessage
-        
-        with ServiceBusClient.from_connection_string(_CONNECTION, connection_timeout=2) as client:
-            with client.get_queue_sender(queue_name="payment-queue") as sender:
-                sender.send_messages(ServiceBusMessage(json.dumps(payload, ensure_ascii=False)))
-                logging.info("Successfully sent list to payment queue.")
-    except Exception as e:
-        logging.warning("Failed to send to payment queue (non-critical): %s", str(e))
+    with _sender_lock:
+        for queue_name in (_QUEUE_NAME, _PAYMENT_QUEUE_NAME):
+            _get_sender(queue_name)
+
+
+def shutdown() -> None:
+    """Close the senders and the client"""
+    global _client
+    with _sender_lock:
+        for sender in list(_senders.values()):
+            try:
+                sender.close()
+            except Exception:
+                pass
+        _senders.clear()
+        if _client is not None:
+            try:
+                _client.close()
+            except Exception:
+                pass
+            _client = None
+
+
+def get_stats() -> Dict[str, Any]:
+    """Send counters plus the queues with an open sender"""
+    with _stats_lock:
+        stats = dict(_stats)
+    return dict(stats, senders=sorted(_senders))
+
+
+def _count(key: str, amount: int = 1) -> None:
+    with _stats_lock:
+        _stats[key] += amount
+
+
+def _send_batch(queue_name: str, bodies: List[str]) -> None:
+    """Send message bodies to a queue in as few ServiceBusMessageBatch sends as possible"""
+    ServiceBusMessage = lazy.load("azure.servicebus").ServiceBusMessage
+
+    started = time.perf_counter()
+    with _sender_lock:
+        sender = _get_sender(queue_name)
+        batch = sender.create_message_batch()
+        for body in bodies:
+            message = ServiceBusMessage(body)
+            try:
+                batch.add_message(message)
+            except ValueError:
+                # MessageSizeExceededError: ship the full batch and start a new one
+                sender.send_messages(batch)
+                _count("batches")
+                batch = sender.create_message_batch()
+                batch.add_message(message)
+        if len(batch):
+            sender.send_messages(batch)
+            _count("batches")
+    # Includes waiting for the sender lock; failed sends are counted instead
+    metrics.observe("servicebus_send_seconds", time.perf_counter() - started, queue=queue_name)
+
+
+def _get_sender(queue_name: str):
+    global _client
+    sender = _senders.get(queue_name)
+    if sender is None:
+        if _client is None:
+            ServiceBusClient = lazy.load("azure.servicebus").ServiceBusClient
+            _client = ServiceBusClient.from_connection_string(_CONNECTION, connection_timeout=2)
+        sender = _client.get_queue_sender(queue_name=queue_name)
+        _senders[queue_name] = sender
+    return sender
+
+
+def _reset_sender(queue_name: str) -> None:
+    with _sender_lock:
+        sender = _senders.pop(queue_name, None)
+    if sender is not None:
+        try:
+            sender.close()
+        except Exception:
+            pass
+
+
+def _stats_samples():
+    stats = get_stats()
+    for key in ("sent", "failed", "batches"):
+        yield f"servicebus_{key}_total", {}, stats[key]
+
+
+if metrics.enabled:
+    metrics.register_collector("counter", _stats_samples)
+
+atexit.register(shutdown)
@@ -0,0 +1,189 @@
+"""Signed session tokens and password checks for auth_login
+
+``auth_login`` checks the password once and returns a token of the form
+``<payload>.<signature>``: base64url JSON claims (user id, username, shop,
+role, expiry) signed with HMAC-SHA256 under SESSION_SECRET. Any function can
+verify it with ``verify_token`` / ``session_from_request`` without touching
+the database. Tokens signed with SESSION_SECRET_PREVIOUS are still accepted,
+so the secret can be rotated without logging everyone out.
+
+With SESSION_REQUIRED=true the list and item functions (``require_session``)
+answer 401 to requests without a valid token, and 403 when their ``shopId``
+parameter names another shop than the token's. A request without ``shopId``
+is given the token's, so every data-layer call is scoped to that shop.
+
+bcrypt runs on a small dedicated thread pool (BCRYPT_WORKERS) with at most
+BCRYPT_MAX_PENDING checks waiting; ``check_password`` awaits it, so the
+event loop keeps serving while a hash is checked. A login burst therefore uses
+a bounded amount of CPU; beyond that ``check_password`` raises PasswordCheckBusy and
+the caller answers 503 instead of queueing indefinitely.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import functools
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from shared_code import lazy
+
+SESSION_TTL = int(os.getenv("SESSION_TTL", "43200"))
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", "32"))
+SESSION_REQUIRED = os.getenv("SESSION_REQUIRED", "false").lower() in ("1", "true", "yes")
+
+
+# Fallback when SESSION_SECRET is unset (local development)
+_ephemeral_secret: Optional[str] = None
+
+
+class PasswordCheckBusy(Exception):
+    """Too many password checks are already waiting"""
+
+
+def _secrets() -> List[bytes]:
+    current = os.getenv("SESSION_SECRET")
+    if not current:
+        global _ephemeral_secret
+        if _ephemeral_secret is None:
+            logging.warning("SESSION_SECRET is not set; using a per-process secret, tokens will not verify on other instances")
+            _ephemeral_secret = secrets.token_urlsafe(32)
+        current = _ephemeral_secret
+    keys = [current.encode("utf-8")]
+    previous = os.getenv("SESSION_SECRET_PREVIOUS")
+    if previous:
+        keys.append(previous.encode("utf-8"))
+    return keys
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str, key: bytes) -> str:
+    return _b64encode(hmac.new(key, payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(user: Dict[str, Any], ttl: int = SESSION_TTL) -> Dict[str, Any]:
+    """Token for a user dict (id, username, shopId, role); returns {"token", "expiresAt"}"""
+    now = int(time.time())
+    claims = {
+        "sub": user["id"],
+        "name": user["username"],
+        "shop": user["shopId"],
+        "role": user["role"],
+        "iat": now,
+        "exp": now + ttl,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return {"token": f"{payload}.{_sign(payload, _secrets()[0])}", "expiresAt": claims["exp"]}
+
+
+def verify_token(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Session (id, username, shopId, role, expiresAt) for a valid, unexpired token, else None"""
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    try:
+        if not any(hmac.compare_digest(signature, _sign(payload, key)) for key in _secrets()):
+            return None
+        claims = json.loads(_b64decode(payload))
+        if int(claims["exp"]) <= time.time():
+            return None
+        return {
+            "id": claims["sub"],
+            "username": claims["name"],
+            "shopId": claims["shop"],
+            "role": claims["role"],
+            "expiresAt": int(claims["exp"]),
+        }
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def session_from_request(req) -> Optional[Dict[str, Any]]:
+    """Session from an ``Authorization: Bearer <token>`` header, or None"""
+    header = req.headers.get("Authorization") or ""
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    return verify_token(token.strip())
+
+
+def require_session(handler: Callable) -> Callable:
+    """Decorator for async HTTP handlers enforcing the session token; returns ``handler`` itself unless SESSION_REQUIRED
+
+    The wrapper keeps the signature (functools.wraps), which the Functions
+    host reads to bind parameters.
+    """
+    if not SESSION_REQUIRED:
+        return handler
+    from shared_code.http import forbidden, unauthorized
+
+    @functools.wraps(handler)
+    async def wrapper(req, *args, **kwargs):
+        session = session_from_request(req)
+        if session is None:
+            return unauthorized("A valid session token is required")
+        shop_id = (req.params.get("shopId") or "").strip()
+        if shop_id and shop_id != session["shopId"]:
+            return forbidden("The session is not valid for this shop")
+        if not shop_id:
+            req = _with_shop(req, session["shopId"])
+        return await handler(req, *args, **kwargs)
+
+    return wrapper
+
+
+def _with_shop(req, shop_id: str):
+    """Copy of ``req`` (HttpRequest params are read-only) with the ``shopId`` parameter set"""
+    return type(req)(
+        method=req.method,
+        url=req.url,
+        headers=dict(req.headers),
+        params=dict(req.params, shopId=shop_id),
+        route_params=dict(req.route_params),
+        body=req.get_body(),
+    )
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(BCRYPT_MAX_PENDING)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def check_password(password: str, password_hash: str) -> bool:
+    """bcrypt.checkpw on the bounded password pool; raises PasswordCheckBusy when it is full
+
+    Awaits the pool without blocking the event loop.
+    """
+    if not _pending.acquire(blocking=False):
+        raise PasswordCheckBusy()
+    try:
+        bcrypt = lazy.load("bcrypt")
+        future = _get_executor().submit(bcrypt.checkpw, password.encode("utf-8"), password_hash.encode("utf-8"))
+        return await asyncio.wrap_future(future)
+    finally:
+        _pending.release()
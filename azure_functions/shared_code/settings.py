@@ -0,0 +1,108 @@
+"""Connection settings, resolved once per process
+
+The environment (or local.settings.json) is read on first use and cached;
+``reload`` forgets the cached values.
+"""
+from __future__ import annotations
+
+import functools
+import json
+import os
+from typing import Any, Dict
+
+
+def database_settings() -> Dict[str, Any]:
+    """PostgreSQL connection parameters from the environment or local.settings.json"""
+    return dict(_database_settings())
+
+
+def pool_settings() -> Dict[str, Any]:
+    """Connection pool sizing and recycling settings (seconds)"""
+    return dict(_pool_settings())
+
+
+def slow_query_settings() -> Dict[str, Any]:
+    """Slow-query log: threshold (ms, 0 = off), EXPLAIN sample rate and timeout, rate limits (seconds)"""
+    return dict(_slow_query_settings())
+
+
+def sql_json_enabled(endpoint: str) -> bool:
+    """Whether ``endpoint`` serves Postgres-built JSON (listed in SQL_JSON_ENDPOINTS, comma-separated)"""
+    return endpoint in _sql_json_endpoints()
+
+
+def reload() -> None:
+    _database_settings.cache_clear()
+    _pool_settings.cache_clear()
+    _slow_query_settings.cache_clear()
+    _sql_json_endpoints.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def _sql_json_endpoints() -> frozenset:
+    return frozenset(name.strip() for name in os.getenv("SQL_JSON_ENDPOINTS", "").split(",") if name.strip())
+
+
+@functools.lru_cache(maxsize=None)
+def _database_settings() -> Dict[str, Any]:
+    host = os.getenv("POSTGRES_HOST")
+    database = os.getenv("POSTGRES_DATABASE")
+    user = os.getenv("POSTGRES_USER")
+    password = os.getenv("POSTGRES_PASSWORD")
+    port = os.getenv("POSTGRES_PORT", "5432")
+
+    # Try to load from local.settings.json for local development
+    if not all([host, database, user, password]):
+        base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+        paths = [
+            os.path.join(os.getcwd(), "local.settings.json"),
+            os.path.join(base_dir, "local.settings.json"),
+        ]
+        for path in paths:
+            try:
+                with open(path, 'r') as f:
+                    values = json.load(f).get('Values', {})
+            except (OSError, ValueError):
+                continue
+            host = host or values.get('POSTGRES_HOST')
+            database = database or values.get('POSTGRES_DATABASE')
+            user = user or values.get('POSTGRES_USER')
+            password = password or values.get('POSTGRES_PASSWORD')
+            port = port or values.get('POSTGRES_PORT', '5432')
+            if all([host, database, user, password]):
+                break
+
+    if not all([host, database, user, password]):
+        raise Exception("Database environment variables are required: POSTGRES_HOST, POSTGRES_DATABASE, POSTGRES_USER, POSTGRES_PASSWORD")
+
+    return {
+        "host": host,
+        "database": database,
+        "user": user,
+        "password": password,
+        "port": port,
+        "sslmode": os.getenv("POSTGRES_SSLMODE", "require"),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _pool_settings() -> Dict[str, Any]:
+    return {
+        "min_size": int(os.getenv("POSTGRES_POOL_MIN_SIZE", "1")),
+        "max_size": int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.getenv("POSTGRES_POOL_TIMEOUT", "5")),
+        "max_lifetime": float(os.getenv("POSTGRES_POOL_MAX_LIFETIME", "1800")),
+        "max_idle": float(os.getenv("POSTGRES_POOL_MAX_IDLE", "300")),
+        "check_after": float(os.getenv("POSTGRES_POOL_CHECK_AFTER", "30")),
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def _slow_query_settings() -> Dict[str, Any]:
+    return {
+        "threshold_ms": float(os.getenv("SLOW_QUERY_MS", "0")),
+        "log_interval": float(os.getenv("SLOW_QUERY_LOG_INTERVAL", "10")),
+        "explain_sample": float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE", "0.1")),
+        "explain_interval": float(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "60")),
+        "explain_timeout_ms": int(os.getenv("SLOW_QUERY_EXPLAIN_TIMEOUT_MS", "5000")),
+    }
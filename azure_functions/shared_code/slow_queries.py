@@ -0,0 +1,150 @@
+"""Slow-query log with sampled EXPLAIN capture
+
+Statements sent through the timed cursors (shared_code.cursors) that take at
+least SLOW_QUERY_MS are logged with their queries name and the shape of their
+parameters (types and lengths, never values). Each name is logged at most once
+per SLOW_QUERY_LOG_INTERVAL seconds; the next line reports how many were
+suppressed in between.
+
+A SLOW_QUERY_EXPLAIN_SAMPLE share of the logged SELECTs, at most one every
+SLOW_QUERY_EXPLAIN_INTERVAL seconds per process, is re-run as
+``EXPLAIN (ANALYZE, BUFFERS)`` on a thread of its own over a fresh connection
+(not a pooled one), inside a transaction that is rolled back and bounded by
+SLOW_QUERY_EXPLAIN_TIMEOUT_MS. The plan goes to the log with its quoted
+constants masked, as they include the parameter values. Statements that write
+or lock rows are never explained, since EXPLAIN ANALYZE executes them.
+SLOW_QUERY_MS=0 (the default) turns the log off.
+"""
+from __future__ import annotations
+
+import datetime
+import decimal
+import logging
+import random
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from shared_code import lazy, metrics, queries
+from shared_code.settings import database_settings, slow_query_settings
+
+# EXPLAIN ANALYZE runs the statement: only plain reads qualify
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|FOR\s+(NO\s+KEY\s+)?UPDATE|FOR\s+(KEY\s+)?SHARE|pg_notify|nextval)\b",
+                     re.IGNORECASE)
+
+# Quoted constants in plan output (bound parameters end up there as literals)
+_PLAN_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+_lock = threading.Lock()
+_last_logged: Dict[str, float] = {}
+_suppressed: Dict[str, int] = {}
+_last_explain = float("-inf")
+_explaining = False
+_rng = random.Random()
+_stats = {"slow": 0, "logged": 0, "suppressed": 0, "explained": 0, "explain_failed": 0}
+
+
+def threshold() -> float:
+    """Seconds from which a statement counts as slow (0 = log off)"""
+    return slow_query_settings()["threshold_ms"] / 1000.0
+
+
+def enabled() -> bool:
+    return threshold() > 0
+
+
+def record(query: Any, params: Any, seconds: float) -> None:
+    """Log a statement that took ``seconds`` (called by the timed cursors once it counts as slow)"""
+    global _last_explain, _explaining
+    config = slow_query_settings()
+    name = queries.query_name(query)
+    metrics.increment("db_slow_queries_total", query=name)
+    now = time.monotonic()
+    with _lock:
+        _stats["slow"] += 1
+        last = _last_logged.get(name)
+        if last is not None and now - last < config["log_interval"]:
+            _suppressed[name] = _suppressed.get(name, 0) + 1
+            _stats["suppressed"] += 1
+            return
+        _last_logged[name] = now
+        suppressed = _suppressed.pop(name, 0)
+        _stats["logged"] += 1
+        explain = (
+            not _explaining
+            and now - _last_explain >= config["explain_interval"]
+            and explainable(query)
+            and _rng.random() < config["explain_sample"]
+        )
+        if explain:
+            _last_explain = now
+            _explaining = True
+
+    logging.warning(
+        "Slow query %s: %.1f ms, params %s%s", name, seconds * 1000.0, describe_params(params),
+        f" ({suppressed} more since the last report)" if suppressed else "",
+    )
+    if explain:
+        threading.Thread(target=_explain, args=(name, query, params, seconds, config["explain_timeout_ms"]),
+                         name="slow-query-explain", daemon=True).start()
+
+
+def explainable(query: Any) -> bool:
+    """Whether ``query`` is a read that EXPLAIN ANALYZE may safely execute again"""
+    return isinstance(query, str) and bool(_READ_ONLY.match(query)) and not _WRITES.search(query)
+
+
+def describe_params(params: Any) -> str:
+    """Parameter types and sizes with the values left out, e.g. ``(str[12], int, list[40])``"""
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{key}: {_shape(value)}" for key, value in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(_shape(value) for value in params) + ")"
+    return _shape(params)
+
+
+def get_stats() -> Dict[str, Any]:
+    with _lock:
+        return dict(_stats)
+
+
+def _shape(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, (bool, int, float, decimal.Decimal, datetime.date, datetime.time)):
+        return type(value).__name__
+    if isinstance(value, (str, bytes, list, tuple)):
+        return f"{type(value).__name__}[{len(value)}]"
+    return type(value).__name__
+
+
+def _explain(name: str, query: str, params: Any, seconds: float, timeout_ms: int) -> None:
+    global _explaining
+    conn: Optional[Any] = None
+    try:
+        # A connection of its own: the pools may be what is running short
+        conn = lazy.load("psycopg2").connect(**database_settings())
+        with conn.cursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+            plan = _PLAN_LITERAL.sub("'?'", "\n".join(row[0] for row in cursor.fetchall()))
+        logging.warning("EXPLAIN (ANALYZE, BUFFERS) of slow query %s (%.1f ms):\n%s", name, seconds * 1000.0, plan)
+        with _lock:
+            _stats["explained"] += 1
+    except Exception as e:
+        logging.info("EXPLAIN of slow query %s failed: %s", name, e)
+        with _lock:
+            _stats["explain_failed"] += 1
+    finally:
+        if conn is not None:
+            try:
+                conn.rollback()
+                conn.close()
+            except Exception:
+                pass
+        with _lock:
+            _explaining = False
@@ -0,0 +1,51 @@
+"""Cold-start warmup: pay the one-off costs before the first request does
+
+``warm`` applies pending schema migrations when MIGRATE_ON_STARTUP is set,
+resolves the settings, opens both connection pools to their minimum size,
+imports bcrypt and creates the Service Bus senders. Each step is timed
+and a failing step is logged and skipped, so warmup never keeps an instance
+from starting. Called by the ``warmup`` function (Azure's warmup trigger,
+which fires when an instance is added on the Premium plan). Nothing keeps
+an idle instance warm: timer triggers such as outbox_relay are singletons and
+only ever run on one instance.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from shared_code import lazy
+
+# Longest wait for the async pool to reach its minimum size
+POOL_WAIT_TIMEOUT = 30.0
+
+
+async def warm() -> Dict[str, Any]:
+    """Run every warmup step; returns the milliseconds each took (None if it failed)"""
+    from shared_code import async_data, data, migrate, servicebus
+    from shared_code.settings import database_settings
+
+    async def async_pool() -> None:
+        pool = await async_data.get_connection_pool()
+        await pool.wait(timeout=POOL_WAIT_TIMEOUT)
+
+    steps: Dict[str, Callable[[], Awaitable[Any]]] = {
+        "migrations": lambda: asyncio.to_thread(migrate.run_on_startup),
+        "settings": lambda: asyncio.to_thread(database_settings),
+        "async_pool": async_pool,
+        "sync_pool": lambda: asyncio.to_thread(data.get_connection_pool),
+        "bcrypt": lambda: asyncio.to_thread(lazy.load, "bcrypt"),
+        "servicebus": lambda: asyncio.to_thread(servicebus.open_senders),
+    }
+    timings: Dict[str, Any] = {}
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            await step()
+            timings[name] = round((time.perf_counter() - started) * 1000.0, 3)
+        except Exception as e:
+            logging.warning("Warmup step %s failed: %s", name, e)
+            timings[name] = None
+    return timings
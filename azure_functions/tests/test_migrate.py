@@ -0,0 +1,14 @@
+import os
+import re
+
+from shared_code import migrate
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "database", "schema.sql")
+
+_SEEDED = re.compile(r"\((\d+), '(\w+)', '([0-9a-f]{64})'\)")
+
+
+def test_schema_sql_records_every_migration():
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        seeded = {int(version): (name, checksum) for version, name, checksum in _SEEDED.findall(f.read())}
+    assert seeded == {m.version: (m.name, m.checksum) for m in migrate.discover()}
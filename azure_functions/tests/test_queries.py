@@ -0,0 +1,31 @@
+import base64
+import json
+
+import pytest
+
+from shared_code.queries import XID8_MAX, decode_change_cursor, encode_change_cursor
+
+
+def _cursor(xmin) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"xmin": xmin}).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("xmin", ["0", "1", "742", str(XID8_MAX)])
+def test_change_cursor_round_trip(xmin):
+    assert decode_change_cursor(encode_change_cursor(xmin)) == xmin
+
+
+def test_change_cursor_accepts_integer_xmin():
+    assert decode_change_cursor(_cursor(742)) == "742"
+
+
+@pytest.mark.parametrize("xmin", [-5, "-5", XID8_MAX + 1, str(XID8_MAX + 1), 1e30, 1.5, True, None, "abc", [1]])
+def test_change_cursor_rejects_values_outside_xid8(xmin):
+    with pytest.raises(ValueError):
+        decode_change_cursor(_cursor(xmin))
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", _cursor(None)[:-2], "e30"])
+def test_change_cursor_rejects_malformed_tokens(token):
+    with pytest.raises(ValueError):
+        decode_change_cursor(token)
@@ -0,0 +1,76 @@
+import asyncio
+
+import azure.functions as func
+import pytest
+
+from shared_code import session
+
+USER = {"id": "u1", "username": "anna", "shopId": "shop-1", "role": "employee"}
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv("SESSION_SECRET", "test-secret")
+    monkeypatch.delenv("SESSION_SECRET_PREVIOUS", raising=False)
+
+
+def _request(token=None, shop_id=None):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    params = {"shopId": shop_id} if shop_id else {}
+    return func.HttpRequest(method="GET", url="http://localhost/api/lists_get", params=params, headers=headers, body=b"")
+
+
+def _protected(monkeypatch):
+    monkeypatch.setattr(session, "SESSION_REQUIRED", True)
+
+    async def handler(req):
+        return func.HttpResponse(req.params.get("shopId", ""))
+
+    return session.require_session(handler)
+
+
+def test_token_round_trip():
+    token = session.issue_token(USER)["token"]
+    verified = session.verify_token(token)
+    assert {key: verified[key] for key in USER} == USER
+
+
+def test_tampered_and_expired_tokens_are_rejected():
+    token = session.issue_token(USER)["token"]
+    payload, signature = token.split(".")
+    assert session.verify_token(payload + "." + signature[::-1]) is None
+    assert session.verify_token(session.issue_token(USER, ttl=-1)["token"]) is None
+    assert session.verify_token("not-a-token") is None
+
+
+def test_previous_secret_still_verifies(monkeypatch):
+    token = session.issue_token(USER)["token"]
+    monkeypatch.setenv("SESSION_SECRET", "rotated-secret")
+    assert session.verify_token(token) is None
+    monkeypatch.setenv("SESSION_SECRET_PREVIOUS", "test-secret")
+    assert session.verify_token(token)["id"] == "u1"
+
+
+def test_require_session_is_a_no_op_when_off(monkeypatch):
+    monkeypatch.setattr(session, "SESSION_REQUIRED", False)
+
+    async def handler(req):
+        return None
+
+    assert session.require_session(handler) is handler
+
+
+def test_require_session_checks_token_and_shop(monkeypatch):
+    handler = _protected(monkeypatch)
+    token = session.issue_token(USER)["token"]
+    assert asyncio.run(handler(_request())).status_code == 401
+    assert asyncio.run(handler(_request("bad.token", "shop-1"))).status_code == 401
+    assert asyncio.run(handler(_request(token, "shop-2"))).status_code == 403
+    assert asyncio.run(handler(_request(token, "shop-1"))).status_code == 200
+
+
+def test_require_session_scopes_requests_to_the_token_shop(monkeypatch):
+    handler = _protected(monkeypatch)
+    token = session.issue_token(USER)["token"]
+    assert asyncio.run(handler(_request(token))).get_body() == b"shop-1"
+    assert asyncio.run(handler(_request(token, "shop-1"))).get_body() == b"shop-1"
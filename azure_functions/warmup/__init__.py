@@ -0,0 +1,13 @@
+import logging
+
+import azure.functions as func
+
+from shared_code import lazy, metrics
+from shared_code.warmup import warm
+
+
+@metrics.instrument("warmup")
+async def main(warmupContext: func.Context) -> None:
+    """Open connection pools and Service Bus senders before the instance takes traffic"""
+    timings = await warm()
+    logging.info("Warmup finished: steps %s ms, imports %s ms", timings, lazy.import_times())
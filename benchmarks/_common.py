@@ -0,0 +1,199 @@
+"""Shared helpers for the data-layer benchmarks.
+
+The benchmarks talk to a real PostgreSQL database configured through the same
+POSTGRES_* variables the function app uses (plus POSTGRES_SSLMODE, default
+"prefer"), and patch ``shared_code.data`` so every call runs on a single
+benchmark-owned connection whose round trips are counted.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# The function app defaults to sslmode=require; local benchmark databases rarely have TLS
+os.environ.setdefault("POSTGRES_SSLMODE", "prefer")
+
+FUNCTIONS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "azure_functions"))
+if FUNCTIONS_ROOT not in sys.path:
+    sys.path.insert(0, FUNCTIONS_ROOT)
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+
+class RoundTripCounter:
+    """Counts statements sent to the server through cursors it creates"""
+
+    def __init__(self) -> None:
+        self.count = 0
+
+    def cursor_factory(self):
+        counter = self
+
+        class CountingCursor(psycopg2.extensions.cursor):
+            def execute(self, query, vars=None):
+                counter.count += 1
+                return super().execute(query, vars)
+
+        return CountingCursor
+
+
+def connect():
+    return psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        database=os.getenv("POSTGRES_DATABASE", "spar"),
+        user=os.getenv("POSTGRES_USER", "spar_user"),
+        password=os.getenv("POSTGRES_PASSWORD", "spar_password"),
+        port=os.getenv("POSTGRES_PORT", "5432"),
+        sslmode=os.environ["POSTGRES_SSLMODE"],
+    )
+
+
+@contextmanager
+def patched_data_layer(conn, counter: RoundTripCounter) -> Iterator[Any]:
+    """Route shared_code.data (and the price cache, which imports its helpers) through ``conn`` and count its round trips"""
+    from shared_code import data, prices
+
+    modules = (data, prices)
+    originals = [(module.get_connection, module.return_connection) for module in modules]
+    conn.cursor_factory = counter.cursor_factory()
+    for module in modules:
+        module.get_connection = lambda: conn
+        module.return_connection = lambda _conn: None
+    try:
+        yield data
+    finally:
+        for module, original in zip(modules, originals):
+            module.get_connection, module.return_connection = original
+        conn.cursor_factory = psycopg2.extensions.cursor
+
+
+def new_shop_id(prefix: str = "bench") -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+
+def seed_lists(conn, shop_id: str, list_count: int, items_per_list: int) -> None:
+    """Insert ``list_count`` lists with ``items_per_list`` items each for ``shop_id``"""
+    lists = [(f"{shop_id}-l{n}", shop_id, f"Bench list {n}") for n in range(list_count)]
+    items = [
+        (f"{list_id}-i{m}", list_id, f"Item {m}", 1 + m % 5)
+        for list_id, _, _ in lists
+        for m in range(items_per_list)
+    ]
+    with conn.cursor() as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO spar.lists (id, shop_id, title, status, created_at) VALUES %s",
+            lists,
+            template="(%s, %s, %s, 'active', NOW())",
+            page_size=1000,
+        )
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO spar.list_items (id, list_id, name, qty_requested) VALUES %s",
+            items,
+            page_size=1000,
+        )
+    conn.commit()
+
+
+def drop_shop(conn, shop_id: str) -> None:
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM spar.lists WHERE shop_id = %s", (shop_id,))
+        # Events written by benchmarked writes must not reach Service Bus
+        cursor.execute("DELETE FROM spar.event_outbox WHERE payload->>'shopId' = %s", (shop_id,))
+    conn.commit()
+
+
+def time_calls(fn: Callable[[], Any], repeat: int) -> List[float]:
+    """Run ``fn`` ``repeat`` times and return the wall-clock durations in ms"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return samples
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
+
+    return {
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+        "mean_ms": round(statistics.fmean(ordered), 3),
+    }
+
+
+class LatencyProxy:
+    """TCP proxy in front of Postgres that delays traffic by ``rtt_ms`` per round trip
+
+    Local databases answer in microseconds, which hides exactly the waiting
+    that connection pooling and async I/O are meant to overlap. Point
+    POSTGRES_HOST/POSTGRES_PORT at ``address`` to benchmark with a realistic
+    network round trip.
+    """
+
+    def __init__(self, rtt_ms: float, target_host: Optional[str] = None, target_port: Optional[int] = None):
+        self.delay = rtt_ms / 2000.0
+        self.target_host = target_host or os.getenv("POSTGRES_HOST", "localhost")
+        self.target_port = int(target_port or os.getenv("POSTGRES_PORT", "5432"))
+        self.address: Tuple[str, int] = ("127.0.0.1", 0)
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self._run, args=(started,), daemon=True).start()
+        started.wait()
+
+    def _run(self, started: threading.Event) -> None:
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, "127.0.0.1", 0))
+        self.address = server.sockets[0].getsockname()[:2]
+        started.set()
+        self._loop.run_forever()
+
+    async def _handle(self, client_reader, client_writer) -> None:
+        if self.target_host.startswith("/"):
+            path = os.path.join(self.target_host, f".s.PGSQL.{self.target_port}")
+            server_reader, server_writer = await asyncio.open_unix_connection(path)
+        else:
+            server_reader, server_writer = await asyncio.open_connection(self.target_host, self.target_port)
+        await asyncio.gather(
+            self._pipe(client_reader, server_writer),
+            self._pipe(server_reader, client_writer),
+            return_exceptions=True,
+        )
+
+    async def _pipe(self, reader, writer) -> None:
+        queue: asyncio.Queue = asyncio.Queue()
+
+        async def deliver() -> None:
+            while True:
+                due, chunk = await queue.get()
+                if chunk is None:
+                    writer.close()
+                    return
+                await asyncio.sleep(max(0.0, due - self._loop.time()))
+                writer.write(chunk)
+                await writer.drain()
+
+        sender = asyncio.ensure_future(deliver())
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                await queue.put((self._loop.time() + self.delay, chunk or None))
+                if not chunk:
+                    break
+        finally:
+            await sender
@@ -0,0 +1,124 @@
+"""Synthetic shops, lists, items and products for the benchmarks.
+
+``generate`` fills a database with a reproducible data set: ``products``
+products, and for each of ``shops`` shops ``lists_per_shop`` lists with
+``items_per_list`` items priced from that catalogue. A third of the lists
+are completed. With ``users_per_shop`` each shop also gets employees that
+can log in with PASSWORD. Everything it inserts is tagged with a run prefix
+so ``remove`` can delete it again from a shared database.
+"""
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import psycopg2.extras
+
+from _common import new_shop_id
+
+PASSWORD = "bench-password"
+
+SCALES: Dict[str, Dict[str, int]] = {
+    "small": {"shops": 2, "lists_per_shop": 50, "items_per_list": 10, "products": 500},
+    "medium": {"shops": 5, "lists_per_shop": 500, "items_per_list": 15, "products": 5000},
+    "large": {"shops": 10, "lists_per_shop": 2000, "items_per_list": 20, "products": 20000},
+}
+
+
+@dataclass
+class Dataset:
+    prefix: str
+    shops: List[str] = field(default_factory=list)
+    lists: Dict[str, List[str]] = field(default_factory=dict)
+    skus: List[str] = field(default_factory=list)
+    users: Dict[str, List[str]] = field(default_factory=dict)
+    items_per_list: int = 0
+
+    @property
+    def list_count(self) -> int:
+        return sum(len(list_ids) for list_ids in self.lists.values())
+
+
+def generate(conn, shops: int, lists_per_shop: int, items_per_list: int, products: int, seed: int = 42,
+             users_per_shop: int = 0, bcrypt_rounds: int = 10) -> Dataset:
+    """Insert the data set and return what was created"""
+    rng = random.Random(seed)
+    dataset = Dataset(prefix=new_shop_id("gen"), items_per_list=items_per_list)
+    dataset.skus = [f"{dataset.prefix}-sku{n}" for n in range(products)]
+
+    with conn.cursor() as cursor:
+        psycopg2.extras.execute_values(
+            cursor,
+            "INSERT INTO spar.products (sku, name, price, category) VALUES %s",
+            [(sku, f"Product {n}", round(rng.uniform(0.2, 40.0), 2), f"category-{n % 20}")
+             for n, sku in enumerate(dataset.skus)],
+            page_size=1000,
+        )
+
+        for s in range(shops):
+            shop_id = f"{dataset.prefix}-s{s}"
+            dataset.shops.append(shop_id)
+            list_ids = [f"{shop_id}-l{n}" for n in range(lists_per_shop)]
+            dataset.lists[shop_id] = list_ids
+            psycopg2.extras.execute_values(
+                cursor,
+                "INSERT INTO spar.lists (id, shop_id, title, status, created_at, completed_at, completed_by) VALUES %s",
+                [
+                    (list_id, shop_id, f"Generated list {n}", "completed" if n % 3 == 0 else "active",
+                     f"-{lists_per_shop - n} minutes", n % 3 == 0, "employee-1" if n % 3 == 0 else None)
+                    for n, list_id in enumerate(list_ids)
+                ],
+                template="(%s, %s, %s, %s, NOW() + %s::interval, CASE WHEN %s THEN NOW() END, %s)",
+                page_size=1000,
+            )
+            psycopg2.extras.execute_values(
+                cursor,
+                "INSERT INTO spar.list_items (id, list_id, sku, name, qty_requested, status) VALUES %s",
+                [
+                    (f"{list_id}-i{m}", list_id, rng.choice(dataset.skus) if dataset.skus else None,
+                     f"Item {m}", rng.randint(1, 6), "pending")
+                    for list_id in list_ids
+                    for m in range(items_per_list)
+                ],
+                page_size=1000,
+            )
+
+        if users_per_shop:
+            import bcrypt
+
+            # One hash for everyone: hashing is slow and logins only need a valid one
+            password_hash = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(bcrypt_rounds)).decode("ascii")
+            for shop_id in dataset.shops:
+                dataset.users[shop_id] = [f"{shop_id}-u{n}" for n in range(users_per_shop)]
+            psycopg2.extras.execute_values(
+                cursor,
+                "INSERT INTO spar.users (id, username, password_hash, shop_id) VALUES %s",
+                [(username, username, password_hash, shop_id)
+                 for shop_id, usernames in dataset.users.items() for username in usernames],
+                page_size=1000,
+            )
+    conn.commit()
+
+    # Statistics and a visibility map, as a settled database has them; plans depend on both
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for table in ("products", "lists", "list_items", "users"):
+                cursor.execute(f"VACUUM ANALYZE spar.{table}")
+    finally:
+        conn.autocommit = autocommit
+    return dataset
+
+
+def remove(conn, dataset: Dataset) -> None:
+    """Delete everything ``generate`` (and writes against its shops) left behind"""
+    with conn.cursor() as cursor:
+        cursor.execute("DELETE FROM spar.lists WHERE shop_id = ANY(%s)", (dataset.shops,))
+        cursor.execute("DELETE FROM spar.event_outbox WHERE payload->>'shopId' = ANY(%s)", (dataset.shops,))
+        cursor.execute("DELETE FROM spar.deleted_records WHERE shop_id = ANY(%s)", (dataset.shops,))
+        cursor.execute("DELETE FROM spar.shop_revisions WHERE shop_id = ANY(%s)", (dataset.shops,))
+        cursor.execute("DELETE FROM spar.products WHERE sku = ANY(%s)", (dataset.skus,))
+        cursor.execute("DELETE FROM spar.users WHERE shop_id = ANY(%s)", (dataset.shops,))
+    conn.commit()
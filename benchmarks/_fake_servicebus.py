@@ -0,0 +1,102 @@
+"""In-memory stand-in for shared_code.servicebus.
+
+``install`` replaces the module in sys.modules (and on the shared_code
+package) with one whose functions deliver into an ``InMemoryServiceBus``:
+messages are kept per queue instead of being sent, optionally after a
+simulated send latency or with a share of sends failing, so the outbox relay
+behaves as if Service Bus were configured. Install it before importing the
+function packages.
+"""
+from __future__ import annotations
+
+import random
+import sys
+import threading
+import time
+import types
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+API = (
+    "send_events",
+    "is_configured",
+    "is_outage",
+    "queue_names",
+    "open_senders",
+    "shutdown",
+    "get_stats",
+)
+
+
+class InMemoryServiceBus:
+    """Records what would have been sent, per queue"""
+
+    def __init__(self, send_latency_ms: float = 0.0, failure_rate: float = 0.0, keep_bodies: bool = False,
+                 seed: int = 0) -> None:
+        from shared_code import servicebus
+
+        self._queue_names = servicebus.queue_names
+        self._is_outage = servicebus.is_outage
+        self.send_latency = send_latency_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.keep_bodies = keep_bodies
+        self.messages: Dict[str, List[str]] = defaultdict(list)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._stats = {"sent": 0, "failed": 0, "batches": 0}
+        self._per_queue: Dict[str, int] = defaultdict(int)
+
+    def send_events(self, queue_name: str, bodies: List[str]) -> None:
+        self._deliver(queue_name, bodies)
+
+    def is_configured(self) -> bool:
+        return True
+
+    def is_outage(self, error: Exception) -> bool:
+        return self._is_outage(error)
+
+    def queue_names(self, event_type: Optional[str]) -> List[str]:
+        return self._queue_names(event_type)
+
+    def open_senders(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        pass
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._stats, senders=[], queues=dict(self._per_queue))
+
+    def _deliver(self, queue_name: str, bodies: List[str]) -> None:
+        if self.send_latency:
+            time.sleep(self.send_latency)
+        with self._lock:
+            failed = self.failure_rate and self._rng.random() < self.failure_rate
+            if failed:
+                self._stats["failed"] += len(bodies)
+            else:
+                self._stats["sent"] += len(bodies)
+                self._stats["batches"] += 1
+                self._per_queue[queue_name] += len(bodies)
+                if self.keep_bodies:
+                    self.messages[queue_name].extend(bodies)
+        if failed:
+            raise ConnectionError(f"simulated Service Bus failure sending to {queue_name}")
+
+
+def install(bus: InMemoryServiceBus) -> types.ModuleType:
+    """Make ``shared_code.servicebus`` deliver into ``bus`` for everything imported afterwards"""
+    import shared_code
+
+    module = types.ModuleType("shared_code.servicebus", "In-memory Service Bus (benchmarks/_fake_servicebus.py)")
+    for name in API:
+        setattr(module, name, getattr(bus, name))
+    module.bus = bus
+    sys.modules["shared_code.servicebus"] = module
+    shared_code.servicebus = module
+    # Modules that already hold a reference to the real one
+    for name in ("shared_code.outbox", "shared_code.warmup"):
+        if name in sys.modules:
+            sys.modules[name].servicebus = module
+    return module
@@ -0,0 +1,153 @@
+"""Throwaway PostgreSQL cluster for benchmark runs.
+
+``DisposablePostgres`` runs initdb in a temporary directory, starts the server
+on a private Unix socket (no TCP listener, durability switched off since the
+data is discarded), creates the ``spar`` database, loads database/schema.sql,
+applies the migrations in azure_functions/shared_code/migrations (unless
+``migrations=False``) and points the POSTGRES_* variables at it. Leaving the ``with`` block stops
+the server and deletes the directory.
+
+The server binaries are taken from PG_BIN, else ``pg_config --bindir``, else
+PATH. PostgreSQL refuses to run as root, so run the benchmarks as a regular
+user (or use an existing database instead).
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+from typing import Dict, Optional
+
+SCHEMA_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "database", "schema.sql"))
+
+# Settings for a database that only has to be fast, not durable
+SERVER_OPTIONS = {
+    "listen_addresses": "''",
+    "fsync": "off",
+    "synchronous_commit": "off",
+    "full_page_writes": "off",
+    "max_connections": "100",
+}
+
+
+def find_bindir() -> str:
+    bindir = os.getenv("PG_BIN")
+    if bindir:
+        return bindir
+    pg_config = shutil.which("pg_config")
+    if pg_config:
+        return subprocess.run([pg_config, "--bindir"], check=True, capture_output=True, text=True).stdout.strip()
+    initdb = shutil.which("initdb")
+    if initdb:
+        return os.path.dirname(initdb)
+    raise RuntimeError("PostgreSQL server binaries not found; set PG_BIN to the directory containing initdb and pg_ctl")
+
+
+def _free_port() -> int:
+    # Only names the socket file; the server does not listen on TCP
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class DisposablePostgres:
+    """A private cluster with the schema loaded, for the lifetime of a ``with`` block"""
+
+    def __init__(self, bindir: Optional[str] = None, schema_path: str = SCHEMA_PATH, database: str = "spar",
+                 migrations: bool = True):
+        self.bindir = bindir or find_bindir()
+        self.schema_path = schema_path
+        self.migrations = migrations
+        self.database = database
+        self.user = "postgres"
+        self.port = _free_port()
+        self.root: Optional[str] = None
+        self._saved_env: Dict[str, Optional[str]] = {}
+
+    @property
+    def socket_dir(self) -> str:
+        return os.path.join(self.root, "socket")
+
+    def env(self) -> Dict[str, str]:
+        """POSTGRES_* settings for the function app and the benchmark helpers"""
+        return {
+            "POSTGRES_HOST": self.socket_dir,
+            "POSTGRES_PORT": str(self.port),
+            "POSTGRES_USER": self.user,
+            # Trust authentication ignores it, but the function app requires one
+            "POSTGRES_PASSWORD": "postgres",
+            "POSTGRES_DATABASE": self.database,
+            "POSTGRES_SSLMODE": "disable",
+        }
+
+    def start(self) -> "DisposablePostgres":
+        if hasattr(os, "geteuid") and os.geteuid() == 0:
+            raise RuntimeError("PostgreSQL cannot run as root; run the benchmark as a regular user")
+        self.root = tempfile.mkdtemp(prefix="spar-bench-pg-")
+        data_dir = os.path.join(self.root, "data")
+        os.mkdir(self.socket_dir)
+        try:
+            self._run("initdb", "-D", data_dir, "-U", self.user, "--auth=trust", "-E", "UTF8", "--no-sync")
+            options = " ".join(f"-c {name}={value}" for name, value in SERVER_OPTIONS.items())
+            self._run("pg_ctl", "-D", data_dir, "-l", os.path.join(self.root, "server.log"), "-w",
+                      "-o", f"-p {self.port} -k {self.socket_dir} {options}", "start")
+            self._load_schema()
+        except BaseException:
+            self.stop()
+            raise
+
+        for name, value in self.env().items():
+            self._saved_env[name] = os.environ.get(name)
+            os.environ[name] = value
+        return self
+
+    def stop(self) -> None:
+        for name, value in self._saved_env.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+        self._saved_env.clear()
+        if self.root is None:
+            return
+        data_dir = os.path.join(self.root, "data")
+        if os.path.exists(os.path.join(data_dir, "postmaster.pid")):
+            subprocess.run([os.path.join(self.bindir, "pg_ctl"), "-D", data_dir, "-m", "immediate", "-w", "stop"],
+                           capture_output=True)
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.root = None
+
+    def __enter__(self) -> "DisposablePostgres":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _run(self, program: str, *args: str) -> None:
+        result = subprocess.run([os.path.join(self.bindir, program), *args], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{program} failed ({result.returncode}): {(result.stderr or result.stdout).strip()}")
+
+    def _load_schema(self) -> None:
+        import psycopg2
+
+        params = dict(host=self.socket_dir, port=self.port, user=self.user, sslmode="disable")
+        conn = psycopg2.connect(database="postgres", **params)
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute(f'CREATE DATABASE "{self.database}"')
+        conn.close()
+
+        with open(self.schema_path, encoding="utf-8") as f:
+            schema = f.read()
+        conn = psycopg2.connect(database=self.database, **params)
+        with conn.cursor() as cursor:
+            cursor.execute(schema)
+        conn.commit()
+        if self.migrations:
+            from shared_code import migrate
+
+            migrate.migrate(conn)
+        conn.close()
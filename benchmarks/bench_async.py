@@ -0,0 +1,80 @@
+"""Requests/sec of the sync and async data layers at a fixed concurrency.
+
+The sync side mimics a function worker with --threads threads, each calling
+shared_code.data.get_list; the async side keeps --concurrency calls to
+shared_code.async_data.get_list in flight on a single event loop. Both use
+their real connection pools, sized to --concurrency. --rtt-ms routes both
+through a proxy that adds a network round trip, as between a function app
+and Azure Database for PostgreSQL; on a local socket there is no I/O wait
+to overlap and the sync path wins on raw overhead.
+
+    python benchmarks/bench_async.py --requests 2000 --concurrency 32 --threads 1 --rtt-ms 2
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from _common import LatencyProxy, connect, drop_shop, new_shop_id, seed_lists
+
+
+def run_sync(list_id: str, requests: int, threads: int) -> float:
+    from shared_code import data
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for _ in executor.map(lambda _: data.get_list(list_id), range(requests)):
+            pass
+    return requests / (time.perf_counter() - started)
+
+
+async def run_async(list_id: str, requests: int, concurrency: int) -> float:
+    from shared_code import async_data
+
+    await async_data.get_list(list_id)  # open the pool outside the timed section
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one() -> None:
+        async with semaphore:
+            await async_data.get_list(list_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=1, help="worker threads for the sync run")
+    parser.add_argument("--items", type=int, default=20, help="items on the list being read")
+    parser.add_argument("--rtt-ms", type=float, default=2.0, help="simulated network round trip (0 to disable)")
+    args = parser.parse_args()
+
+    os.environ["POSTGRES_POOL_MAX_SIZE"] = str(max(args.concurrency, args.threads))
+    if args.rtt_ms > 0:
+        proxy = LatencyProxy(args.rtt_ms)
+        os.environ["POSTGRES_HOST"], port = proxy.address
+        os.environ["POSTGRES_PORT"] = str(port)
+
+    conn = connect()
+    shop_id = new_shop_id()
+    seed_lists(conn, shop_id, 1, args.items)
+    list_id = f"{shop_id}-l0"
+    try:
+        sync_rps = run_sync(list_id, args.requests, args.threads)
+        async_rps = asyncio.run(run_async(list_id, args.requests, args.concurrency))
+    finally:
+        drop_shop(conn, shop_id)
+        conn.close()
+
+    print(f"sync  ({args.threads} threads):      {sync_rps:8.1f} req/s")
+    print(f"async (concurrency {args.concurrency}): {async_rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
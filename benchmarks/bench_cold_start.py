@@ -0,0 +1,141 @@
+"""Cold-start cost per function: module import time and first vs. second request.
+
+Every function is measured in a fresh interpreter, as a new worker would load
+it: how long importing its package takes, which heavy modules that pulled in,
+and, for the read endpoints, the latency of the first request (settings,
+pool creation, connection setup) next to the second one. --warmup runs
+shared_code.warmup first, to see what is left for the first request after
+the warmup trigger has fired. Run from the repository root:
+
+    python benchmarks/bench_cold_start.py --repeat 5
+    python benchmarks/bench_cold_start.py --warmup --json cold_start.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+FUNCTIONS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, "azure_functions"))
+
+HEAVY_MODULES = ("psycopg2", "psycopg", "psycopg_pool", "bcrypt", "azure.servicebus")
+
+# Read endpoints that can be called with nothing but seeded data
+REQUESTS = {
+    "lists_get": lambda shop_id, list_id: {"shopId": shop_id},
+    "list_get": lambda shop_id, list_id: {"listId": list_id, "shopId": shop_id},
+    "lists_changes": lambda shop_id, list_id: {"shopId": shop_id},
+}
+
+
+def child(name: str, shop_id: str, list_id: str, warmup: bool) -> Dict[str, Any]:
+    """Measure one function in this (fresh) interpreter"""
+    import asyncio
+    import importlib
+    import inspect
+
+    sys.path.insert(0, FUNCTIONS_ROOT)
+    result: Dict[str, Any] = {"function": name}
+
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    result["import_ms"] = round((time.perf_counter() - started) * 1000.0, 3)
+    result["heavy_imports"] = [heavy for heavy in HEAVY_MODULES if heavy in sys.modules]
+
+    if name not in REQUESTS:
+        return result
+
+    import azure.functions as func
+
+    def request() -> func.HttpRequest:
+        return func.HttpRequest(method="GET", url=f"/api/{name}", params=REQUESTS[name](shop_id, list_id), body=b"")
+
+    async def call() -> float:
+        started = time.perf_counter()
+        response = module.main(request())
+        if inspect.isawaitable(response):
+            response = await response
+        if response.status_code != 200:
+            raise RuntimeError(f"{name} answered {response.status_code}: {response.get_body()[:200]!r}")
+        return round((time.perf_counter() - started) * 1000.0, 3)
+
+    async def run() -> None:
+        if warmup:
+            from shared_code.warmup import warm
+
+            result["warmup"] = await warm()
+        result["first_request_ms"] = await call()
+        result["second_request_ms"] = await call()
+
+    asyncio.run(run())
+    from shared_code import lazy
+
+    result["lazy_imports_ms"] = lazy.import_times()
+    return result
+
+
+def function_names() -> List[str]:
+    return sorted(
+        entry for entry in os.listdir(FUNCTIONS_ROOT)
+        if os.path.isfile(os.path.join(FUNCTIONS_ROOT, entry, "function.json"))
+    )
+
+
+def measure(name: str, shop_id: str, list_id: str, warmup: bool) -> Dict[str, Any]:
+    command = [sys.executable, os.path.abspath(__file__), "--child", name, shop_id, list_id]
+    if warmup:
+        command.append("--warmup")
+    output = subprocess.run(command, check=True, capture_output=True, text=True, cwd=FUNCTIONS_ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def median(runs: List[Dict[str, Any]], key: str) -> Any:
+    values = [run[key] for run in runs if run.get(key) is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--functions", nargs="+", help="function folders to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per function")
+    parser.add_argument("--warmup", action="store_true", help="run shared_code.warmup before the first request")
+    parser.add_argument("--json", metavar="PATH", help="also write the per-run results as JSON")
+    parser.add_argument("--child", nargs=3, metavar=("FUNCTION", "SHOP", "LIST"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        os.environ.setdefault("POSTGRES_SSLMODE", "prefer")
+        print(json.dumps(child(*args.child, warmup=args.warmup)))
+        return
+
+    from _common import connect, drop_shop, new_shop_id, seed_lists
+
+    conn = connect()
+    shop_id = new_shop_id("cold")
+    seed_lists(conn, shop_id, 20, 10)
+    list_id = f"{shop_id}-l0"
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    try:
+        print(f"{'function':>16} {'import ms':>10} {'1st req ms':>11} {'2nd req ms':>11}  heavy imports")
+        for name in args.functions or function_names():
+            runs = [measure(name, shop_id, list_id, args.warmup) for _ in range(args.repeat)]
+            results[name] = runs
+            first, second = median(runs, "first_request_ms"), median(runs, "second_request_ms")
+            print(f"{name:>16} {median(runs, 'import_ms'):>10} {first if first is not None else '-':>11} "
+                  f"{second if second is not None else '-':>11}  {', '.join(runs[-1]['heavy_imports']) or '-'}")
+    finally:
+        drop_shop(conn, shop_id)
+        conn.close()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"warmup": args.warmup, "repeat": args.repeat, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
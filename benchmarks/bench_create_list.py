@@ -0,0 +1,88 @@
+"""Regression benchmark for shared_code.data.create_list.
+
+Compares the bulk insert (one multi-row INSERT ... RETURNING for all items,
+response built from the returned rows) against the previous implementation
+(reproduced below as ``legacy_create_list``): one INSERT per item followed by
+a get_list re-read. Run from the repository root:
+
+    python benchmarks/bench_create_list.py --items 1 50 500 --rtt-ms 1
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import uuid
+
+from _common import (
+    LatencyProxy,
+    RoundTripCounter,
+    connect,
+    drop_shop,
+    new_shop_id,
+    patched_data_layer,
+    summarize,
+    time_calls,
+)
+from shared_code import queries
+
+
+def legacy_create_list(data, title, shop_id, items):
+    """The per-item implementation create_list replaced, kept as the baseline"""
+    list_id = uuid.uuid4().hex
+    conn = data.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO spar.lists (id, shop_id, title, status, created_at)
+        VALUES (%s, %s, %s, 'active', NOW())
+    """, (list_id, shop_id, title))
+    for item in items:
+        cursor.execute("""
+            INSERT INTO spar.list_items (id, list_id, sku, name, qty_requested, status, version)
+            VALUES (%s, %s, %s, %s, %s, %s, 1)
+        """, (uuid.uuid4().hex, list_id, item.get("sku"), item["name"], item["qty"], item.get("status", "pending")))
+    event = queries.list_created_event({"id": list_id, "title": title, "shop_id": shop_id, "items": items})
+    cursor.execute(queries.INSERT_OUTBOX_EVENT, queries.outbox_params(event))
+    conn.commit()
+    return data.get_list(list_id, shop_id)
+
+
+def make_items(count: int):
+    return [{"name": f"Item {n}", "qty": 1 + n % 5, "status": "pending"} for n in range(count)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 50, 500], help="items per created list")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated network round trip (0 to disable)")
+    args = parser.parse_args()
+
+    if args.rtt_ms > 0:
+        proxy = LatencyProxy(args.rtt_ms)
+        os.environ["POSTGRES_HOST"], port = proxy.address
+        os.environ["POSTGRES_PORT"] = str(port)
+
+    conn = connect()
+    counter = RoundTripCounter()
+    print(f"{'items':>6} {'impl':>8} {'round trips':>12} {'p50 ms':>9} {'p95 ms':>9}")
+    for item_count in args.items:
+        shop_id = new_shop_id()
+        items = make_items(item_count)
+        try:
+            with patched_data_layer(conn, counter) as data:
+                for impl, fn in (
+                    ("legacy", lambda: legacy_create_list(data, "Benchmark", shop_id, items)),
+                    ("bulk", lambda: data.create_list("Benchmark", shop_id, items)),
+                ):
+                    counter.count = 0
+                    fn()
+                    round_trips = counter.count
+                    stats = summarize(time_calls(fn, args.repeat))
+                    print(f"{item_count:>6} {impl:>8} {round_trips:>12} {stats['p50_ms']:>9} {stats['p95_ms']:>9}")
+        finally:
+            drop_shop(conn, shop_id)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
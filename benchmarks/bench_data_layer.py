@@ -0,0 +1,240 @@
+"""Data-layer benchmark suite: latency percentiles and round trips per operation.
+
+Starts a throwaway PostgreSQL cluster (see _postgres.py; --existing uses the
+database configured through POSTGRES_* instead), generates a synthetic data
+set (_datagen.py, --scale or the individual sizes) and times each
+shared_code.data operation plus payment_engine.calculate_total_amount on a
+single connection, counting the statements every call sends. The throwaway
+database is loaded from database/schema.sql, which already contains every
+migration, and then migrated (--no-migrations skips that step). To see the
+effect of a migration, load the schema.sql from before it with --schema (it
+gets the pending migrations unless --no-migrations is given) and --compare:
+
+  get_lists                   whole shop
+  get_lists_page              first page of --page-size lists
+  get_list                    one list with its items
+  create_list                 new list with items_per_list priced items
+  update_item                 item status change
+  complete_list               one of the lists create_list made
+  delete_list                 one of the lists create_list made
+  calculate_total_amount      price lookup with the price cache warm
+  calculate_total_amount_cold price cache cleared before every call
+
+The read cache is off, so reads always reach Postgres. --json writes the
+results for later comparison; --compare reads an earlier --json file and
+exits with status 1 when an operation got more than --threshold slower (p50)
+or needs more round trips. Run from the repository root, as a non-root user:
+
+    python benchmarks/bench_data_layer.py --scale small --json baseline.json
+    python benchmarks/bench_data_layer.py --scale small --compare baseline.json
+    git show <rev>:database/schema.sql > /tmp/schema-before.sql
+    python benchmarks/bench_data_layer.py --scale medium --schema /tmp/schema-before.sql --no-migrations --json before.json
+    python benchmarks/bench_data_layer.py --scale medium --compare before.json
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+os.environ.setdefault("READ_CACHE_ENABLED", "false")
+
+from _common import RoundTripCounter, connect, patched_data_layer, summarize, time_calls  # noqa: E402
+from _datagen import SCALES, Dataset, generate, remove  # noqa: E402
+from _postgres import SCHEMA_PATH, DisposablePostgres  # noqa: E402
+
+# name -> (call, whether it may be repeated untimed first)
+Operations = Dict[str, Tuple[Callable[[], Any], bool]]
+
+
+def priced_items(dataset: Dataset, rng: random.Random) -> List[Dict[str, Any]]:
+    return [
+        {"name": f"Item {m}", "sku": rng.choice(dataset.skus) if dataset.skus else None, "qty": rng.randint(1, 6)}
+        for m in range(dataset.items_per_list)
+    ]
+
+
+def operations(data, dataset: Dataset, page_size: int, seed: int) -> Operations:
+    import payment_engine
+    from shared_code import prices
+
+    rng = random.Random(seed)
+    shop_id = dataset.shops[0]
+    list_ids = itertools.cycle(dataset.lists[shop_id])
+    # Generated lists n % 3 == 0 are completed; update items of the active ones
+    active = [list_id for n, list_id in enumerate(dataset.lists[shop_id]) if n % 3]
+    item_targets = itertools.cycle(
+        (list_id, f"{list_id}-i{m}") for list_id in active for m in range(dataset.items_per_list)
+    )
+    statuses = itertools.cycle(("collected", "pending"))
+    created: List[str] = []
+    to_complete: List[str] = []
+    payment_items = priced_items(dataset, rng)
+
+    def create_list() -> None:
+        result = data.create_list("Benchmark list", shop_id, priced_items(dataset, rng))
+        created.append(result["id"])
+        to_complete.append(result["id"])
+
+    def update_item() -> None:
+        list_id, item_id = next(item_targets)
+        data.update_item(list_id, item_id, next(statuses))
+
+    def complete_list() -> None:
+        data.complete_list(to_complete.pop(), "employee-bench", shop_id)
+
+    def delete_list() -> None:
+        data.delete_list(created.pop(), shop_id)
+
+    def total_cold() -> None:
+        prices._cache.clear()
+        payment_engine.calculate_total_amount(payment_items)
+
+    # Order matters: complete_list and delete_list consume what create_list made
+    return {
+        "get_lists": (lambda: data.get_lists(shop_id), True),
+        "get_lists_page": (lambda: data.get_lists(shop_id, page_size), True),
+        "get_list": (lambda: data.get_list(next(list_ids)), True),
+        "create_list": (create_list, False),
+        "update_item": (update_item, True),
+        "complete_list": (complete_list, False),
+        "delete_list": (delete_list, False),
+        "calculate_total_amount": (lambda: payment_engine.calculate_total_amount(payment_items), True),
+        "calculate_total_amount_cold": (total_cold, True),
+    }
+
+
+def run_suite(conn, dataset: Dataset, repeat: int, warmup: int, page_size: int, seed: int,
+              only: Optional[Set[str]]) -> Dict[str, Dict[str, Any]]:
+    counter = RoundTripCounter()
+    results: Dict[str, Dict[str, Any]] = {}
+    with patched_data_layer(conn, counter) as data:
+        for name, (fn, warm) in operations(data, dataset, page_size, seed).items():
+            if only and name not in only:
+                continue
+            for _ in range(warmup if warm else 0):
+                fn()
+            counter.count = 0
+            samples = time_calls(fn, repeat)
+            conn.rollback()
+            results[name] = {"calls": repeat, "round_trips": round(counter.count / repeat, 2), **summarize(samples)}
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], threshold: float) -> List[str]:
+    """Print the change per operation and return the regressed ones"""
+    regressions = []
+    print(f"\n{'operation':>28} {'base p50':>9} {'p50':>9} {'change':>8} {'base rt':>8} {'rt':>6}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        change = current["p50_ms"] / before["p50_ms"] - 1.0 if before["p50_ms"] else 0.0
+        regressed = change > threshold or current["round_trips"] > before["round_trips"]
+        if regressed:
+            regressions.append(name)
+        print(f"{name:>28} {before['p50_ms']:>9} {current['p50_ms']:>9} {change:>+7.0%} "
+              f"{before['round_trips']:>8} {current['round_trips']:>6}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--shops", type=int, help="override the scale's shop count")
+    parser.add_argument("--lists", type=int, help="override the scale's lists per shop")
+    parser.add_argument("--items", type=int, help="override the scale's items per list")
+    parser.add_argument("--products", type=int, help="override the scale's product count")
+    parser.add_argument("--repeat", type=int, default=50, help="timed calls per operation")
+    parser.add_argument("--warmup", type=int, default=3, help="untimed calls before timing (repeatable operations)")
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--only", nargs="+", metavar="OPERATION", help="run only these operations")
+    parser.add_argument("--existing", action="store_true", help="use the POSTGRES_* database instead of a throwaway one")
+    parser.add_argument("--schema", metavar="PATH", default=SCHEMA_PATH, help="schema file for the throwaway database")
+    parser.add_argument("--no-migrations", action="store_true", help="throwaway database with the schema file only")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare with an earlier --json file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="p50 slowdown that counts as a regression")
+    args = parser.parse_args()
+    started_at = datetime.now(timezone.utc).isoformat()
+
+    only = set(args.only) if args.only else None
+    if only and only & {"complete_list", "delete_list"}:
+        # They work on the lists create_list made
+        only.add("create_list")
+
+    scale = dict(SCALES[args.scale])
+    for key, value in (("shops", args.shops), ("lists_per_shop", args.lists),
+                       ("items_per_list", args.items), ("products", args.products)):
+        if value is not None:
+            scale[key] = value
+
+    server = None if args.existing else DisposablePostgres(schema_path=args.schema, migrations=not args.no_migrations).start()
+    try:
+        conn = connect()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SHOW server_version")
+                server_version = cursor.fetchone()[0]
+            dataset = generate(conn, seed=args.seed, **scale)
+            try:
+                results = run_suite(conn, dataset, args.repeat, args.warmup, args.page_size, args.seed, only)
+            finally:
+                remove(conn, dataset)
+        finally:
+            conn.close()
+    finally:
+        if server is not None:
+            server.stop()
+
+    print(f"{'operation':>28} {'round trips':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'mean ms':>9}")
+    for name, stats in results.items():
+        print(f"{name:>28} {stats['round_trips']:>12} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['mean_ms']:>9}")
+
+    report = {
+        "meta": {
+            "started_at": started_at,
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "postgres": server_version,
+            "database": "existing" if args.existing else "disposable",
+            "migrations": None if args.existing else not args.no_migrations,
+            "schema": None if args.existing else os.path.relpath(args.schema),
+            "scale": scale,
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\nregressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Regression benchmark for shared_code.data.get_lists.
+
+Compares the single-round-trip join against the previous per-list item query
+(reproduced below as ``legacy_get_lists``) as the number of lists in a shop
+grows. Run from the repository root:
+
+    python benchmarks/bench_get_lists.py --lists 10 100 500 2000 --items 10
+"""
+from __future__ import annotations
+
+import argparse
+
+from _common import (
+    RoundTripCounter,
+    connect,
+    drop_shop,
+    new_shop_id,
+    patched_data_layer,
+    seed_lists,
+    summarize,
+    time_calls,
+)
+from shared_code import queries
+
+
+def legacy_get_lists(data, shop_id):
+    """The N+1 implementation get_lists replaced, kept as the baseline"""
+    conn = data.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT id, shop_id, title, status, created_at, completed_at, completed_by
+        FROM spar.lists
+        WHERE shop_id = %s
+        ORDER BY created_at DESC
+    """, (shop_id,))
+    lists = []
+    for row in cursor.fetchall():
+        list_data = queries.list_from_row(row)
+        cursor.execute("""
+            SELECT id, sku, name, qty_requested, qty_collected, status, version
+            FROM spar.list_items
+            WHERE list_id = %s
+            ORDER BY id
+        """, (row[0],))
+        list_data["items"] = [queries.item_from_row(item_row) for item_row in cursor.fetchall()]
+        lists.append(list_data)
+    return lists
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lists", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--items", type=int, default=10, help="items per list")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = connect()
+    counter = RoundTripCounter()
+    print(f"{'lists':>6} {'impl':>8} {'round trips':>12} {'p50 ms':>9} {'p95 ms':>9}")
+    for list_count in args.lists:
+        shop_id = new_shop_id()
+        seed_lists(conn, shop_id, list_count, args.items)
+        try:
+            with patched_data_layer(conn, counter) as data:
+                for impl, fn in (
+                    ("legacy", lambda: legacy_get_lists(data, shop_id)),
+                    ("join", lambda: data.get_lists(shop_id)),
+                ):
+                    counter.count = 0
+                    fn()
+                    round_trips = counter.count
+                    stats = summarize(time_calls(fn, args.repeat))
+                    print(f"{list_count:>6} {impl:>8} {round_trips:>12} {stats['p50_ms']:>9} {stats['p95_ms']:>9}")
+                    conn.rollback()
+        finally:
+            drop_shop(conn, shop_id)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Row mapping + Python encoding vs. Postgres-built JSON for the list reads.
+
+For a shop of --lists lists with --items items each, times producing the
+response body both ways:
+
+  rows   data.get_lists / data.get_list, mapped to dicts and encoded with
+         shared_code.http.dumps (the default path)
+  sql    data.get_lists_json / data.get_list_json, where Postgres assembles
+         the document and Python only passes the bytes on
+         (SQL_JSON_ENDPOINTS=lists_get,list_get)
+
+Both are measured on the same connection with the read cache off, so the
+numbers include the query. --limit times one page instead of the whole shop.
+Run from the repository root:
+
+    python benchmarks/bench_json_assembly.py --lists 100 1000 --items 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+
+os.environ.setdefault("READ_CACHE_ENABLED", "false")
+
+from _common import (  # noqa: E402
+    RoundTripCounter,
+    connect,
+    drop_shop,
+    new_shop_id,
+    patched_data_layer,
+    seed_lists,
+    summarize,
+    time_calls,
+)
+from shared_code import http  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lists", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--items", type=int, default=10, help="items per list")
+    parser.add_argument("--limit", type=int, help="page size for the lists read (default: whole shop)")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    conn = connect()
+    counter = RoundTripCounter()
+    print(f"serializer: {http.get_serializer().name}")
+    print(f"{'lists':>6} {'read':>6} {'path':>5} {'bytes':>10} {'p50 ms':>9} {'p95 ms':>9} {'vs rows':>8}")
+    for list_count in args.lists:
+        shop_id = new_shop_id("json")
+        seed_lists(conn, shop_id, list_count, args.items)
+        list_id = f"{shop_id}-l0"
+        try:
+            with patched_data_layer(conn, counter) as data:
+                reads = {
+                    "lists": (lambda: http.dumps(data.get_lists(shop_id, args.limit)),
+                              lambda: data.get_lists_json(shop_id, args.limit)[0]),
+                    "list": (lambda: http.dumps(data.get_list(list_id)), lambda: data.get_list_json(list_id)),
+                }
+                for read, (rows_fn, sql_fn) in reads.items():
+                    if json.loads(rows_fn()) != json.loads(sql_fn()):
+                        raise SystemExit(f"{read}: the two paths returned different documents")
+                    baseline = None
+                    for path, fn in (("rows", rows_fn), ("sql", sql_fn)):
+                        size = len(fn())
+                        stats = summarize(time_calls(fn, args.repeat))
+                        baseline = baseline or stats["p50_ms"]
+                        print(f"{list_count:>6} {read:>6} {path:>5} {size:>10} {stats['p50_ms']:>9} "
+                              f"{stats['p95_ms']:>9} {baseline / stats['p50_ms']:>7.1f}x")
+                    conn.rollback()
+        finally:
+            drop_shop(conn, shop_id)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""End-to-end load test of the HTTP functions without Azure.
+
+Calls the functions' ``main(req)`` entry points directly with synthetic
+HttpRequest objects, against a throwaway PostgreSQL cluster (see
+_postgres.py; --existing uses the POSTGRES_* database) and with
+shared_code.servicebus replaced by an in-memory stand-in
+(_fake_servicebus.py). The outbox_relay timer runs every --relay-interval
+seconds as it would in the function app.
+
+--users virtual users share one event loop and split by --mix into three
+roles. Each user logs in through auth_login first.
+
+  pickers   open an active list no other picker holds (list_get), mark its
+            pending items collected one by one (item_update with If-Match),
+            and complete the list once nothing is pending (list_complete,
+            --complete-ratio)
+  pollers   poll their shop every --poll-interval seconds
+            (lists_get, first page, with If-None-Match)
+  managers  create lists (list_create) and delete completed ones (list_delete)
+
+After --duration seconds it reports requests/s, p50/p95/p99 latency and the
+error rate per endpoint. Errors are exceptions and 5xx answers; 409 version
+conflicts between pickers on the same list are counted but expected.
+Run from the repository root, as a non-root user:
+
+    python benchmarks/bench_load.py --users 50 --duration 30 --mix 70,25,5
+    python benchmarks/bench_load.py --users 200 --pool-size 20 --json load.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import os
+import random
+import time
+import types
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from _common import connect, summarize
+from _datagen import PASSWORD, SCALES, Dataset, generate, remove
+from _postgres import DisposablePostgres
+
+ENDPOINTS = ("auth_login", "lists_get", "list_get", "list_create", "item_update", "list_complete", "list_delete")
+
+
+class EndpointStats:
+    def __init__(self) -> None:
+        self.samples: List[float] = []
+        self.statuses: Counter = Counter()
+        self.errors = 0
+
+    def record(self, elapsed_ms: float, status: Optional[int]) -> None:
+        self.samples.append(elapsed_ms)
+        self.statuses[status if status is not None else "exception"] += 1
+        if status is None or status >= 500:
+            self.errors += 1
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        count = len(self.samples)
+        return {
+            "requests": count,
+            "rps": round(count / duration, 1),
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "statuses": {str(status): n for status, n in sorted(self.statuses.items(), key=str)},
+            **(summarize(self.samples) if count else {}),
+        }
+
+
+class Shop:
+    """Lists of one shop as the virtual users know them"""
+
+    def __init__(self, shop_id: str, active: List[str], completed: List[str]) -> None:
+        self.shop_id = shop_id
+        self.active: Set[str] = set(active)
+        self.completed: List[str] = list(completed)
+        # Lists a picker is working on; the others leave them alone
+        self.claimed: Set[str] = set()
+
+
+class LoadTest:
+    def __init__(self, dataset: Dataset, args: argparse.Namespace) -> None:
+        self.dataset = dataset
+        self.args = args
+        self.functions = {name: importlib.import_module(name) for name in ENDPOINTS}
+        self.stats: Dict[str, EndpointStats] = defaultdict(EndpointStats)
+        self.rng = random.Random(args.seed)
+        self.shops = [
+            Shop(shop_id,
+                 [list_id for n, list_id in enumerate(list_ids) if n % 3],
+                 [list_id for n, list_id in enumerate(list_ids) if n % 3 == 0])
+            for shop_id, list_ids in dataset.lists.items()
+        ]
+        self.deadline = 0.0
+
+    async def call(self, name: str, method: str, route: str = "", params: Optional[Dict[str, str]] = None,
+                   route_params: Optional[Dict[str, str]] = None, body: Any = None,
+                   headers: Optional[Dict[str, str]] = None):
+        import azure.functions as func
+
+        req = func.HttpRequest(
+            method=method,
+            url=f"http://localhost/api/{route or name}",
+            params=params or {},
+            route_params=route_params or {},
+            headers=headers or {},
+            body=json.dumps(body).encode("utf-8") if body is not None else b"",
+        )
+        main = self.functions[name].main
+        started = time.perf_counter()
+        response = None
+        try:
+            if inspect.iscoroutinefunction(main):
+                response = await main(req)
+            else:
+                # Sync functions run on the worker's thread pool in the function host too
+                response = await asyncio.to_thread(main, req)
+        except Exception:
+            pass
+        self.stats[name].record((time.perf_counter() - started) * 1000.0,
+                                response.status_code if response is not None else None)
+        return response
+
+    async def pause(self, seconds: float) -> None:
+        """Sleep, but not past the end of the run"""
+        await asyncio.sleep(max(0.0, min(seconds, self.deadline - time.monotonic())))
+
+    async def think(self, scale: float = 1.0) -> None:
+        await self.pause(self.args.think_ms / 1000.0 * scale * self.rng.uniform(0.5, 1.5))
+
+    def running(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    async def login(self, shop: Shop) -> Dict[str, str]:
+        username = self.rng.choice(self.dataset.users[shop.shop_id])
+        response = await self.call("auth_login", "POST", body={"username": username, "password": PASSWORD})
+        if response is None or response.status_code != 200:
+            return {}
+        return {"Authorization": f"Bearer {json.loads(response.get_body())['token']}"}
+
+    async def picker(self, shop: Shop) -> None:
+        headers = await self.login(shop)
+        while self.running():
+            available = shop.active - shop.claimed
+            if not available:
+                # Every open list has a picker; wait for managers to create more
+                await self.think()
+                continue
+            list_id = self.rng.choice(sorted(available))
+            shop.claimed.add(list_id)
+            try:
+                await self.pick(shop, list_id, headers)
+            finally:
+                shop.claimed.discard(list_id)
+            await self.think()
+
+    async def pick(self, shop: Shop, list_id: str, headers: Dict[str, str]) -> None:
+        response = await self.call("list_get", "GET", params={"listId": list_id, "shopId": shop.shop_id},
+                                       headers=headers)
+        if response is None or response.status_code != 200:
+            shop.active.discard(list_id)
+            return
+        pending = [item for item in json.loads(response.get_body())["items"] if item["status"] == "pending"]
+        for item in pending[:self.args.updates_per_visit]:
+            if not self.running():
+                return
+            await self.think()
+            response = await self.call(
+                "item_update", "POST", route=f"item_update/{list_id}/{item['id']}",
+                route_params={"list_id": list_id, "item_id": item["id"]},
+                body={"status": "collected", "qtyCollected": item["qty"]},
+                headers={**headers, "If-Match": f'"{item["version"]}"'},
+            )
+            if response is not None and response.status_code == 200:
+                pending.remove(item)
+        if not pending and list_id in shop.active and self.rng.random() < self.args.complete_ratio:
+            shop.active.discard(list_id)
+            response = await self.call("list_complete", "POST", route=f"list_complete/{list_id}",
+                                       params={"shopId": shop.shop_id}, route_params={"list_id": list_id},
+                                       body={"employeeId": "picker"}, headers=headers)
+            if response is not None and response.status_code == 200:
+                shop.completed.append(list_id)
+
+    async def poller(self, shop: Shop) -> None:
+        headers = await self.login(shop)
+        etag = None
+        while self.running():
+            request_headers = dict(headers, **({"If-None-Match": etag} if etag else {}))
+            response = await self.call("lists_get", "GET", params={"shopId": shop.shop_id, "limit": "50"},
+                                       headers=request_headers)
+            if response is not None and response.status_code in (200, 304):
+                etag = response.headers.get("ETag") or etag
+            await self.pause(self.args.poll_interval * self.rng.uniform(0.8, 1.2))
+
+    async def manager(self, shop: Shop) -> None:
+        headers = await self.login(shop)
+        while self.running():
+            items = [
+                {"name": f"Item {m}", "sku": self.rng.choice(self.dataset.skus), "qty": self.rng.randint(1, 6)}
+                for m in range(self.dataset.items_per_list)
+            ]
+            response = await self.call("list_create", "POST", params={"shopId": shop.shop_id},
+                                       body={"title": "Load test list", "items": items}, headers=headers)
+            if response is not None and response.status_code == 200:
+                shop.active.add(json.loads(response.get_body())["id"])
+            if shop.completed:
+                list_id = shop.completed.pop(0)
+                await self.call("list_delete", "DELETE", route=f"list_delete/{list_id}",
+                                params={"shopId": shop.shop_id}, route_params={"list_id": list_id}, headers=headers)
+            await self.think(10)
+
+    async def relay(self) -> None:
+        import outbox_relay
+
+        timer = types.SimpleNamespace(past_due=False)
+        while self.running():
+            await self.pause(self.args.relay_interval)
+            await asyncio.to_thread(outbox_relay.main, timer)
+
+    async def run(self) -> Tuple[float, Dict[str, Dict[str, Any]]]:
+        from shared_code import async_data
+
+        pickers, pollers, _ = (round(self.args.users * share / sum(self.args.mix)) for share in self.args.mix)
+        roles = [self.picker] * pickers + [self.poller] * pollers
+        roles += [self.manager] * (self.args.users - len(roles))
+        users = [role(self.shops[n % len(self.shops)]) for n, role in enumerate(roles)]
+
+        await async_data.get_connection_pool()
+        started = time.monotonic()
+        self.deadline = started + self.args.duration
+        await asyncio.gather(self.relay(), *users)
+        duration = time.monotonic() - started
+        pool = await async_data.get_connection_pool()
+        await pool.close()
+        return duration, {name: self.stats[name].report(duration) for name in ENDPOINTS if name in self.stats}
+
+
+def parse_mix(value: str) -> List[float]:
+    parts = [float(part) for part in value.split(",")]
+    if len(parts) != 3 or min(parts) < 0 or not sum(parts):
+        raise argparse.ArgumentTypeError("mix is pickers,pollers,managers, e.g. 70,25,5")
+    return parts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--mix", type=parse_mix, default=[70, 25, 5], help="pickers,pollers,managers shares")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of load")
+    parser.add_argument("--think-ms", type=float, default=100.0, help="pause between a picker's requests")
+    parser.add_argument("--poll-interval", type=float, default=5.0, help="seconds between a poller's requests")
+    parser.add_argument("--updates-per-visit", type=int, default=5, help="items a picker collects per list visit")
+    parser.add_argument("--complete-ratio", type=float, default=0.8, help="chance a finished list gets completed")
+    parser.add_argument("--relay-interval", type=float, default=5.0, help="seconds between outbox relay runs")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small", help="generated data (see _datagen)")
+    parser.add_argument("--users-per-shop", type=int, default=5, help="accounts per shop to log in with")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10, help="cost of the generated password hashes")
+    parser.add_argument("--pool-size", type=int, help="POSTGRES_POOL_MAX_SIZE for the function app")
+    parser.add_argument("--bus-latency-ms", type=float, default=0.0, help="simulated Service Bus send latency")
+    parser.add_argument("--bus-failure-rate", type=float, default=0.0, help="share of Service Bus sends that fail")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--existing", action="store_true", help="use the POSTGRES_* database instead of a throwaway one")
+    parser.add_argument("--json", metavar="PATH", help="write the results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("SESSION_SECRET", "load-test")
+    if args.pool_size:
+        os.environ["POSTGRES_POOL_MAX_SIZE"] = str(args.pool_size)
+
+    server = None if args.existing else DisposablePostgres().start()
+    try:
+        from _fake_servicebus import InMemoryServiceBus, install
+
+        bus = InMemoryServiceBus(args.bus_latency_ms, args.bus_failure_rate, seed=args.seed)
+        install(bus)
+
+        conn = connect()
+        dataset = generate(conn, seed=args.seed, users_per_shop=args.users_per_shop,
+                           bcrypt_rounds=args.bcrypt_rounds, **SCALES[args.scale])
+        try:
+            duration, results = asyncio.run(LoadTest(dataset, args).run())
+            import outbox_relay
+            from shared_code import last_login
+
+            # Drain what the last relay tick missed and write buffered logins before cleaning up
+            outbox_relay.main(types.SimpleNamespace(past_due=False))
+            last_login.flush()
+        finally:
+            remove(conn, dataset)
+            conn.close()
+    finally:
+        if server is not None:
+            server.stop()
+
+    total = sum(result["requests"] for result in results.values())
+    errors = sum(result["errors"] for result in results.values())
+    print(f"{args.users} users for {duration:.1f}s: {total} requests, {total / duration:.1f} req/s, {errors} errors")
+    print(f"{'endpoint':>14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}  statuses")
+    for name, result in results.items():
+        statuses = " ".join(f"{status}:{n}" for status, n in result["statuses"].items())
+        print(f"{name:>14} {result['requests']:>9} {result['rps']:>8} {result.get('p50_ms', '-'):>9} "
+              f"{result.get('p95_ms', '-'):>9} {result.get('p99_ms', '-'):>9} {result['error_rate']:>7.1%}  {statuses}")
+    bus_stats = bus.get_stats()
+    print(f"service bus: {bus_stats['sent']} sent, {bus_stats['failed']} failed, per queue {bus_stats['queues']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "config": {key: value for key, value in vars(args).items() if key != "json"},
+                "duration_s": round(duration, 3),
+                "requests": total,
+                "rps": round(total / duration, 1),
+                "errors": errors,
+                "endpoints": results,
+                "servicebus": bus_stats,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Cost of encoding a lists_get-sized response with each JSON serializer.
+
+Builds --lists lists of --items items each, shaped like shared_code.data
+returns them (datetime timestamps), and times turning them into response
+bytes:
+
+  legacy   timestamps pre-formatted with isoformat() + "Z", then
+           json.dumps(ensure_ascii=False) and UTF-8 encoding (the old path)
+  json     shared_code.http's stdlib serializer
+  orjson   shared_code.http's orjson serializer (skipped if not installed)
+
+No database is needed. Run from the repository root:
+
+    python benchmarks/bench_serialization.py --lists 1000 --items 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from _common import summarize, time_calls
+from shared_code import http
+
+
+def make_lists(list_count: int, items_per_list: int) -> List[Dict[str, Any]]:
+    started = datetime(2025, 1, 1, 8, 0, 0, 123456)
+    return [
+        {
+            "id": f"list-{n:06d}",
+            "shop_id": "bench-shop",
+            "title": f"Bestellung {n} für Filiale Zürich",
+            "status": "completed" if n % 3 == 0 else "active",
+            "created_at": started + timedelta(minutes=n),
+            "completed_at": started + timedelta(minutes=n, seconds=30) if n % 3 == 0 else None,
+            "completed_by": "employee-7" if n % 3 == 0 else None,
+            "items": [
+                {"id": f"item-{n:06d}-{m}", "name": f"Artikel {m}", "qty": 1 + m % 5, "status": "pending", "version": 1}
+                for m in range(items_per_list)
+            ],
+        }
+        for n in range(list_count)
+    ]
+
+
+def legacy_encode(lists: List[Dict[str, Any]]) -> bytes:
+    """What the handlers did before: format timestamps in the mapper, json.dumps, encode"""
+    formatted = []
+    for list_data in lists:
+        list_data = dict(list_data)
+        for key in ("created_at", "completed_at"):
+            list_data[key] = list_data[key].isoformat() + "Z" if list_data[key] else None
+        formatted.append(list_data)
+    return json.dumps(formatted, ensure_ascii=False).encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lists", type=int, nargs="+", default=[1000])
+    parser.add_argument("--items", type=int, default=10, help="items per list")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    encoders = {"legacy": legacy_encode, "json": http.make_serializer("json").dumps}
+    orjson_serializer = http.make_serializer("orjson")
+    if orjson_serializer.name == "orjson":
+        encoders["orjson"] = orjson_serializer.dumps
+    else:
+        print("orjson not installed; skipping it")
+
+    print(f"{'lists':>6} {'encoder':>8} {'bytes':>10} {'p50 ms':>9} {'p95 ms':>9} {'vs legacy':>10}")
+    for list_count in args.lists:
+        lists = make_lists(list_count, args.items)
+        baseline = None
+        for name, encode in encoders.items():
+            size = len(encode(lists))
+            stats = summarize(time_calls(lambda: encode(lists), args.repeat))
+            baseline = baseline or stats["p50_ms"]
+            print(f"{list_count:>6} {name:>8} {size:>10} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+                  f"{baseline / stats['p50_ms']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
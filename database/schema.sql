@@ -1,5 +1,10 @@
 -- Spar Collection Database Schema
 -- PostgreSQL Database Schema for Shopping List Management System
+-- Loads the current schema into a new database, including every migration in
+-- azure_functions/shared_code/migrations: they are recorded as applied in
+-- spar.schema_migrations at the end of this file. Databases created from an earlier
+-- version are brought up to date with python -m shared_code.migrate up. A new
+-- migration is added here too, with its row in spar.schema_migrations.
 
 -- Create schema
 CREATE SCHEMA IF NOT EXISTS spar;
@@ -19,7 +24,6 @@ CREATE TABLE IF NOT EXISTS spar.users (
     last_login TIMESTAMP
 );
 
-CREATE INDEX idx_users_username ON spar.users(username);
 CREATE INDEX idx_users_shop_id ON spar.users(shop_id);
 
 -- Products table (for pricing and product catalog)
@@ -36,6 +40,7 @@ CREATE TABLE IF NOT EXISTS spar.products (
 
 CREATE INDEX idx_products_active ON spar.products(active);
 CREATE INDEX idx_products_category ON spar.products(category);
+CREATE INDEX idx_products_updated_at ON spar.products(updated_at);
 
 -- Shopping lists table
 CREATE TABLE IF NOT EXISTS spar.lists (
@@ -52,7 +57,8 @@ CREATE TABLE IF NOT EXISTS spar.lists (
     )
 );
 
-CREATE INDEX idx_lists_shop_id ON spar.lists(shop_id);
+-- lists_get pages (WHERE shop_id = ? ORDER BY created_at DESC, id DESC) in index order
+CREATE INDEX idx_lists_shop_created_id ON spar.lists (shop_id, created_at DESC, id DESC);
 CREATE INDEX idx_lists_status ON spar.lists(status);
 CREATE INDEX idx_lists_created_at ON spar.lists(created_at DESC);
 
@@ -70,7 +76,9 @@ CREATE TABLE IF NOT EXISTS spar.list_items (
     CONSTRAINT fk_list_items_product FOREIGN KEY (sku) REFERENCES spar.products(sku) ON DELETE SET NULL
 );
 
-CREATE INDEX idx_list_items_list_id ON spar.list_items(list_id);
+-- Item fetches read every column from the index, in id order
+CREATE INDEX idx_list_items_list_id_id ON spar.list_items (list_id, id)
+    INCLUDE (sku, name, qty_requested, qty_collected, status, version);
 CREATE INDEX idx_list_items_status ON spar.list_items(status);
 CREATE INDEX idx_list_items_sku ON spar.list_items(sku);
 
@@ -91,6 +99,20 @@ CREATE INDEX idx_payment_list_id ON spar.payment_transactions(list_id);
 CREATE INDEX idx_payment_shop_id ON spar.payment_transactions(shop_id);
 CREATE INDEX idx_payment_processed_at ON spar.payment_transactions(processed_at DESC);
 
+-- Transactional outbox: domain events written alongside the change they describe
+CREATE TABLE IF NOT EXISTS spar.event_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(100) NOT NULL,
+    list_id VARCHAR(255),
+    payload JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW(),
+    -- Failed sends are retried from next_attempt_at; parked after OUTBOX_MAX_ATTEMPTS
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    parked_at TIMESTAMP
+);
+
 -- Function to update updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -106,9 +128,195 @@ CREATE TRIGGER update_products_updated_at
     FOR EACH ROW
     EXECUTE FUNCTION update_updated_at_column();
 
+-- Change tracking for the lists_changes feed: every insert/update stamps the row with the
+-- writing transaction id, deletes leave a tombstone. Feed cursors are snapshot xmin values,
+-- so rows written by transactions still in flight when a client polls are not skipped.
+ALTER TABLE spar.lists ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+ALTER TABLE spar.list_items ADD COLUMN IF NOT EXISTS change_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+
+CREATE INDEX IF NOT EXISTS idx_lists_shop_change_xid ON spar.lists(shop_id, change_xid);
+CREATE INDEX IF NOT EXISTS idx_list_items_change_xid ON spar.list_items(change_xid);
+
+CREATE TABLE IF NOT EXISTS spar.deleted_records (
+    id BIGSERIAL PRIMARY KEY,
+    record_type VARCHAR(20) NOT NULL CHECK (record_type IN ('list', 'item')),
+    record_id VARCHAR(255) NOT NULL,
+    list_id VARCHAR(255) NOT NULL,
+    shop_id VARCHAR(255) NOT NULL,
+    change_xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    deleted_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_deleted_records_shop_change_xid ON spar.deleted_records(shop_id, change_xid);
+
+CREATE OR REPLACE FUNCTION spar.stamp_change_xid()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.change_xid = pg_current_xact_id();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION spar.record_list_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.deleted_records (record_type, record_id, list_id, shop_id)
+    VALUES ('list', OLD.id, OLD.id, OLD.shop_id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Items removed by a list delete cascade are covered by the list's tombstone
+CREATE OR REPLACE FUNCTION spar.record_item_deletion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.deleted_records (record_type, record_id, list_id, shop_id)
+    SELECT 'item', OLD.id, OLD.list_id, l.shop_id
+    FROM spar.lists l
+    WHERE l.id = OLD.list_id;
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER stamp_lists_change_xid
+    BEFORE UPDATE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.stamp_change_xid();
+
+CREATE OR REPLACE TRIGGER stamp_list_items_change_xid
+    BEFORE UPDATE ON spar.list_items
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.stamp_change_xid();
+
+CREATE OR REPLACE TRIGGER record_lists_deletion
+    AFTER DELETE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.record_list_deletion();
+
+CREATE OR REPLACE TRIGGER record_list_items_deletion
+    AFTER DELETE ON spar.list_items
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.record_item_deletion();
+
+-- Revisions for conditional GETs (ETag): a list's revision moves with any change to it or
+-- its items, a shop's revision with any change to its lists. Both only ever increase and are
+-- updated inside the writing transaction, so an unchanged value means unchanged data.
+ALTER TABLE spar.lists ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 1;
+
+CREATE TABLE IF NOT EXISTS spar.shop_revisions (
+    shop_id VARCHAR(255) PRIMARY KEY,
+    revision BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION spar.bump_list_revision()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.revision = OLD.revision + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Statement level, so a batch of item changes touches each parent list once. The lists are
+-- locked in id order, so concurrent batches over overlapping lists cannot deadlock.
+CREATE OR REPLACE FUNCTION spar.bump_lists_for_items()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        UPDATE spar.lists l SET revision = l.revision + 1
+        FROM (SELECT id FROM spar.lists WHERE id IN (SELECT list_id FROM old_items)
+              ORDER BY id FOR NO KEY UPDATE) locked
+        WHERE l.id = locked.id;
+    ELSE
+        UPDATE spar.lists l SET revision = l.revision + 1
+        FROM (SELECT id FROM spar.lists WHERE id IN (SELECT list_id FROM new_items)
+              ORDER BY id FOR NO KEY UPDATE) locked
+        WHERE l.id = locked.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Once per statement on spar.lists, shops in shop_id order, rather than once per list row
+CREATE OR REPLACE FUNCTION spar.bump_shop_revision()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO spar.shop_revisions AS s (shop_id, revision)
+    SELECT shop_id, 1
+    FROM (SELECT DISTINCT shop_id FROM changed_lists) changed
+    ORDER BY shop_id
+    ON CONFLICT (shop_id) DO UPDATE SET revision = s.revision + 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER bump_lists_revision
+    BEFORE UPDATE ON spar.lists
+    FOR EACH ROW
+    EXECUTE FUNCTION spar.bump_list_revision();
+
+CREATE OR REPLACE TRIGGER bump_lists_for_item_inserts
+    AFTER INSERT ON spar.list_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_lists_for_items();
+
+CREATE OR REPLACE TRIGGER bump_lists_for_item_updates
+    AFTER UPDATE ON spar.list_items
+    REFERENCING NEW TABLE AS new_items
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_lists_for_items();
+
+CREATE OR REPLACE TRIGGER bump_lists_for_item_deletes
+    AFTER DELETE ON spar.list_items
+    REFERENCING OLD TABLE AS old_items
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_lists_for_items();
+
+CREATE OR REPLACE TRIGGER bump_shop_revision_on_insert
+    AFTER INSERT ON spar.lists
+    REFERENCING NEW TABLE AS changed_lists
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_shop_revision();
+
+CREATE OR REPLACE TRIGGER bump_shop_revision_on_update
+    AFTER UPDATE ON spar.lists
+    REFERENCING NEW TABLE AS changed_lists
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_shop_revision();
+
+CREATE OR REPLACE TRIGGER bump_shop_revision_on_delete
+    AFTER DELETE ON spar.lists
+    REFERENCING OLD TABLE AS changed_lists
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION spar.bump_shop_revision();
+
 -- Comments for documentation
 COMMENT ON SCHEMA spar IS 'Spar Collection shopping list management system';
 COMMENT ON TABLE spar.products IS 'Product catalog with pricing information';
 COMMENT ON TABLE spar.lists IS 'Shopping lists created for collection';
 COMMENT ON TABLE spar.list_items IS 'Items within shopping lists';
 COMMENT ON TABLE spar.payment_transactions IS 'Payment transaction audit trail';
+COMMENT ON TABLE spar.event_outbox IS 'Domain events pending relay to Service Bus';
+COMMENT ON TABLE spar.deleted_records IS 'Tombstones of deleted lists and items for the change feed';
+COMMENT ON TABLE spar.shop_revisions IS 'Per-shop change counter used as the lists_get ETag';
+
+-- Migrations already contained in this file (see shared_code.migrate); checksums of the files
+CREATE TABLE IF NOT EXISTS spar.schema_migrations (
+    version INTEGER PRIMARY KEY,
+    name VARCHAR(255) NOT NULL,
+    checksum VARCHAR(64) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    duration_ms NUMERIC(12, 3)
+);
+
+INSERT INTO spar.schema_migrations (version, name, checksum) VALUES
+    (1, 'event_outbox', 'ca2421a1e58458c120efdf97751381f7664f92037f605ee9ae597038d81ea52e'),
+    (2, 'change_tracking', 'e976dc1b2427ecdc50ed49fd847b3b5612fc864655ba44d604b5a4521f01388f'),
+    (3, 'list_and_shop_revisions', '7f8901c94351919d8c6042b4225915760eafbb5d41162ce1c414605d7b3ab1c2'),
+    (4, 'products_updated_at_index', '9e69cf2d817a191714e9990a1d5ae788667b3d57ec97caa57e30389dbd94b210'),
+    (5, 'lists_shop_page_index', '966cf65546ac4496c2daf2aafa4ae58f00122bd42fe8266d6c12eaaab469f549'),
+    (6, 'list_items_covering_index', '62f11fcc6509eb8546816c2c60cc06d29e292662f383c318732c058d60ed7338'),
+    (7, 'drop_duplicate_username_index', '6d626b8719398fbe154cb7f271c7c8d4f7be5d3786ae774688ab9bd94c568aa5'),
+    (8, 'outbox_retries', '1165bb4ab6df3cbda150f90be7979386a869d63604e32d757b92d18c4317f4d3'),
+    (9, 'ordered_revision_bumps', 'd3420a06221f19e443ecc2c2541c3e25a6e0ace82289a2e217b1377998c3d35d')
+ON CONFLICT (version) DO NOTHING;
@@ -1,5 +1,5 @@
 import { offlineManager } from './offline';
-import { getShopId } from './auth';
+import { authHeaders, getShopId } from './auth';
 
 const rawBase = (import.meta.env.VITE_API_URL as string | undefined) ?? '/api';
 export const API_BASE = rawBase.endsWith('/') ? rawBase.slice(0, -1) : rawBase;
@@ -20,12 +20,25 @@ export const listCreateRoute = (shopId = getConfiguredShopId()) => `/list_create
 export const listDeleteRoute = (listId: string) =>
   `/list_delete/${encodeURIComponent(listId)}`;
 
+// Thrown for 409 responses: the item changed on the server since the client read it
+export class ConflictError extends Error {
+  readonly current: unknown;
+
+  constructor(current: unknown) {
+    super('Item was changed by someone else');
+    this.name = 'ConflictError';
+    this.current = current;
+  }
+}
+
 export const joinApi = (base: string, path: string): string =>
   `${base.replace(/\/+$/, '')}/${path.replace(/^\/+/, '')}`;
 
 export async function apiGet<T = unknown>(path: string, init: RequestInit = {}): Promise<T> {
   try {
-    const res = await fetch(joinApi(API_BASE, path), { ...init, credentials: 'include' });
+    const headers = new Headers(init.headers);
+    Object.entries(authHeaders()).forEach(([name, value]) => headers.set(name, value));
+    const res = await fetch(joinApi(API_BASE, path), { ...init, headers, credentials: 'include' });
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     const data = await res.json() as T;
     
@@ -55,14 +68,20 @@ export async function apiPost<T = unknown>(path: string, body: unknown): Promise
   try {
     const res = await fetch(joinApi(API_BASE, path), {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
       body: JSON.stringify(body),
       credentials: 'include',
     });
+    if (res.status === 409) {
+      const conflict = await res.json() as { item?: unknown };
+      throw new ConflictError(conflict.item);
+    }
     if (!res.ok) throw new Error(`HTTP ${res.status}`);
     return res.json() as Promise<T>;
-  // eslint-disable-next-line @typescript-eslint/no-unused-vars
   } catch (error) {
+    // A conflict would fail again on replay, so surface it instead of queuing
+    if (error instanceof ConflictError) throw error;
+
     // Queue ALL failed POST requests (offline OR backend errors)
     console.log('POST request failed - queuing update:', path);
     offlineManager.storePendingUpdate({
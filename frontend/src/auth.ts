@@ -3,6 +3,8 @@ interface User {
   username: string;
   shopId: string;
   role: 'employee' | 'manager' | 'admin';
+  token?: string;
+  expiresAt?: number; // seconds since epoch
 }
 
 const AUTH_KEY = import.meta.env.VITE_AUTH_KEY || 'spar_auth_user';
@@ -52,6 +54,13 @@ export function isAuthenticated(): boolean {
   return getCurrentUser() !== null;
 }
 
+// Authorization header for API calls; empty once the session token has expired
+export function authHeaders(): Record<string, string> {
+  const user = getCurrentUser();
+  if (!user?.token || (user.expiresAt && user.expiresAt * 1000 <= Date.now())) return {};
+  return { Authorization: `Bearer ${user.token}` };
+}
+
 export function getShopId(): string {
   const user = getCurrentUser();
   return user?.shopId || 'default-shop';
@@ -1,4 +1,6 @@
 // Offline support for tablets - critical requirement for case study
+import { authHeaders } from './auth';
+
 interface OfflineData {
   lists: unknown[];
   lastSync: number;
@@ -17,6 +19,23 @@ const OFFLINE_STORAGE_KEY = 'spar_collection_offline_data';
 const PENDING_UPDATES_KEY = 'spar_pending_updates';
 const SYNC_INTERVAL = 30000; // 30 seconds
 const MAX_RETRIES = 3;
+const MAX_SYNC_BATCH = 500; // items_sync limit per request
+const ITEM_UPDATE_PATH = /^\/?item_update\/([^/]+)\/([^/?]+)$/;
+
+interface ItemChange {
+  listId: string;
+  itemId: string;
+  status?: unknown;
+  qtyCollected?: unknown;
+  version?: unknown;
+}
+
+interface ItemSyncResult {
+  listId: string;
+  itemId: string;
+  result: 'applied' | 'conflict' | 'not-found';
+  version?: number;
+}
 
 class OfflineManager {
   private isOnline: boolean = navigator.onLine;
@@ -109,9 +128,44 @@ class OfflineManager {
 
     const failedUpdates: PendingUpdate[] = [];
 
+    // Queued item updates are replayed together through items_sync
+    const itemUpdates: Array<{ update: PendingUpdate; change: ItemChange }> = [];
+    const otherUpdates: PendingUpdate[] = [];
+    for (const update of pendingUpdates) {
+      const change = this.toItemChange(update);
+      if (change) {
+        itemUpdates.push({ update, change });
+      } else {
+        otherUpdates.push(update);
+      }
+    }
+
     try {
-      // Process each pending update
-      for (const update of pendingUpdates) {
+      for (let start = 0; start < itemUpdates.length; start += MAX_SYNC_BATCH) {
+        const chunk = itemUpdates.slice(start, start + MAX_SYNC_BATCH);
+        try {
+          const results = await this.syncItemChanges(chunk.map(({ change }) => change));
+          const conflicts = results.filter(result => result.result !== 'applied');
+          if (conflicts.length > 0) {
+            // The server copy wins for these; nothing to retry
+            console.warn('Discarded', conflicts.length, 'stale or unknown item update(s):', conflicts);
+          }
+          console.log('Successfully synced', chunk.length, 'item update(s)');
+        } catch (error) {
+          console.error('Failed to sync item updates:', error);
+          for (const { update } of chunk) {
+            update.retries++;
+            if (update.retries < MAX_RETRIES) {
+              failedUpdates.push(update);
+            } else {
+              console.error('Max retries exceeded, discarding update:', update.path);
+            }
+          }
+        }
+      }
+
+      // Process each remaining pending update
+      for (const update of otherUpdates) {
         try {
           await this.processPendingUpdate(update);
           console.log('Successfully synced update:', update.path);
@@ -147,6 +201,40 @@ class OfflineManager {
     }
   }
 
+  private toItemChange(update: PendingUpdate): ItemChange | null {
+    const match = ITEM_UPDATE_PATH.exec(update.path);
+    if (!match || typeof update.body !== 'object' || update.body === null) {
+      return null;
+    }
+    const body = update.body as Record<string, unknown>;
+    return {
+      listId: decodeURIComponent(match[1]),
+      itemId: decodeURIComponent(match[2]),
+      status: body.status,
+      qtyCollected: body.qtyCollected,
+      version: body.version,
+    };
+  }
+
+  private async syncItemChanges(changes: ItemChange[]): Promise<ItemSyncResult[]> {
+    const API_BASE = ((import.meta.env.VITE_API_URL as string | undefined) ?? '/api')
+      .replace(/\/+$/, '');
+
+    const response = await fetch(`${API_BASE}/items_sync`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
+      body: JSON.stringify({ changes }),
+      credentials: 'include',
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP ${response.status}: ${response.statusText}`);
+    }
+
+    const data = await response.json() as { results: ItemSyncResult[] };
+    return data.results;
+  }
+
   private async processPendingUpdate(update: PendingUpdate): Promise<void> {
     // Get API base URL
     const API_BASE = ((import.meta.env.VITE_API_URL as string | undefined) ?? '/api')
@@ -158,11 +246,17 @@ class OfflineManager {
     // Make the actual HTTP request
     const response = await fetch(url, {
       method: update.method,
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', ...authHeaders() },
       body: JSON.stringify(update.body),
       credentials: 'include',
     });
 
+    if (response.status === 409) {
+      // The item changed on the server since this update was queued; the server copy wins
+      console.warn('Discarding stale update (version conflict):', update.path);
+      return;
+    }
+
     if (!response.ok) {
       throw new Error(`HTTP ${response.status}: ${response.statusText}`);
     }
@@ -1,6 +1,6 @@
 import { useCallback, useEffect, useMemo, useState } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { apiGet, apiPost, itemUpdateRoute, listCompleteRoute, listRoute } from '../api';
+import { ConflictError, apiGet, apiPost, itemUpdateRoute, listCompleteRoute, listRoute } from '../api';
 import ItemCard from '../components/ItemCard';
 
 interface ShoppingListItem {
@@ -100,10 +100,22 @@ export default function ListDetailPage() {
       };
     });
     
+    const expectedVersion = list.items.find(item => item.id === itemId)?.version;
+
     try {
-      await apiPost(itemUpdateRoute(id, itemId), { status: newStatus });
+      await apiPost(itemUpdateRoute(id, itemId), { status: newStatus, version: expectedVersion });
       setMessage('Item updated.');
     } catch (err) {
+      if (err instanceof ConflictError && err.current) {
+        // Someone else updated the item first: show their version
+        const current = err.current as ShoppingListItem;
+        setList(prevList => prevList && {
+          ...prevList,
+          items: prevList.items.map(item => item.id === itemId ? { ...item, ...current } : item)
+        });
+        setError(err.message);
+        return;
+      }
       // Revert optimistic update on error
       setList(prevList => {
         if (!prevList) return prevList;